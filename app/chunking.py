@@ -0,0 +1,109 @@
+﻿from __future__ import annotations
+
+import contextvars
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+from .llm_client import LLMClient
+from .normalize import merge_llm_results
+
+
+_logger = logging.getLogger(__name__)
+
+_BOUNDARIES = [
+    re.compile(r"\n(?=#{1,6} )"),
+    re.compile(r"\n\s*\n"),
+    re.compile(r"\n"),
+    re.compile(r"(?<=[。．！？.!?])\s*"),
+]
+
+
+def _find_cut(text: str, start: int, end: int) -> int:
+    floor = start + (end - start) // 2
+    for pattern in _BOUNDARIES:
+        cut = -1
+        for match in pattern.finditer(text, floor, end):
+            cut = match.end()
+        if cut > floor:
+            return cut
+    return end
+
+
+def split_text(text: str, chunk_chars: int, overlap_chars: int = 0) -> List[str]:
+    if chunk_chars <= 0 or len(text) <= chunk_chars:
+        return [text]
+    overlap_chars = max(0, min(overlap_chars, chunk_chars // 2))
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_chars, len(text))
+        cut = end if end == len(text) else _find_cut(text, start, end)
+        chunks.append(text[start:cut])
+        if cut >= len(text):
+            break
+        start = max(cut - overlap_chars, start + 1)
+    return chunks
+
+
+def group_partials(partials: List[Dict[str, Any]], fan_in: int) -> List[List[Dict[str, Any]]]:
+    fan_in = max(2, fan_in)
+    return [partials[start : start + fan_in] for start in range(0, len(partials), fan_in)]
+
+
+def _parallel_map(function: Callable[[Any], Any], items: List[Any], max_parallel: int) -> List[Any]:
+    if len(items) == 1:
+        return [function(items[0])]
+    # copy the caller's context so per-file LLM usage tracking sees the worker requests
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=max(1, min(max_parallel, len(items)))) as executor:
+        return list(executor.map(lambda item: context.copy().run(function, item), items))
+
+
+def normalize_chunked(
+    llm: LLMClient,
+    text: str,
+    source_info: Dict[str, Any],
+    chunk_chars: int,
+    overlap_chars: int,
+    max_chunks: int,
+    max_parallel: int,
+    reduce: bool = False,
+) -> Dict[str, Any]:
+    """Map every chunk, then merge; ``max_chunks`` caps how many partials one reduce call sees."""
+    chunks = split_text(text, chunk_chars, overlap_chars)
+
+    def _map(index: int) -> Dict[str, Any]:
+        chunk_info = dict(source_info)
+        chunk_info["chunk"] = f"{index + 1}/{len(chunks)}"
+        return llm.normalize(chunks[index], chunk_info)
+
+    partials = _parallel_map(_map, list(range(len(chunks))), max_parallel)
+    if len(partials) == 1:
+        return partials[0]
+    if not reduce:
+        return merge_llm_results(partials).model_dump()
+
+    def _reduce(group: List[Dict[str, Any]]) -> Dict[str, Any]:
+        if len(group) == 1:
+            return group[0]
+        try:
+            return llm.reduce(group, source_info)
+        except Exception as exc:
+            _logger.warning(
+                "Reduce call failed, merging locally: %s (%s)", source_info.get("path"), exc
+            )
+            return merge_llm_results(group).model_dump()
+
+    fan_in = max_chunks if max_chunks > 0 else len(partials)
+    level = 0
+    while len(partials) > 1:
+        level += 1
+        groups = group_partials(partials, fan_in)
+        if level == 2:
+            _logger.info(
+                "Reducing %d chunks over several levels: %s", len(chunks), source_info.get("path")
+            )
+        partials = _parallel_map(_reduce, groups, max_parallel)
+    return partials[0]
@@ -1,13 +1,16 @@
 ﻿from __future__ import annotations
 
 import argparse
+from datetime import datetime, timedelta, timezone
 
 from rich.console import Console
 from rich.table import Table
 
 from .config import load_config
+from .data_lake import DataLake
 from .db import MetadataDB
 from .ingest_files.runner import run_backfill, run_watch_loop
+from .metrics import PERCENTILES, summarize_file_metrics
 
 
 def _status() -> int:
@@ -19,6 +22,85 @@ def _status() -> int:
     return 0
 
 
+def _extract_cache() -> int:
+    config = load_config()
+    db = MetadataDB(config.db_path, log_events=config.log_events)
+    stats = db.extraction_cache_stats()
+    hits = db.get_counter("extraction_cache_hits")
+    misses = db.get_counter("extraction_cache_misses")
+    db.close()
+    lookups = hits + misses
+    hit_rate = hits / lookups if lookups else 0.0
+    print(
+        f"extraction_cache entries={stats['entries']} "
+        f"size={stats['bytes'] / (1024 * 1024):.1f}MB "
+        f"hits={hits} misses={misses} hit_rate={hit_rate:.1%}"
+    )
+    return 0
+
+
+def _stats(hours: float) -> int:
+    config = load_config()
+    db = MetadataDB(config.db_path, log_events=config.log_events)
+    since = datetime.now(timezone.utc) - timedelta(hours=hours)
+    rows = db.file_metrics_since(since)
+    db.close()
+    summary = summarize_file_metrics(rows, hours * 3600)
+    outcomes = " ".join(f"{name}={count}" for name, count in summary["outcomes"].items())
+    print(f"stats window={hours:g}h files={summary['files']} {outcomes}")
+    print(
+        f"throughput files_per_hour={summary['files_per_hour']:.1f} "
+        f"bytes={summary['bytes_processed'] / (1024 * 1024):.1f}MB"
+    )
+    for name, stage in summary["stages"].items():
+        percentiles = " ".join(f"p{pct}={stage[f'p{pct}']:.1f}ms" for pct in PERCENTILES)
+        print(f"stage {name:<7} n={stage['count']} {percentiles} total={stage['total_sec']:.1f}s")
+    print(
+        f"llm requests={summary['llm_requests']} retries={summary['llm_retries']} "
+        f"prompt_tokens={summary['prompt_tokens']} "
+        f"completion_tokens={summary['completion_tokens']}"
+    )
+    print(
+        f"hit_rate extract_cache={summary['extract_cache_hit_rate']:.1%} "
+        f"llm_cache={summary['llm_cache_hit_rate']:.1%} dedup={summary['dedup_rate']:.1%}"
+    )
+    for failure in summary["failures"]:
+        print(f"failed stage={failure['stage']} error={failure['error']} count={failure['count']}")
+    return 0
+
+
+def _gc(dry_run: bool, min_age_hours: float) -> int:
+    config = load_config()
+    db = MetadataDB(config.db_path, log_events=config.log_events)
+    data_lake = DataLake.from_config(config)
+    moves = [] if dry_run else data_lake.migrate_layout()
+    relinked = 0 if dry_run else db.relink_blob_paths("file", data_lake.locate)
+    raw_hashes, content_hashes = db.referenced_blob_hashes("file")
+    orphans = data_lake.find_orphans(raw_hashes, content_hashes, min_age_hours * 3600)
+    if dry_run:
+        for path in orphans:
+            print(path)
+        orphan_bytes = sum(path.stat().st_size for path in orphans if path.exists())
+        print(f"gc dry-run orphans={len(orphans)} size={orphan_bytes / (1024 * 1024):.1f}MB")
+    else:
+        deleted, freed = data_lake.delete_blobs(orphans)
+        db.log_event(
+            "gc_completed",
+            {
+                "migrated": len(moves),
+                "relinked": relinked,
+                "deleted": deleted,
+                "freed_bytes": freed,
+            },
+        )
+        print(
+            f"gc migrated={len(moves)} relinked={relinked} deleted={deleted} "
+            f"freed={freed / (1024 * 1024):.1f}MB"
+        )
+    db.close()
+    return 0
+
+
 def _print_config_table(config) -> None:
     console = Console()
     table = Table(title="MDisAYN 設定", show_lines=True)
@@ -37,12 +119,57 @@ def _print_config_table(config) -> None:
     table.add_row("除外グロブ", ", ".join(config.exclude_globs) or "-")
     table.add_row("スキャン間隔(秒)", str(config.scan_interval_sec))
     table.add_row("デバウンス(秒)", str(config.debounce_sec))
+    table.add_row("監視ワーカー数", str(config.watch_workers))
     table.add_row("最大ファイル(MB)", str(max_file_mb))
+    deep_check = config.deep_check_interval_hours
+    table.add_row("ハッシュ再検証間隔(時間)", str(deep_check) if deep_check > 0 else "無効")
+    table.add_row("抽出キャッシュ", "有効" if config.extract_cache_enabled else "無効")
+    table.add_row(
+        "抽出プロセス",
+        f"{config.extract_process_workers} (timeout={config.extract_timeout_sec}s)"
+        if config.extract_process_workers > 0
+        else "無効",
+    )
     table.add_row("LLM Base URL", config.llm_base_url)
     table.add_row("LLM Model", config.llm_model)
     table.add_row("LLM Language", config.llm_language)
+    table.add_row(
+        "LLM 入力上限",
+        f"{config.llm_context_tokens}トークン (出力{config.llm_output_tokens}, "
+        f"補正x{config.llm_token_calibration}) / {config.llm_max_input_chars}文字"
+        if config.llm_context_tokens > 0
+        else f"{config.llm_max_input_chars}文字",
+    )
+    table.add_row(
+        "LLM 分割処理",
+        f"{config.llm_chunk_chars}文字 (統合{config.llm_max_chunks}件ずつ)" if config.llm_chunking else "無効",
+    )
+    table.add_row(
+        "LLM バッチ",
+        (
+            f"最大{config.llm_batch_max_docs}件 / {config.llm_batch_max_tokens}トークン"
+            if config.llm_cassette_mode == "off"
+            else "無効 (カセット使用中)"
+        )
+        if config.llm_batch_enabled
+        else "無効",
+    )
+    table.add_row(
+        "LLM カセット",
+        f"{config.llm_cassette_mode} ({config.llm_cassette_dir})"
+        if config.llm_cassette_mode != "off"
+        else "無効",
+    )
+    table.add_row(
+        "LLM キャッシュ(MB)",
+        str(config.llm_cache_max_bytes // (1024 * 1024)) if config.llm_cache_enabled else "無効",
+    )
     table.add_row("Obsidian 出力先", config.obsidian_sources_subdir)
     table.add_row("イベントログ", str(config.log_events))
+    table.add_row(
+        "Backfill 並列度 (抽出/LLM/書込)",
+        f"{config.backfill_extract_workers}/{config.backfill_llm_workers}/{config.backfill_write_workers}",
+    )
 
     console.print(table)
 
@@ -55,10 +182,31 @@ def build_parser() -> argparse.ArgumentParser:
 
     backfill = sub.add_parser("backfill", help="One-time scan and ingest")
     backfill.add_argument("--force", action="store_true", help="Reprocess even if unchanged")
+    backfill.add_argument(
+        "--verify",
+        action="store_true",
+        help="Re-hash files even when size/mtime/file id are unchanged",
+    )
 
     sub.add_parser("reprocess", help="Reprocess all matched files")
 
     sub.add_parser("status", help="Show ingest status summary")
+
+    sub.add_parser("extract-cache", help="Show extraction cache size and hit rate")
+
+    stats = sub.add_parser("stats", help="Show per-stage timings, hit rates and failures")
+    stats.add_argument(
+        "--hours", type=float, default=24.0, help="Summarize files recorded in the last N hours"
+    )
+
+    gc = sub.add_parser("gc", help="Delete data lake blobs no source references")
+    gc.add_argument("--dry-run", action="store_true", help="List orphaned blobs without deleting")
+    gc.add_argument(
+        "--min-age-hours",
+        type=float,
+        default=1.0,
+        help="Keep blobs newer than this to protect files being ingested",
+    )
     return parser
 
 
@@ -71,13 +219,19 @@ def main(argv: list[str] | None = None) -> int:
         run_watch_loop(config)
         return 0
     if args.command == "backfill":
-        run_backfill(config, force=args.force)
+        run_backfill(config, force=args.force, verify=args.verify)
         return 0
     if args.command == "reprocess":
         run_backfill(config, force=True)
         return 0
     if args.command == "status":
         return _status()
+    if args.command == "extract-cache":
+        return _extract_cache()
+    if args.command == "stats":
+        return _stats(args.hours)
+    if args.command == "gc":
+        return _gc(args.dry_run, args.min_age_hours)
 
     return 1
 
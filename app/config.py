@@ -3,7 +3,7 @@
 import os
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 
 def _load_dotenv(path: Path) -> None:
@@ -31,24 +31,69 @@ def _split_list(value: str) -> List[str]:
 class AppConfig:
     vault_path: Path
     data_lake_path: Path
+    data_lake_compression: str
+    data_lake_compression_level: Optional[int]
     watch_paths: List[Path]
     watch_recursive: bool
     exclude_dirs: List[str]
     exclude_globs: List[str]
     scan_interval_sec: int
+    scan_workers: int
     debounce_sec: float
+    watch_workers: int
     max_file_bytes: int
+    deep_check_interval_hours: float
+    extract_process_workers: int
+    extract_timeout_sec: float
+    extract_memory_limit_mb: int
+    extract_char_budget: int
+    extract_cache_enabled: bool
     llm_base_url: str
     llm_model: str
     llm_timeout_sec: float
     llm_max_retries: int
     llm_max_input_chars: int
+    llm_context_tokens: int
+    llm_output_tokens: int
+    llm_token_calibration: float
+    llm_chunking: bool
+    llm_chunk_chars: int
+    llm_chunk_overlap_chars: int
+    llm_max_chunks: int
+    llm_chunk_parallel: int
+    llm_chunk_reduce: bool
+    llm_batch_enabled: bool
+    llm_batch_max_docs: int
+    llm_batch_max_tokens: int
+    llm_batch_max_doc_chars: int
     llm_language: str
     llm_json_mode: bool
+    llm_stream: bool
+    llm_cassette_mode: str
+    llm_cassette_dir: Path
+    llm_max_connections: int
+    llm_max_keepalive_connections: int
+    llm_keepalive_expiry_sec: float
+    llm_cache_enabled: bool
+    llm_cache_max_bytes: int
     obsidian_sources_subdir: str
     obsidian_template_path: Path
     db_path: Path
     log_events: bool
+    db_synchronous: str
+    db_cache_mb: int
+    db_mmap_mb: int
+    db_commit_batch_size: int
+    db_commit_interval_sec: float
+    event_batch_size: int
+    event_flush_interval_sec: float
+    event_retention_days: float
+    event_hourly_retention_days: float
+    metrics_retention_days: float
+    backfill_extract_workers: int
+    backfill_llm_workers: int
+    backfill_write_workers: int
+    backfill_queue_size: int
 
     @property
     def raw_dir(self) -> Path:
@@ -58,6 +103,14 @@ class AppConfig:
     def extracted_dir(self) -> Path:
         return self.data_lake_path / "extracted"
 
+    @property
+    def cache_dir(self) -> Path:
+        return self.data_lake_path / "cache"
+
+    @property
+    def state_dir(self) -> Path:
+        return self.data_lake_path / "state"
+
 
 def load_config() -> AppConfig:
     cwd = Path.cwd()
@@ -65,6 +118,11 @@ def load_config() -> AppConfig:
 
     vault_path = Path(os.getenv("VAULT_PATH", "./vault")).expanduser()
     data_lake_path = Path(os.getenv("DATA_LAKE_PATH", "./data_lake")).expanduser()
+    data_lake_compression = os.getenv("DATA_LAKE_COMPRESSION", "none").strip().lower() or "none"
+    data_lake_compression_level_raw = os.getenv("DATA_LAKE_COMPRESSION_LEVEL", "").strip()
+    data_lake_compression_level = (
+        int(data_lake_compression_level_raw) if data_lake_compression_level_raw else None
+    )
 
     watch_paths_raw = os.getenv("WATCH_PATHS", "")
     if watch_paths_raw:
@@ -81,17 +139,48 @@ def load_config() -> AppConfig:
         )
     )
     scan_interval_sec = int(os.getenv("SCAN_INTERVAL_SEC", "60"))
+    scan_workers = int(os.getenv("SCAN_WORKERS", "4"))
     debounce_sec = float(os.getenv("DEBOUNCE_SEC", "2"))
+    watch_workers = max(1, int(os.getenv("WATCH_WORKERS", "2")))
     max_file_mb = int(os.getenv("MAX_FILE_MB", "5"))
     max_file_bytes = max_file_mb * 1024 * 1024
+    deep_check_interval_hours = float(os.getenv("DEEP_CHECK_INTERVAL_HOURS", "0"))
+    extract_process_workers = int(os.getenv("EXTRACT_PROCESS_WORKERS", "2"))
+    extract_timeout_sec = float(os.getenv("EXTRACT_TIMEOUT_SEC", "60"))
+    extract_memory_limit_mb = int(os.getenv("EXTRACT_MEMORY_LIMIT_MB", "0"))
 
     llm_base_url = os.getenv("LLM_BASE_URL", "http://127.0.0.1:1234/v1")
     llm_model = os.getenv("LLM_MODEL", "local-model")
     llm_timeout_sec = float(os.getenv("LLM_TIMEOUT_SEC", "30"))
     llm_max_retries = int(os.getenv("LLM_MAX_RETRIES", "2"))
     llm_max_input_chars = int(os.getenv("LLM_MAX_INPUT_CHARS", "8000"))
+    llm_context_tokens = int(os.getenv("LLM_CONTEXT_TOKENS", "0"))
+    llm_output_tokens = int(os.getenv("LLM_OUTPUT_TOKENS", "1024"))
+    llm_token_calibration = float(os.getenv("LLM_TOKEN_CALIBRATION", "1.0"))
+    llm_chunking = os.getenv("LLM_CHUNKING", "false").lower() in {"1", "true", "yes"}
+    llm_chunk_chars = int(os.getenv("LLM_CHUNK_CHARS", str(llm_max_input_chars)))
+    llm_chunk_overlap_chars = int(os.getenv("LLM_CHUNK_OVERLAP_CHARS", "200"))
+    llm_max_chunks = int(os.getenv("LLM_MAX_CHUNKS", "8"))
+    llm_chunk_parallel = int(os.getenv("LLM_CHUNK_PARALLEL", "4"))
+    llm_chunk_reduce = os.getenv("LLM_CHUNK_REDUCE", "false").lower() in {"1", "true", "yes"}
+    llm_batch_enabled = os.getenv("LLM_BATCH_ENABLED", "false").lower() in {"1", "true", "yes"}
+    llm_batch_max_docs = max(1, int(os.getenv("LLM_BATCH_MAX_DOCS", "8")))
+    llm_batch_max_tokens = int(os.getenv("LLM_BATCH_MAX_TOKENS", "2000"))
+    llm_batch_max_doc_chars = int(os.getenv("LLM_BATCH_MAX_DOC_CHARS", "1500"))
+    extract_char_budget = max(0, int(os.getenv("EXTRACT_CHAR_BUDGET", "0") or 0))
+    extract_cache_enabled = os.getenv("EXTRACT_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"}
     llm_language = os.getenv("LLM_LANGUAGE", "ja")
     llm_json_mode = os.getenv("LLM_JSON_MODE", "true").lower() in {"1", "true", "yes"}
+    llm_stream = os.getenv("LLM_STREAM", "false").lower() in {"1", "true", "yes"}
+    llm_cassette_mode = os.getenv("LLM_CASSETTE_MODE", "off").strip().lower() or "off"
+    llm_cassette_dir = Path(
+        os.getenv("LLM_CASSETTE_DIR", str(data_lake_path / "cassettes"))
+    ).expanduser()
+    llm_max_connections = int(os.getenv("LLM_MAX_CONNECTIONS", "8"))
+    llm_max_keepalive_connections = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "4"))
+    llm_keepalive_expiry_sec = float(os.getenv("LLM_KEEPALIVE_EXPIRY_SEC", "30"))
+    llm_cache_enabled = os.getenv("LLM_CACHE_ENABLED", "true").lower() in {"1", "true", "yes"}
+    llm_cache_max_mb = int(os.getenv("LLM_CACHE_MAX_MB", "256"))
 
     obsidian_sources_subdir = os.getenv("OBSIDIAN_SOURCES_SUBDIR", "90_Sources/file")
     obsidian_template_path = Path(
@@ -99,26 +188,86 @@ def load_config() -> AppConfig:
     )
     db_path = Path(os.getenv("META_DB_PATH", str(data_lake_path / "meta.db")))
     log_events = os.getenv("LOG_EVENTS", "true").lower() in {"1", "true", "yes"}
+    db_synchronous = os.getenv("DB_SYNCHRONOUS", "NORMAL").upper()
+    db_cache_mb = int(os.getenv("DB_CACHE_MB", "16"))
+    db_mmap_mb = int(os.getenv("DB_MMAP_MB", "64"))
+    db_commit_batch_size = int(os.getenv("DB_COMMIT_BATCH_SIZE", "64"))
+    db_commit_interval_sec = float(os.getenv("DB_COMMIT_INTERVAL_SEC", "1"))
+    event_batch_size = int(os.getenv("EVENT_BATCH_SIZE", "256"))
+    event_flush_interval_sec = float(os.getenv("EVENT_FLUSH_INTERVAL_SEC", "1"))
+    event_retention_days = float(os.getenv("EVENT_RETENTION_DAYS", "14"))
+    event_hourly_retention_days = float(os.getenv("EVENT_HOURLY_RETENTION_DAYS", "90"))
+    metrics_retention_days = float(os.getenv("METRICS_RETENTION_DAYS", "30"))
+
+    backfill_extract_workers = int(os.getenv("BACKFILL_EXTRACT_WORKERS", "2"))
+    backfill_llm_workers = int(os.getenv("BACKFILL_LLM_WORKERS", "2"))
+    backfill_write_workers = int(os.getenv("BACKFILL_WRITE_WORKERS", "1"))
+    backfill_queue_size = int(os.getenv("BACKFILL_QUEUE_SIZE", "8"))
 
     return AppConfig(
         vault_path=vault_path,
         data_lake_path=data_lake_path,
+        data_lake_compression=data_lake_compression,
+        data_lake_compression_level=data_lake_compression_level,
         watch_paths=watch_paths,
         watch_recursive=watch_recursive,
         exclude_dirs=[d.lower() for d in exclude_dirs],
         exclude_globs=exclude_globs,
         scan_interval_sec=scan_interval_sec,
+        scan_workers=scan_workers,
         debounce_sec=debounce_sec,
+        watch_workers=watch_workers,
         max_file_bytes=max_file_bytes,
+        deep_check_interval_hours=deep_check_interval_hours,
+        extract_process_workers=extract_process_workers,
+        extract_timeout_sec=extract_timeout_sec,
+        extract_memory_limit_mb=extract_memory_limit_mb,
+        extract_char_budget=extract_char_budget,
+        extract_cache_enabled=extract_cache_enabled,
         llm_base_url=llm_base_url,
         llm_model=llm_model,
         llm_timeout_sec=llm_timeout_sec,
         llm_max_retries=llm_max_retries,
         llm_max_input_chars=llm_max_input_chars,
+        llm_context_tokens=llm_context_tokens,
+        llm_output_tokens=llm_output_tokens,
+        llm_token_calibration=llm_token_calibration,
+        llm_chunking=llm_chunking,
+        llm_chunk_chars=llm_chunk_chars,
+        llm_chunk_overlap_chars=llm_chunk_overlap_chars,
+        llm_max_chunks=llm_max_chunks,
+        llm_chunk_parallel=llm_chunk_parallel,
+        llm_chunk_reduce=llm_chunk_reduce,
+        llm_batch_enabled=llm_batch_enabled,
+        llm_batch_max_docs=llm_batch_max_docs,
+        llm_batch_max_tokens=llm_batch_max_tokens,
+        llm_batch_max_doc_chars=llm_batch_max_doc_chars,
         llm_language=llm_language,
         llm_json_mode=llm_json_mode,
+        llm_stream=llm_stream,
+        llm_cassette_mode=llm_cassette_mode,
+        llm_cassette_dir=llm_cassette_dir,
+        llm_max_connections=llm_max_connections,
+        llm_max_keepalive_connections=llm_max_keepalive_connections,
+        llm_keepalive_expiry_sec=llm_keepalive_expiry_sec,
+        llm_cache_enabled=llm_cache_enabled,
+        llm_cache_max_bytes=llm_cache_max_mb * 1024 * 1024,
         obsidian_sources_subdir=obsidian_sources_subdir,
         obsidian_template_path=obsidian_template_path,
         db_path=db_path,
         log_events=log_events,
+        db_synchronous=db_synchronous,
+        db_cache_mb=db_cache_mb,
+        db_mmap_mb=db_mmap_mb,
+        db_commit_batch_size=db_commit_batch_size,
+        db_commit_interval_sec=db_commit_interval_sec,
+        event_batch_size=event_batch_size,
+        event_flush_interval_sec=event_flush_interval_sec,
+        event_retention_days=event_retention_days,
+        event_hourly_retention_days=event_hourly_retention_days,
+        metrics_retention_days=metrics_retention_days,
+        backfill_extract_workers=backfill_extract_workers,
+        backfill_llm_workers=backfill_llm_workers,
+        backfill_write_workers=backfill_write_workers,
+        backfill_queue_size=backfill_queue_size,
     )
@@ -0,0 +1,360 @@
+﻿from __future__ import annotations
+
+import bz2
+import gzip
+import hashlib
+import io
+import lzma
+import mmap
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import (
+    BinaryIO,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+from .config import AppConfig
+
+
+_CHUNK_SIZE = 1024 * 1024
+
+
+class _Codec(NamedTuple):
+    suffix: str
+    open: Callable[..., BinaryIO]
+    level_arg: str
+    default_level: int
+
+
+_CODECS: Dict[str, _Codec] = {
+    "gzip": _Codec(".gz", gzip.open, "compresslevel", 6),
+    "bz2": _Codec(".bz2", bz2.open, "compresslevel", 9),
+    "lzma": _Codec(".xz", lzma.open, "preset", 6),
+}
+_CODECS_BY_SUFFIX = {codec.suffix: codec for codec in _CODECS.values()}
+
+COMPRESSIONS = ("none", *_CODECS)
+
+
+def blob_hash(path: Union[str, Path]) -> str:
+    return Path(path).name.split(".", 1)[0]
+
+
+def shard_dir(directory: Path, name: str) -> Path:
+    return directory / name[:2] / name[2:4]
+
+
+def _is_blob(name: str) -> bool:
+    return not name.startswith(".")
+
+
+def _move_into_shard(flat: Path, target: Path) -> Optional[Path]:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        os.replace(flat, target)
+    except FileNotFoundError:
+        pass
+    return target if target.exists() else None
+
+
+def open_blob(path: Path) -> BinaryIO:
+    codec = _CODECS_BY_SUFFIX.get(path.suffix)
+    if codec is None:
+        return path.open("rb")
+    return codec.open(path, "rb")
+
+
+class _MappedFile(mmap.mmap):
+    def seekable(self) -> bool:
+        return True
+
+
+class RawSnapshot:
+    """Private copy of a source file under raw/; it only gets its hash name when published."""
+
+    def __init__(
+        self,
+        raw_hash: str,
+        name: str,
+        raw_path: Path,
+        data_path: Path,
+        size: int,
+        published: bool,
+    ) -> None:
+        self.raw_hash = raw_hash
+        self.name = name
+        self.raw_path = raw_path
+        # the bytes that were hashed; later edits to the source never reach this file
+        self.data_path = data_path
+        self.size = size
+        self.published = published
+        self._handle: Optional[BinaryIO] = None
+        self._buffer: Optional[Union[bytes, _MappedFile]] = None
+        self._closed = False
+
+    @property
+    def buffer(self) -> Union[bytes, _MappedFile]:
+        if self._closed:
+            raise ValueError("Snapshot is closed")
+        if self._buffer is None:
+            if self.size == 0:
+                self._buffer = b""
+            else:
+                self._handle = self.data_path.open("rb")
+                self._buffer = _MappedFile(self._handle.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._buffer
+
+    def release(self) -> None:
+        """Unmap the copy so it can be renamed; ``buffer`` maps it again on next use."""
+        if isinstance(self._buffer, mmap.mmap):
+            self._buffer.close()
+        if self._handle is not None:
+            self._handle.close()
+        self._buffer = None
+        self._handle = None
+
+    def close(self) -> None:
+        self.release()
+        self._closed = True
+        if self.data_path != self.raw_path:
+            try:
+                self.data_path.unlink(missing_ok=True)
+            except OSError:
+                # still open in a hung extraction worker; `gc` removes stale tmp files
+                pass
+
+    def __enter__(self) -> "RawSnapshot":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+class DataLake:
+    def __init__(
+        self,
+        raw_dir: Path,
+        extracted_dir: Path,
+        source_type: str = "file",
+        compression: str = "none",
+        compression_level: Optional[int] = None,
+    ) -> None:
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unsupported data lake compression: {compression}")
+        self.raw_dir = raw_dir / source_type
+        self.extracted_dir = extracted_dir / source_type
+        self.codec = _CODECS.get(compression)
+        self.compression_level = compression_level
+
+    @classmethod
+    def from_config(cls, config: AppConfig, source_type: str = "file") -> "DataLake":
+        return cls(
+            config.raw_dir,
+            config.extracted_dir,
+            source_type,
+            compression=config.data_lake_compression,
+            compression_level=config.data_lake_compression_level,
+        )
+
+    def _open_compressed(self, path: Path, mode: str, **kwargs):
+        level = self.compression_level
+        if level is None:
+            level = self.codec.default_level
+        return self.codec.open(path, mode, **{self.codec.level_arg: level}, **kwargs)
+
+    def _variants(self, name: str) -> List[str]:
+        preferred = name + self.codec.suffix if self.codec else name
+        others = [name] + [name + suffix for suffix in _CODECS_BY_SUFFIX]
+        return [preferred] + [variant for variant in others if variant != preferred]
+
+    def _target(self, directory: Path, name: str) -> Path:
+        return shard_dir(directory, name) / self._variants(name)[0]
+
+    def _existing(self, directory: Path, name: str) -> Optional[Path]:
+        shard = shard_dir(directory, name)
+        variants = self._variants(name)
+        for variant in variants:
+            candidate = shard / variant
+            if candidate.exists():
+                return candidate
+        # legacy flat blobs are read in place; `gc` moves them and relinks meta.db
+        for variant in variants:
+            flat = directory / variant
+            if flat.exists():
+                return flat
+        return None
+
+    def locate(self, kind: str, recorded: Union[str, Path]) -> Optional[Path]:
+        """Find a blob by its hash, wherever the layout has put it since it was recorded."""
+        directory = self.raw_dir if kind == "raw" else self.extracted_dir
+        name = Path(recorded).name
+        suffix = Path(name).suffix
+        if suffix in _CODECS_BY_SUFFIX:
+            name = name[: -len(suffix)]
+        return self._existing(directory, name)
+
+    def _publish(self, tmp_path: Path, target: Path) -> None:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.replace(tmp_path, target)
+        except PermissionError:
+            if not target.exists():
+                raise
+
+    def migrate_layout(self) -> List[Tuple[Path, Path]]:
+        moves: List[Tuple[Path, Path]] = []
+        for directory in (self.raw_dir, self.extracted_dir):
+            if not directory.is_dir():
+                continue
+            with os.scandir(directory) as entries:
+                flat = [Path(entry.path) for entry in entries if entry.is_file() and _is_blob(entry.name)]
+            for path in flat:
+                target = _move_into_shard(path, shard_dir(directory, path.name) / path.name)
+                if target is not None:
+                    moves.append((path, target))
+        return moves
+
+    def iter_blobs(self) -> Iterator[Tuple[str, Path]]:
+        for kind, directory in (("raw", self.raw_dir), ("extracted", self.extracted_dir)):
+            if not directory.is_dir():
+                continue
+            for current, _, files in os.walk(directory):
+                for filename in files:
+                    yield kind, Path(current) / filename
+
+    def find_orphans(
+        self,
+        raw_hashes: Set[str],
+        content_hashes: Set[str],
+        min_age_sec: float = 0.0,
+    ) -> List[Path]:
+        cutoff = time.time() - min_age_sec
+        referenced = {"raw": raw_hashes, "extracted": content_hashes}
+        orphans: List[Path] = []
+        for kind, path in self.iter_blobs():
+            try:
+                if path.stat().st_mtime > cutoff:
+                    continue
+            except FileNotFoundError:
+                continue
+            if not _is_blob(path.name) or blob_hash(path) not in referenced[kind]:
+                orphans.append(path)
+        return orphans
+
+    def delete_blobs(self, paths: Iterable[Path]) -> Tuple[int, int]:
+        deleted = 0
+        freed = 0
+        roots = {self.raw_dir, self.extracted_dir}
+        for path in paths:
+            try:
+                size = path.stat().st_size
+                path.unlink()
+            except FileNotFoundError:
+                continue
+            deleted += 1
+            freed += size
+            parent = path.parent
+            while parent not in roots and parent != parent.parent:
+                try:
+                    parent.rmdir()
+                except OSError:
+                    break
+                parent = parent.parent
+        return deleted, freed
+
+    def snapshot_raw(self, path: Path, max_bytes: int) -> Optional[RawSnapshot]:
+        """Stream ``path`` into a private tmp copy while hashing; ``publish_raw`` names it."""
+        self.raw_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.raw_dir / f".{uuid.uuid4().hex}.tmp"
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with path.open("rb") as source, tmp_path.open("wb") as target:
+                while True:
+                    chunk = source.read(_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if size > max_bytes:
+                        tmp_path.unlink(missing_ok=True)
+                        return None
+                    hasher.update(chunk)
+                    target.write(chunk)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+        raw_hash = hasher.hexdigest()
+        name = f"{raw_hash}{path.suffix.lower()}"
+        existing = self._existing(self.raw_dir, name)
+        return RawSnapshot(
+            raw_hash,
+            name,
+            existing or self._target(self.raw_dir, name),
+            tmp_path,
+            size,
+            published=existing is not None,
+        )
+
+    def publish_raw(self, snapshot: RawSnapshot) -> Path:
+        if snapshot.published:
+            return snapshot.raw_path
+        existing = self._existing(self.raw_dir, snapshot.name)
+        if existing is not None:
+            snapshot.raw_path = existing
+        elif self.codec is None:
+            snapshot.release()
+            self._publish(snapshot.data_path, snapshot.raw_path)
+            if not snapshot.data_path.exists():
+                snapshot.data_path = snapshot.raw_path
+        else:
+            tmp_path = self.raw_dir / f".{uuid.uuid4().hex}.tmp"
+            try:
+                with self._open_compressed(tmp_path, "wb") as target, memoryview(
+                    snapshot.buffer
+                ) as view:
+                    for start in range(0, len(view), _CHUNK_SIZE):
+                        target.write(view[start : start + _CHUNK_SIZE])
+                self._publish(tmp_path, snapshot.raw_path)
+            finally:
+                tmp_path.unlink(missing_ok=True)
+        snapshot.published = True
+        return snapshot.raw_path
+
+    def extracted_path(self, content_hash: str) -> Optional[Path]:
+        return self._existing(self.extracted_dir, f"{content_hash}.txt")
+
+    def read_extracted(self, content_hash: str) -> Optional[str]:
+        path = self.extracted_path(content_hash)
+        if path is None:
+            return None
+        with open_blob(path) as handle:
+            return io.TextIOWrapper(handle, encoding="utf-8").read()
+
+    def write_extracted(self, content_hash: str, text: str) -> Path:
+        self.extracted_dir.mkdir(parents=True, exist_ok=True)
+        existing = self.extracted_path(content_hash)
+        if existing is not None:
+            return existing
+        extracted_path = self._target(self.extracted_dir, f"{content_hash}.txt")
+        tmp_path = self.extracted_dir / f".{uuid.uuid4().hex}.tmp"
+        try:
+            if self.codec is None:
+                tmp_path.write_text(text, encoding="utf-8")
+            else:
+                with self._open_compressed(tmp_path, "wt", encoding="utf-8") as handle:
+                    handle.write(text)
+            self._publish(tmp_path, extracted_path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return extracted_path
@@ -2,22 +2,112 @@
 
 import json
 import sqlite3
-from datetime import datetime, timezone
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Dict, Optional
+from typing import Any, Callable, Deque, Dict, Optional, Set, Tuple
 
 
 class MetadataDB:
-    def __init__(self, path: Path, log_events: bool = True) -> None:
+    def __init__(
+        self,
+        path: Path,
+        log_events: bool = True,
+        synchronous: str = "NORMAL",
+        cache_mb: int = 16,
+        mmap_mb: int = 64,
+        commit_batch_size: int = 64,
+        commit_interval_sec: float = 1.0,
+        event_batch_size: int = 256,
+        event_flush_interval_sec: float = 1.0,
+    ) -> None:
         self.path = path
         self.log_events = log_events
+        self.commit_batch_size = max(1, commit_batch_size)
+        self.commit_interval_sec = commit_interval_sec
+        self.event_batch_size = max(1, event_batch_size)
         self.path.parent.mkdir(parents=True, exist_ok=True)
-        self.conn = sqlite3.connect(self.path)
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
+        self._lock = threading.RLock()
+        self._pending_writes = 0
+        self._last_commit = time.monotonic()
+        self._events: Deque[Tuple[str, str, str]] = deque()
+        self._events_lock = threading.Lock()
+        self._configure(synchronous, cache_mb, mmap_mb)
         self._ensure_schema()
+        self._stop_event = threading.Event()
+        self._wake_event = threading.Event()
+        intervals = [
+            interval
+            for interval in (
+                commit_interval_sec if self.commit_batch_size > 1 else 0,
+                event_flush_interval_sec if log_events else 0,
+            )
+            if interval > 0
+        ]
+        self._flush_interval = min(intervals) if intervals else 1.0
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
 
     def close(self) -> None:
-        self.conn.close()
+        self._stop_event.set()
+        self._wake_event.set()
+        self._flusher.join(timeout=2)
+        with self._lock:
+            self._write_events()
+            self.conn.commit()
+            self.conn.close()
+
+    def _configure(self, synchronous: str, cache_mb: int, mmap_mb: int) -> None:
+        cur = self.conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute(f"PRAGMA synchronous={synchronous.upper()}")
+        cur.execute(f"PRAGMA cache_size={-int(cache_mb) * 1024}")
+        cur.execute(f"PRAGMA mmap_size={int(mmap_mb) * 1024 * 1024}")
+        cur.execute("PRAGMA temp_store=MEMORY")
+        cur.execute("PRAGMA busy_timeout=5000")
+
+    def _mark_dirty(self) -> None:
+        self._pending_writes += 1
+        if (
+            self._pending_writes >= self.commit_batch_size
+            or time.monotonic() - self._last_commit >= self.commit_interval_sec
+        ):
+            self._commit()
+
+    def _commit(self) -> None:
+        self.conn.commit()
+        self._pending_writes = 0
+        self._last_commit = time.monotonic()
+
+    def _write_events(self) -> None:
+        with self._events_lock:
+            batch = list(self._events)
+            self._events.clear()
+        if not batch:
+            return
+        self.conn.executemany(
+            "INSERT INTO events (event_time, event_type, details_json) VALUES (?, ?, ?)",
+            batch,
+        )
+        self._pending_writes += 1
+
+    def flush(self) -> None:
+        with self._lock:
+            self._write_events()
+            if self._pending_writes:
+                self._commit()
+
+    def _flush_loop(self) -> None:
+        while not self._stop_event.is_set():
+            self._wake_event.wait(self._flush_interval)
+            self._wake_event.clear()
+            if self._stop_event.is_set():
+                return
+            self.flush()
 
     def _ensure_schema(self) -> None:
         cur = self.conn.cursor()
@@ -33,10 +123,24 @@ class MetadataDB:
                 obsidian_path TEXT,
                 last_processed_at TEXT,
                 metadata_json TEXT,
+                size_bytes INTEGER,
+                mtime_ns INTEGER,
+                file_id TEXT,
+                verified_at TEXT,
                 UNIQUE(source_type, source_key)
             )
             """
         )
+        self._ensure_columns(
+            cur,
+            "sources",
+            {
+                "size_bytes": "INTEGER",
+                "mtime_ns": "INTEGER",
+                "file_id": "TEXT",
+                "verified_at": "TEXT",
+            },
+        )
         cur.execute(
             """
             CREATE INDEX IF NOT EXISTS idx_sources_hash
@@ -53,25 +157,102 @@ class MetadataDB:
             )
             """
         )
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_events_time ON events (event_time)")
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_events_type_time ON events (event_type, event_time)"
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS event_rollups (
+                granularity TEXT NOT NULL,
+                bucket_start TEXT NOT NULL,
+                event_type TEXT NOT NULL,
+                event_count INTEGER NOT NULL,
+                PRIMARY KEY (granularity, bucket_start, event_type)
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS extraction_cache (
+                raw_hash TEXT NOT NULL,
+                extractor_version TEXT NOT NULL,
+                char_budget INTEGER NOT NULL,
+                content_hash TEXT NOT NULL,
+                text_bytes INTEGER NOT NULL,
+                metadata_json TEXT,
+                created_at TEXT NOT NULL,
+                PRIMARY KEY (raw_hash, extractor_version, char_budget)
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS counters (
+                name TEXT PRIMARY KEY,
+                value INTEGER NOT NULL
+            )
+            """
+        )
+        cur.execute(
+            """
+            CREATE TABLE IF NOT EXISTS file_metrics (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                recorded_at TEXT NOT NULL,
+                source_type TEXT NOT NULL,
+                extension TEXT NOT NULL,
+                outcome TEXT NOT NULL,
+                error TEXT,
+                failed_stage TEXT,
+                size_bytes INTEGER NOT NULL,
+                stat_us INTEGER NOT NULL,
+                hash_us INTEGER NOT NULL,
+                extract_us INTEGER NOT NULL,
+                llm_us INTEGER NOT NULL,
+                render_us INTEGER NOT NULL,
+                write_us INTEGER NOT NULL,
+                total_us INTEGER NOT NULL,
+                llm_requests INTEGER NOT NULL,
+                llm_retries INTEGER NOT NULL,
+                prompt_tokens INTEGER NOT NULL,
+                completion_tokens INTEGER NOT NULL,
+                extract_cache_hit INTEGER NOT NULL,
+                llm_cache_hit INTEGER NOT NULL
+            )
+            """
+        )
+        cur.execute(
+            "CREATE INDEX IF NOT EXISTS idx_file_metrics_time ON file_metrics (recorded_at)"
+        )
         self.conn.commit()
 
+    @staticmethod
+    def _ensure_columns(cur: sqlite3.Cursor, table: str, columns: Dict[str, str]) -> None:
+        cur.execute(f"PRAGMA table_info({table})")
+        existing = {row[1] for row in cur.fetchall()}
+        for name, column_type in columns.items():
+            if name not in existing:
+                cur.execute(f"ALTER TABLE {table} ADD COLUMN {name} {column_type}")
+
     def get_source(self, source_type: str, source_key: str) -> Optional[Dict[str, Any]]:
-        cur = self.conn.cursor()
-        cur.execute(
-            "SELECT * FROM sources WHERE source_type = ? AND source_key = ?",
-            (source_type, source_key),
-        )
-        row = cur.fetchone()
-        return dict(row) if row else None
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute(
+                "SELECT * FROM sources WHERE source_type = ? AND source_key = ?",
+                (source_type, source_key),
+            )
+            row = cur.fetchone()
+            return dict(row) if row else None
 
     def get_source_by_hash(self, source_type: str, content_hash: str) -> Optional[Dict[str, Any]]:
-        cur = self.conn.cursor()
-        cur.execute(
-            "SELECT * FROM sources WHERE source_type = ? AND content_hash = ?",
-            (source_type, content_hash),
-        )
-        row = cur.fetchone()
-        return dict(row) if row else None
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute(
+                "SELECT * FROM sources WHERE source_type = ? AND content_hash = ?",
+                (source_type, content_hash),
+            )
+            row = cur.fetchone()
+            return dict(row) if row else None
 
     def upsert_source(
         self,
@@ -82,62 +263,309 @@ class MetadataDB:
         extracted_path: Optional[str],
         obsidian_path: Optional[str],
         metadata: Optional[Dict[str, Any]] = None,
+        size_bytes: Optional[int] = None,
+        mtime_ns: Optional[int] = None,
+        file_id: Optional[str] = None,
     ) -> None:
         now = datetime.now(timezone.utc).isoformat()
         metadata_json = json.dumps(metadata or {}, ensure_ascii=True)
-        cur = self.conn.cursor()
-        cur.execute(
-            """
-            INSERT INTO sources (
-                source_type, source_key, content_hash, raw_path, extracted_path,
-                obsidian_path, last_processed_at, metadata_json
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ON CONFLICT(source_type, source_key) DO UPDATE SET
-                content_hash=excluded.content_hash,
-                raw_path=excluded.raw_path,
-                extracted_path=excluded.extracted_path,
-                obsidian_path=excluded.obsidian_path,
-                last_processed_at=excluded.last_processed_at,
-                metadata_json=excluded.metadata_json
-            """,
-            (
-                source_type,
-                source_key,
-                content_hash,
-                raw_path,
-                extracted_path,
-                obsidian_path,
-                now,
-                metadata_json,
-            ),
-        )
-        self.conn.commit()
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute(
+                """
+                INSERT INTO sources (
+                    source_type, source_key, content_hash, raw_path, extracted_path,
+                    obsidian_path, last_processed_at, metadata_json,
+                    size_bytes, mtime_ns, file_id, verified_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(source_type, source_key) DO UPDATE SET
+                    content_hash=excluded.content_hash,
+                    raw_path=excluded.raw_path,
+                    extracted_path=excluded.extracted_path,
+                    obsidian_path=excluded.obsidian_path,
+                    last_processed_at=excluded.last_processed_at,
+                    metadata_json=excluded.metadata_json,
+                    size_bytes=excluded.size_bytes,
+                    mtime_ns=excluded.mtime_ns,
+                    file_id=excluded.file_id,
+                    verified_at=excluded.verified_at
+                """,
+                (
+                    source_type,
+                    source_key,
+                    content_hash,
+                    raw_path,
+                    extracted_path,
+                    obsidian_path,
+                    now,
+                    metadata_json,
+                    size_bytes,
+                    mtime_ns,
+                    file_id,
+                    now,
+                ),
+            )
+            self._mark_dirty()
+
+    def update_fingerprint(
+        self,
+        source_type: str,
+        source_key: str,
+        size_bytes: int,
+        mtime_ns: int,
+        file_id: Optional[str],
+    ) -> None:
+        now = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute(
+                """
+                UPDATE sources
+                SET size_bytes = ?, mtime_ns = ?, file_id = ?, verified_at = ?
+                WHERE source_type = ? AND source_key = ?
+                """,
+                (size_bytes, mtime_ns, file_id, now, source_type, source_key),
+            )
+            self._mark_dirty()
 
     def list_sources(self, source_type: Optional[str] = None) -> list[Dict[str, Any]]:
-        cur = self.conn.cursor()
-        if source_type:
-            cur.execute("SELECT * FROM sources WHERE source_type = ?", (source_type,))
-        else:
-            cur.execute("SELECT * FROM sources")
-        rows = cur.fetchall()
-        return [dict(row) for row in rows]
+        with self._lock:
+            cur = self.conn.cursor()
+            if source_type:
+                cur.execute("SELECT * FROM sources WHERE source_type = ?", (source_type,))
+            else:
+                cur.execute("SELECT * FROM sources")
+            rows = cur.fetchall()
+            return [dict(row) for row in rows]
 
     def count_sources(self, source_type: Optional[str] = None) -> int:
-        cur = self.conn.cursor()
-        if source_type:
-            cur.execute("SELECT COUNT(*) FROM sources WHERE source_type = ?", (source_type,))
-        else:
-            cur.execute("SELECT COUNT(*) FROM sources")
-        return int(cur.fetchone()[0])
+        with self._lock:
+            cur = self.conn.cursor()
+            if source_type:
+                cur.execute("SELECT COUNT(*) FROM sources WHERE source_type = ?", (source_type,))
+            else:
+                cur.execute("SELECT COUNT(*) FROM sources")
+            return int(cur.fetchone()[0])
+
+    def get_extraction(
+        self, raw_hash: str, extractor_version: str, char_budget: int
+    ) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute(
+                """
+                SELECT * FROM extraction_cache
+                WHERE raw_hash = ? AND extractor_version = ? AND char_budget = ?
+                """,
+                (raw_hash, extractor_version, char_budget),
+            )
+            row = cur.fetchone()
+            return dict(row) if row else None
+
+    def put_extraction(
+        self,
+        raw_hash: str,
+        extractor_version: str,
+        char_budget: int,
+        content_hash: str,
+        text_bytes: int,
+        metadata: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        now = datetime.now(timezone.utc).isoformat()
+        metadata_json = json.dumps(metadata or {}, ensure_ascii=True)
+        with self._lock:
+            self.conn.execute(
+                """
+                INSERT OR REPLACE INTO extraction_cache (
+                    raw_hash, extractor_version, char_budget, content_hash,
+                    text_bytes, metadata_json, created_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    raw_hash,
+                    extractor_version,
+                    char_budget,
+                    content_hash,
+                    text_bytes,
+                    metadata_json,
+                    now,
+                ),
+            )
+            self._mark_dirty()
+
+    def extraction_cache_stats(self) -> Dict[str, int]:
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute("SELECT COUNT(*), COALESCE(SUM(text_bytes), 0) FROM extraction_cache")
+            entries, text_bytes = cur.fetchone()
+            return {"entries": int(entries), "bytes": int(text_bytes)}
+
+    def increment_counter(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.conn.execute(
+                """
+                INSERT INTO counters (name, value) VALUES (?, ?)
+                ON CONFLICT(name) DO UPDATE SET value = value + excluded.value
+                """,
+                (name, amount),
+            )
+            self._mark_dirty()
+
+    def get_counter(self, name: str) -> int:
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute("SELECT value FROM counters WHERE name = ?", (name,))
+            row = cur.fetchone()
+            return int(row[0]) if row else 0
+
+    def record_file_metrics(self, row: Dict[str, Any]) -> None:
+        columns = ", ".join(row)
+        placeholders = ", ".join("?" for _ in row)
+        with self._lock:
+            self.conn.execute(
+                f"INSERT INTO file_metrics ({columns}) VALUES ({placeholders})",
+                tuple(row.values()),
+            )
+            self._mark_dirty()
+
+    def file_metrics_since(self, since: datetime) -> list[Dict[str, Any]]:
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute(
+                "SELECT * FROM file_metrics WHERE recorded_at >= ? ORDER BY recorded_at",
+                (since.isoformat(),),
+            )
+            return [dict(row) for row in cur.fetchall()]
+
+    def prune_file_metrics(self, retention_days: float, now: Optional[datetime] = None) -> int:
+        now = now or datetime.now(timezone.utc)
+        cutoff = (now - timedelta(days=retention_days)).isoformat()
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute("DELETE FROM file_metrics WHERE recorded_at < ?", (cutoff,))
+            self._commit()
+            return cur.rowcount
+
+    def referenced_blob_hashes(self, source_type: str) -> Tuple[Set[str], Set[str]]:
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute(
+                "SELECT raw_path, content_hash FROM sources WHERE source_type = ?",
+                (source_type,),
+            )
+            rows = cur.fetchall()
+            cur.execute("SELECT content_hash FROM extraction_cache")
+            cached = cur.fetchall()
+        raw_hashes = {Path(row[0]).name.split(".", 1)[0] for row in rows if row[0]}
+        content_hashes = {row[1] for row in rows} | {row[0] for row in cached}
+        return raw_hashes, content_hashes
+
+    def relink_blob_paths(
+        self, source_type: str, locate: Callable[[str, str], Optional[Path]]
+    ) -> int:
+        """Point every row at the blob's current location; ``locate(kind, recorded_path)``."""
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute(
+                "SELECT id, raw_path, extracted_path FROM sources WHERE source_type = ?",
+                (source_type,),
+            )
+            rows = cur.fetchall()
+        updates = []
+        for row_id, raw_path, extracted_path in rows:
+            current = []
+            for kind, recorded in (("raw", raw_path), ("extracted", extracted_path)):
+                found = locate(kind, recorded) if recorded else None
+                current.append(str(found) if found is not None else recorded)
+            if current != [raw_path, extracted_path]:
+                updates.append((*current, row_id))
+        if updates:
+            with self._lock:
+                self.conn.executemany(
+                    "UPDATE sources SET raw_path = ?, extracted_path = ? WHERE id = ?", updates
+                )
+                self._mark_dirty()
+        return len(updates)
 
     def log_event(self, event_type: str, details: Optional[Dict[str, Any]] = None) -> None:
         if not self.log_events:
             return
         now = datetime.now(timezone.utc).isoformat()
         details_json = json.dumps(details or {}, ensure_ascii=True)
-        cur = self.conn.cursor()
-        cur.execute(
-            "INSERT INTO events (event_time, event_type, details_json) VALUES (?, ?, ?)",
-            (now, event_type, details_json),
-        )
-        self.conn.commit()
+        with self._events_lock:
+            self._events.append((now, event_type, details_json))
+            pending = len(self._events)
+        if pending >= self.event_batch_size:
+            self._wake_event.set()
+
+    def compact_events(
+        self,
+        raw_retention_days: float,
+        hourly_retention_days: float,
+        now: Optional[datetime] = None,
+    ) -> Dict[str, int]:
+        now = now or datetime.now(timezone.utc)
+        raw_cutoff = (now - timedelta(days=raw_retention_days)).isoformat()
+        hourly_cutoff = (now - timedelta(days=hourly_retention_days)).isoformat()
+        with self._lock:
+            self._write_events()
+            cur = self.conn.cursor()
+            cur.execute(
+                """
+                INSERT INTO event_rollups (granularity, bucket_start, event_type, event_count)
+                SELECT 'hour', substr(event_time, 1, 13) || ':00:00+00:00', event_type, COUNT(*)
+                FROM events
+                WHERE event_time < ?
+                GROUP BY substr(event_time, 1, 13), event_type
+                ON CONFLICT(granularity, bucket_start, event_type) DO UPDATE SET
+                    event_count = event_count + excluded.event_count
+                """,
+                (raw_cutoff,),
+            )
+            cur.execute("DELETE FROM events WHERE event_time < ?", (raw_cutoff,))
+            raw_compacted = cur.rowcount
+            cur.execute(
+                """
+                INSERT INTO event_rollups (granularity, bucket_start, event_type, event_count)
+                SELECT 'day', substr(bucket_start, 1, 10) || 'T00:00:00+00:00', event_type,
+                    SUM(event_count)
+                FROM event_rollups
+                WHERE granularity = 'hour' AND bucket_start < ?
+                GROUP BY substr(bucket_start, 1, 10), event_type
+                ON CONFLICT(granularity, bucket_start, event_type) DO UPDATE SET
+                    event_count = event_count + excluded.event_count
+                """,
+                (hourly_cutoff,),
+            )
+            cur.execute(
+                "DELETE FROM event_rollups WHERE granularity = 'hour' AND bucket_start < ?",
+                (hourly_cutoff,),
+            )
+            hourly_compacted = cur.rowcount
+            self._commit()
+        return {"raw_compacted": raw_compacted, "hourly_compacted": hourly_compacted}
+
+    def count_events(
+        self,
+        event_type: Optional[str] = None,
+        since: Optional[datetime] = None,
+    ) -> int:
+        since_iso = since.isoformat() if since else ""
+        type_filter = "AND event_type = ?" if event_type else ""
+        params: Tuple[Any, ...] = (since_iso, event_type) if event_type else (since_iso,)
+        with self._lock:
+            self._write_events()
+            cur = self.conn.cursor()
+            cur.execute(
+                f"SELECT COUNT(*) FROM events WHERE event_time >= ? {type_filter}",
+                params,
+            )
+            raw = int(cur.fetchone()[0])
+            cur.execute(
+                f"""
+                SELECT COALESCE(SUM(event_count), 0) FROM event_rollups
+                WHERE bucket_start >= ? {type_filter}
+                """,
+                params,
+            )
+            return raw + int(cur.fetchone()[0])
@@ -0,0 +1,171 @@
+﻿from __future__ import annotations
+
+import logging
+import multiprocessing
+import threading
+from multiprocessing.pool import Pool
+from pathlib import Path
+from typing import Dict, Optional, Set, Tuple
+
+from ..data_lake import RawSnapshot
+from .extractor import BINARY_EXTENSIONS, extract_text
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+_logger = logging.getLogger(__name__)
+
+_MAX_TASKS_PER_CHILD = 50
+
+
+class ExtractionError(RuntimeError):
+    """The extraction worker timed out or crashed; the file should be retried later."""
+
+
+def _limit_memory(limit_bytes: int) -> None:
+    if limit_bytes <= 0 or resource is None:
+        return
+    try:
+        resource.setrlimit(resource.RLIMIT_AS, (limit_bytes, limit_bytes))
+    except (ValueError, OSError) as exc:
+        _logger.warning("Could not limit extractor memory: %s", exc)
+
+
+def _extract_in_worker(
+    path: str, data_path: str, max_bytes: int, char_budget: int
+) -> Optional[Tuple[str, dict]]:
+    # data_path is the snapshot's private copy, never the source that may change meanwhile
+    data = Path(data_path).read_bytes()
+    return extract_text(Path(path), max_bytes, buffer=data, char_budget=char_budget)
+
+
+class ExtractionExecutor:
+    def __init__(
+        self,
+        workers: int,
+        timeout_sec: float,
+        memory_limit_mb: int = 0,
+        max_tasks_per_child: int = _MAX_TASKS_PER_CHILD,
+    ) -> None:
+        self.workers = max(0, workers)
+        self.timeout_sec = timeout_sec
+        self.memory_limit_bytes = max(0, memory_limit_mb) * 1024 * 1024
+        if self.memory_limit_bytes and resource is None:
+            _logger.warning(
+                "EXTRACT_MEMORY_LIMIT_MB=%d is not enforced on this platform; "
+                "extraction workers run without a memory limit",
+                memory_limit_mb,
+            )
+            self.memory_limit_bytes = 0
+        self.max_tasks_per_child = max_tasks_per_child
+        self._lock = threading.Lock()
+        self._pool: Optional[Pool] = None
+        # tasks still running per pool, and pools retired after a timeout
+        self._active: Dict[Pool, int] = {}
+        self._retired: Set[Pool] = set()
+        self._stats_lock = threading.Lock()
+        self._in_process = 0
+        self._in_pool = 0
+        self._timeouts = 0
+        self._errors = 0
+        self._restarts = 0
+
+    def __enter__(self) -> "ExtractionExecutor":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def close(self) -> None:
+        with self._lock:
+            pools = set(self._retired)
+            if self._pool is not None:
+                pools.add(self._pool)
+            self._pool = None
+            self._retired.clear()
+            self._active.clear()
+        for pool in pools:
+            pool.terminate()
+            pool.join()
+
+    def _acquire_pool(self) -> Pool:
+        with self._lock:
+            if self._pool is None:
+                # spawn avoids forking a process that already runs watcher and LLM threads
+                context = multiprocessing.get_context("spawn")
+                self._pool = context.Pool(
+                    self.workers,
+                    initializer=_limit_memory,
+                    initargs=(self.memory_limit_bytes,),
+                    maxtasksperchild=self.max_tasks_per_child,
+                )
+            self._active[self._pool] = self._active.get(self._pool, 0) + 1
+            return self._pool
+
+    def _release_pool(self, pool: Pool, timed_out: bool = False) -> None:
+        with self._lock:
+            self._active[pool] = self._active.get(pool, 1) - 1
+            if timed_out and self._pool is pool:
+                # new tasks go to a fresh pool; the others already running here may finish
+                self._pool = None
+                self._retired.add(pool)
+                self._count("_restarts")
+            idle = pool in self._retired and self._active[pool] <= 0
+            if idle:
+                self._retired.discard(pool)
+                del self._active[pool]
+        if idle:
+            # only the hung worker is left, so terminating cannot cut off another file
+            pool.terminate()
+            pool.join()
+
+    def _count(self, name: str) -> None:
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def uses_pool(self, path: Path) -> bool:
+        return self.workers > 0 and path.suffix.lower() in BINARY_EXTENSIONS
+
+    def extract(
+        self,
+        path: Path,
+        max_bytes: int,
+        snapshot: RawSnapshot,
+        char_budget: int = 0,
+    ) -> Optional[Tuple[str, dict]]:
+        if not self.uses_pool(path):
+            self._count("_in_process")
+            return extract_text(path, max_bytes, buffer=snapshot.buffer, char_budget=char_budget)
+        self._count("_in_pool")
+        pool = self._acquire_pool()
+        timed_out = False
+        try:
+            pending = pool.apply_async(
+                _extract_in_worker, (str(path), str(snapshot.data_path), max_bytes, char_budget)
+            )
+            return pending.get(self.timeout_sec)
+        except multiprocessing.TimeoutError:
+            _logger.warning("Extraction timed out after %.1fs: %s", self.timeout_sec, path)
+            self._count("_timeouts")
+            timed_out = True
+            raise ExtractionError(
+                f"Extraction timed out after {self.timeout_sec:.1f}s: {path}"
+            ) from None
+        except Exception as exc:
+            _logger.warning("Extraction worker failed: %s (%s)", path, exc)
+            self._count("_errors")
+            raise ExtractionError(f"Extraction worker failed: {path} ({exc!r})") from exc
+        finally:
+            self._release_pool(pool, timed_out)
+
+    def stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return {
+                "in_process": self._in_process,
+                "in_pool": self._in_pool,
+                "timeouts": self._timeouts,
+                "errors": self._errors,
+                "restarts": self._restarts,
+            }
@@ -1,8 +1,9 @@
 ﻿from __future__ import annotations
 
+import io
 import logging
 from pathlib import Path
-from typing import Optional, Tuple
+from typing import Any, BinaryIO, Dict, Iterable, List, Optional, Tuple, Union
 
 TEXT_EXTENSIONS = {
     ".txt",
@@ -26,6 +27,13 @@ BINARY_EXTENSIONS = {
     ".docx",
 }
 
+# Bump when extraction output changes so cached extractions keyed by raw bytes are not reused.
+EXTRACTOR_VERSION = "1"
+
+# Budgets at or below this sample the front, middle and back of a PDF instead of reading it in order.
+PDF_SAMPLE_BUDGET_CHARS = 32_000
+PDF_GAP_MARKER = "[...]"
+
 _logger = logging.getLogger(__name__)
 
 try:
@@ -39,31 +47,109 @@ except ImportError:  # pragma: no cover - optional dependency
     docx = None
 
 
-def _read_text_file(path: Path) -> str:
+Buffer = Union[bytes, bytearray, memoryview, Any]
+
+
+def _as_stream(path: Path, buffer: Optional[Buffer]) -> Union[str, BinaryIO]:
+    if buffer is None:
+        return str(path)
+    if isinstance(buffer, (bytes, bytearray, memoryview)):
+        return io.BytesIO(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def _read_text_file(path: Path, buffer: Optional[Buffer] = None) -> str:
+    if buffer is not None:
+        return str(buffer, "utf-8", "replace")
     return path.read_text(encoding="utf-8", errors="replace")
 
 
-def _read_pdf(path: Path) -> Optional[str]:
+def _page_text(path: Path, reader: Any, index: int) -> str:
     try:
-        reader = PdfReader(str(path))
-        chunks = []
-        for page in reader.pages:
-            try:
-                page_text = page.extract_text() or ""
-            except Exception as exc:
-                _logger.warning("PDF page extract failed: %s (%s)", path, exc)
+        return reader.pages[index].extract_text() or ""
+    except Exception as exc:
+        _logger.warning("PDF page extract failed: %s (%s)", path, exc)
+        return ""
+
+
+def _page_ranges(pages: Iterable[int]) -> List[List[int]]:
+    ranges: List[List[int]] = []
+    for page in sorted(pages):
+        if ranges and ranges[-1][1] == page - 1:
+            ranges[-1][1] = page
+        else:
+            ranges.append([page, page])
+    return ranges
+
+
+class _PageCollector:
+    def __init__(self, path: Path, reader: Any) -> None:
+        self.path = path
+        self.reader = reader
+        self.total = len(reader.pages)
+        self.texts: Dict[int, str] = {}
+        self.truncated = False
+
+    def read(self, indexes: Iterable[int], budget: Optional[int]) -> int:
+        used = 0
+        for index in indexes:
+            if budget is not None and used >= budget:
+                break
+            if index in self.texts:
                 continue
-            if page_text:
-                chunks.append(page_text)
-        return "\n".join(chunks)
+            page_text = _page_text(self.path, self.reader, index)
+            if budget is not None and used + len(page_text) > budget:
+                page_text = page_text[: budget - used]
+                self.truncated = True
+            self.texts[index] = page_text
+            used += len(page_text) + 1
+        return used
+
+    def text(self) -> str:
+        parts: List[str] = []
+        previous = None
+        for index in sorted(self.texts):
+            if previous is not None and index != previous + 1:
+                parts.append(PDF_GAP_MARKER)
+            if self.texts[index]:
+                parts.append(self.texts[index])
+            previous = index
+        return "\n".join(parts)
+
+    def metadata(self) -> Dict[str, Any]:
+        return {
+            "pages_total": self.total,
+            "pages_covered": _page_ranges(index + 1 for index in self.texts),
+            "complete": len(self.texts) == self.total and not self.truncated,
+        }
+
+
+def _read_pdf(
+    path: Path,
+    buffer: Optional[Buffer] = None,
+    char_budget: int = 0,
+) -> Optional[Tuple[str, Dict[str, Any]]]:
+    try:
+        pages = _PageCollector(path, PdfReader(_as_stream(path, buffer)))
+        total = pages.total
+        if char_budget <= 0:
+            pages.read(range(total), None)
+        elif char_budget > PDF_SAMPLE_BUDGET_CHARS:
+            pages.read(range(total), char_budget)
+        else:
+            remaining = char_budget - pages.read(range(total), char_budget // 2)
+            remaining -= pages.read(range(total // 2, total), remaining // 2)
+            pages.read(range(total - 1, -1, -1), remaining)
+        return pages.text(), pages.metadata()
     except Exception as exc:
         _logger.warning("PDF read failed: %s (%s)", path, exc)
         return None
 
 
-def _read_docx(path: Path) -> Optional[str]:
+def _read_docx(path: Path, buffer: Optional[Buffer] = None) -> Optional[str]:
     try:
-        document = docx.Document(str(path))
+        document = docx.Document(_as_stream(path, buffer))
         try:
             chunks = [paragraph.text for paragraph in document.paragraphs if paragraph.text]
         except Exception as exc:
@@ -75,32 +161,41 @@ def _read_docx(path: Path) -> Optional[str]:
         return None
 
 
-def extract_text(path: Path, max_bytes: int) -> Optional[Tuple[str, dict]]:
-    if not path.exists() or not path.is_file():
+def extract_text(
+    path: Path,
+    max_bytes: int,
+    buffer: Optional[Buffer] = None,
+    char_budget: int = 0,
+) -> Optional[Tuple[str, dict]]:
+    if buffer is None and (not path.exists() or not path.is_file()):
         return None
     extension = path.suffix.lower()
     if extension not in TEXT_EXTENSIONS and extension not in BINARY_EXTENSIONS:
         return None
-    size = path.stat().st_size
+    size = len(buffer) if buffer is not None else path.stat().st_size
     if size > max_bytes:
         return None
+    pages: Dict[str, Any] = {}
     if extension in TEXT_EXTENSIONS:
-        text = _read_text_file(path)
+        text = _read_text_file(path, buffer)
     elif extension == ".pdf":
         if PdfReader is None:
             _logger.warning("Skipping PDF because pypdf is not available: %s", path)
             return None
         try:
-            text = _read_pdf(path)
+            result = _read_pdf(path, buffer, char_budget)
         except Exception as exc:
             _logger.warning("PDF extract failed: %s (%s)", path, exc)
             return None
+        if result is None:
+            return None
+        text, pages = result
     elif extension == ".docx":
         if docx is None:
             _logger.warning("Skipping DOCX because python-docx is not available: %s", path)
             return None
         try:
-            text = _read_docx(path)
+            text = _read_docx(path, buffer)
         except Exception as exc:
             _logger.warning("DOCX extract failed: %s (%s)", path, exc)
             return None
@@ -111,5 +206,6 @@ def extract_text(path: Path, max_bytes: int) -> Optional[Tuple[str, dict]]:
     metadata = {
         "extension": extension,
         "size_bytes": size,
+        **pages,
     }
     return text, metadata
@@ -0,0 +1,76 @@
+﻿from __future__ import annotations
+
+import fnmatch
+import os
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import FrozenSet, Iterable, Optional, Tuple
+
+from ..config import AppConfig
+from .extractor import BINARY_EXTENSIONS, TEXT_EXTENSIONS
+
+_CASE_INSENSITIVE = os.path.normcase("A") == "a"
+_WILDCARDS = set("*?[")
+
+
+def _fold(value: str) -> str:
+    return value.lower() if _CASE_INSENSITIVE else value
+
+
+class PathFilter:
+    def __init__(
+        self,
+        exclude_dirs: Iterable[str],
+        exclude_globs: Iterable[str],
+        extensions: Optional[Iterable[str]] = None,
+    ) -> None:
+        self.exclude_dirs: FrozenSet[str] = frozenset(d.lower() for d in exclude_dirs)
+        self.extensions: Optional[FrozenSet[str]] = (
+            frozenset(ext.lower() for ext in extensions) if extensions is not None else None
+        )
+        suffixes = set()
+        names = set()
+        patterns = []
+        for glob in exclude_globs:
+            glob = _fold(glob)
+            tail = glob[1:]
+            if glob.startswith("*.") and tail.count(".") == 1 and not _WILDCARDS & set(tail):
+                suffixes.add(tail)
+            elif not _WILDCARDS & set(glob):
+                names.add(glob)
+            else:
+                patterns.append(fnmatch.translate(glob))
+        self._suffixes: FrozenSet[str] = frozenset(suffixes)
+        self._names: FrozenSet[str] = frozenset(names)
+        self._regex = re.compile("|".join(patterns)) if patterns else None
+
+    @classmethod
+    def from_config(cls, config: AppConfig) -> "PathFilter":
+        return _compiled(tuple(config.exclude_dirs), tuple(config.exclude_globs))
+
+    def excludes_dir(self, name: str) -> bool:
+        return name.lower() in self.exclude_dirs
+
+    def accepts_name(self, name: str) -> bool:
+        if self.extensions is not None and os.path.splitext(name)[1].lower() not in self.extensions:
+            return False
+        folded = _fold(name)
+        if folded in self._names:
+            return False
+        dot = folded.rfind(".")
+        if dot >= 0 and folded[dot:] in self._suffixes:
+            return False
+        if self._regex is not None and self._regex.match(folded):
+            return False
+        return True
+
+    def accepts_path(self, path: Path) -> bool:
+        if any(part.lower() in self.exclude_dirs for part in path.parts[:-1]):
+            return False
+        return self.accepts_name(path.name)
+
+
+@lru_cache(maxsize=8)
+def _compiled(exclude_dirs: Tuple[str, ...], exclude_globs: Tuple[str, ...]) -> PathFilter:
+    return PathFilter(exclude_dirs, exclude_globs, TEXT_EXTENSIONS | BINARY_EXTENSIONS)
@@ -0,0 +1,266 @@
+﻿from __future__ import annotations
+
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from queue import Empty, Queue
+from typing import Any, Callable, Iterable, List, Optional
+
+from ..config import AppConfig
+from ..db import MetadataDB
+from ..llm_client import LLMClient, UsageLog, estimate_tokens, track_usage
+from ..metrics import FileMetrics
+from .extract_pool import ExtractionExecutor
+from .processor import PreparedFile, normalize_prepared, prepare_file, write_prepared
+
+
+_STOP = object()
+
+_BATCH_LINGER_SEC = 0.2
+
+
+@dataclass
+class PipelineStats:
+    submitted: int = 0
+    processed: int = 0
+    skipped: int = 0
+    failed: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, name: str, count: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + count)
+
+
+class _Stage:
+    def __init__(
+        self,
+        name: str,
+        workers: int,
+        handler: Callable[[Any], None],
+        queue_size: int,
+        on_idle: Optional[Callable[[], None]] = None,
+        idle_sec: float = _BATCH_LINGER_SEC,
+    ) -> None:
+        self.name = name
+        self.handler = handler
+        self.on_idle = on_idle
+        self.idle_sec = idle_sec
+        self.queue: Queue[Any] = Queue(maxsize=max(1, queue_size))
+        self._threads = [
+            threading.Thread(target=self._run, name=f"{name}-{index}", daemon=True)
+            for index in range(max(1, workers))
+        ]
+
+    def start(self) -> None:
+        for thread in self._threads:
+            thread.start()
+
+    def put(self, item: Any) -> None:
+        self.queue.put(item)
+
+    def close(self) -> None:
+        for _ in self._threads:
+            self.queue.put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                item = self.queue.get(timeout=self.idle_sec if self.on_idle else None)
+            except Empty:
+                self.on_idle()
+                continue
+            try:
+                if item is _STOP:
+                    if self.on_idle:
+                        self.on_idle()
+                    return
+                self.handler(item)
+            finally:
+                self.queue.task_done()
+
+
+class BackfillPipeline:
+    def __init__(
+        self,
+        config: AppConfig,
+        db: MetadataDB,
+        llm: LLMClient,
+        force: bool = False,
+        verify: bool = False,
+        on_done: Optional[Callable[[Path], None]] = None,
+        extractor: Optional[ExtractionExecutor] = None,
+    ) -> None:
+        self.config = config
+        self.db = db
+        self.llm = llm
+        self.force = force
+        self.verify = verify
+        self.on_done = on_done
+        self.extractor = extractor
+        self.stats = PipelineStats()
+        self._stop_event = threading.Event()
+        queue_size = config.backfill_queue_size
+        self._write = _Stage("write", config.backfill_write_workers, self._write_one, queue_size)
+        # which files share a batch depends on timing, so the batched payloads would never
+        # match a recorded cassette; with a cassette every file is sent on its own
+        self._batching = config.llm_batch_enabled and config.llm_cassette_mode == "off"
+        self._batch: List[PreparedFile] = []
+        self._batch_tokens = 0
+        self._batch_lock = threading.Lock()
+        self._normalize = _Stage(
+            "llm",
+            config.backfill_llm_workers,
+            self._normalize_one,
+            queue_size,
+            on_idle=self._flush_batch if self._batching else None,
+        )
+        self._extract = _Stage("extract", config.backfill_extract_workers, self._extract_one, queue_size)
+
+    def request_stop(self) -> None:
+        self._stop_event.set()
+
+    def run(self, paths: Iterable[Path]) -> PipelineStats:
+        stages: List[_Stage] = [self._write, self._normalize, self._extract]
+        for stage in stages:
+            stage.start()
+        try:
+            for path in paths:
+                if self._stop_event.is_set():
+                    break
+                self.stats.add("submitted")
+                self._extract.put(path)
+        finally:
+            for stage in reversed(stages):
+                stage.close()
+        return self.stats
+
+    def _fail(
+        self,
+        path: Path,
+        exc: Exception,
+        metrics: Optional[FileMetrics] = None,
+        stage: Optional[str] = None,
+    ) -> None:
+        self.stats.add("failed")
+        self.db.log_event("file_failed", {"path": str(path), "error": str(exc)})
+        if metrics is not None:
+            metrics.fail(exc)
+            metrics.failed_stage = metrics.failed_stage or stage
+            self.db.record_file_metrics(metrics.as_row())
+        self._done(path)
+
+    def _done(self, path: Path) -> None:
+        if self.on_done:
+            self.on_done(path)
+
+    def _extract_one(self, path: Path) -> None:
+        if self._stop_event.is_set():
+            self._done(path)
+            return
+        metrics = FileMetrics(path)
+        try:
+            prepared = prepare_file(
+                path,
+                self.config,
+                self.db,
+                force=self.force,
+                verify=self.verify,
+                extractor=self.extractor,
+                metrics=metrics,
+            )
+        except Exception as exc:
+            self._fail(path, exc, metrics)
+            return
+        if not isinstance(prepared, PreparedFile):
+            self.stats.add("skipped")
+            self.db.record_file_metrics(metrics.as_row())
+            self._done(path)
+            return
+        self._normalize.put(prepared)
+
+    def _batchable(self, prepared: PreparedFile) -> bool:
+        limit = min(self.config.llm_batch_max_doc_chars, self.config.llm_max_input_chars)
+        return self._batching and len(prepared.text) <= limit
+
+    def _take_batch(self) -> List[PreparedFile]:
+        batch, self._batch = self._batch, []
+        self._batch_tokens = 0
+        return batch
+
+    def _flush_batch(self) -> None:
+        with self._batch_lock:
+            batch = self._take_batch()
+        if batch:
+            self._normalize_batch(batch)
+
+    def _normalize_batch(self, batch: List[PreparedFile]) -> None:
+        if self._stop_event.is_set():
+            for prepared in batch:
+                self._done(prepared.path)
+            return
+        started = time.perf_counter()
+        with track_usage() as usage:
+            try:
+                results = self.llm.normalize_batch(
+                    [(prepared.text, prepared.source_info) for prepared in batch],
+                    max_tokens=self.config.llm_batch_max_tokens,
+                    max_documents=self.config.llm_batch_max_docs,
+                )
+            except Exception as exc:
+                self._share_batch_usage(batch, usage, time.perf_counter() - started)
+                for prepared in batch:
+                    self._fail(prepared.path, exc, prepared.metrics, stage="llm")
+                return
+        self._share_batch_usage(batch, usage, time.perf_counter() - started)
+        for prepared, result in zip(batch, results):
+            if isinstance(result, Exception):
+                self._fail(prepared.path, result, prepared.metrics, stage="llm")
+            else:
+                self._write.put((prepared, result))
+
+    @staticmethod
+    def _share_batch_usage(batch: List[PreparedFile], usage: UsageLog, elapsed: float) -> None:
+        # one request served the whole batch, so each file carries an equal share of it
+        for prepared in batch:
+            if prepared.metrics is not None:
+                prepared.metrics.add_time("llm", elapsed / len(batch))
+                prepared.metrics.add_usage(usage, share=len(batch))
+
+    def _normalize_one(self, prepared: PreparedFile) -> None:
+        if self._stop_event.is_set():
+            self._done(prepared.path)
+            return
+        if self._batchable(prepared):
+            with self._batch_lock:
+                self._batch.append(prepared)
+                self._batch_tokens += estimate_tokens(prepared.text)
+                full = (
+                    len(self._batch) >= self.config.llm_batch_max_docs
+                    or self._batch_tokens >= self.config.llm_batch_max_tokens
+                )
+                batch = self._take_batch() if full else []
+            if batch:
+                self._normalize_batch(batch)
+            return
+        try:
+            payload = normalize_prepared(prepared, self.config, self.llm)
+        except Exception as exc:
+            self._fail(prepared.path, exc, prepared.metrics)
+            return
+        self._write.put((prepared, payload))
+
+    def _write_one(self, item: tuple[PreparedFile, dict]) -> None:
+        prepared, payload = item
+        try:
+            write_prepared(prepared, payload, self.config, self.db)
+        except Exception as exc:
+            self._fail(prepared.path, exc, prepared.metrics)
+            return
+        self.stats.add("processed")
+        if prepared.metrics is not None:
+            self.db.record_file_metrics(prepared.metrics.as_row())
+        self._done(prepared.path)
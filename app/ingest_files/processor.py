@@ -1,110 +1,308 @@
 ﻿from __future__ import annotations
 
-import fnmatch
 import hashlib
-from datetime import datetime, timezone
+import json
+import os
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, Optional
+from typing import Any, Dict, Iterator, Optional, Tuple, Union
 
 from rich.console import Console
 
+from ..chunking import normalize_chunked
 from ..config import AppConfig
+from ..data_lake import DataLake, RawSnapshot
 from ..db import MetadataDB
-from ..llm_client import LLMClient
+from ..llm_client import LLMClient, track_usage
+from ..metrics import FileMetrics
 from ..obsidian_writer import make_obsidian_path, write_markdown
 from ..render_md import render_source_card
-from .extractor import extract_text
+from .extract_pool import ExtractionExecutor
+from .extractor import BINARY_EXTENSIONS, EXTRACTOR_VERSION, extract_text
+from .path_filter import PathFilter
 
 
 _console = Console()
+_status_lock = threading.Lock()
+
+
+class _NullStatus:
+    def update(self, status: str) -> None:
+        pass
+
+
+@contextmanager
+def _file_status(status: str) -> Iterator[Any]:
+    # Rich allows one live display per console; concurrent workers run without a spinner.
+    if not _status_lock.acquire(blocking=False):
+        yield _NullStatus()
+        return
+    try:
+        with _console.status(status, spinner="dots") as live:
+            yield live
+    finally:
+        _status_lock.release()
 
 
 def _hash_text(text: str) -> str:
     return hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
 
 
-def _hash_bytes(blob: bytes) -> str:
-    return hashlib.sha256(blob).hexdigest()
+@dataclass(frozen=True)
+class FileFingerprint:
+    size_bytes: int
+    mtime_ns: int
+    file_id: str
+
+    @classmethod
+    def from_stat(cls, stat: os.stat_result) -> "FileFingerprint":
+        return cls(
+            size_bytes=stat.st_size,
+            mtime_ns=stat.st_mtime_ns,
+            file_id=f"{stat.st_dev}:{stat.st_ino}",
+        )
+
+    def matches(self, row: Dict[str, Any]) -> bool:
+        return (
+            row.get("size_bytes") == self.size_bytes
+            and row.get("mtime_ns") == self.mtime_ns
+            and row.get("file_id") == self.file_id
+        )
+
+    def as_columns(self) -> Dict[str, Any]:
+        return {
+            "size_bytes": self.size_bytes,
+            "mtime_ns": self.mtime_ns,
+            "file_id": self.file_id,
+        }
 
 
-def _is_excluded(path: Path, config: AppConfig) -> bool:
-    for part in path.parts:
-        if part.lower() in config.exclude_dirs:
-            return True
-    name = path.name
-    return any(fnmatch.fnmatch(name, pattern) for pattern in config.exclude_globs)
+@dataclass(frozen=True)
+class PreparedFile:
+    path: Path
+    text: str
+    content_hash: str
+    raw_path: Path
+    extracted_path: Path
+    source_info: Dict[str, str]
+    fingerprint: FileFingerprint
+    extraction: Dict[str, Any] = field(default_factory=dict)
+    metrics: Optional[FileMetrics] = field(default=None, compare=False, repr=False)
 
 
-def process_file(
+def _metrics_for(prepared: PreparedFile) -> FileMetrics:
+    return prepared.metrics if prepared.metrics is not None else FileMetrics(prepared.path)
+
+
+def _deep_check_due(row: Dict[str, Any], config: AppConfig) -> bool:
+    if config.deep_check_interval_hours <= 0:
+        return False
+    verified_at = row.get("verified_at")
+    if not verified_at:
+        return True
+    try:
+        verified = datetime.fromisoformat(verified_at)
+    except ValueError:
+        return True
+    interval = timedelta(hours=config.deep_check_interval_hours)
+    return datetime.now(timezone.utc) - verified >= interval
+
+
+def _existing_result(row: Dict[str, Any]) -> Optional[Path]:
+    return Path(row["obsidian_path"]) if row.get("obsidian_path") else None
+
+
+def _identity_hash(text: str, metadata: Dict[str, Any], raw_hash: str, budget: int) -> str:
+    if metadata.get("complete", True):
+        return _hash_text(text)
+    # the budget cut the extraction short, so the text does not identify the whole file
+    return _hash_text(f"raw:{raw_hash}:{budget}")
+
+
+def _extract_cached(
     path: Path,
+    snapshot: RawSnapshot,
     config: AppConfig,
     db: MetadataDB,
-    llm: LLMClient,
-    force: bool = False,
-) -> Optional[Path]:
-    if not path.exists() or not path.is_file():
-        return None
-    if _is_excluded(path, config):
+    data_lake: DataLake,
+    extractor: Optional[ExtractionExecutor],
+    metrics: Optional[FileMetrics] = None,
+) -> Optional[Tuple[str, Dict[str, Any], str]]:
+    cacheable = config.extract_cache_enabled and path.suffix.lower() in BINARY_EXTENSIONS
+    budget = config.extract_char_budget
+    if cacheable:
+        cached = db.get_extraction(snapshot.raw_hash, EXTRACTOR_VERSION, budget)
+        text = data_lake.read_extracted(cached["content_hash"]) if cached else None
+        if text is not None:
+            db.increment_counter("extraction_cache_hits")
+            if metrics is not None:
+                metrics.extract_cache_hit = True
+            return text, json.loads(cached.get("metadata_json") or "{}"), cached["content_hash"]
+        db.increment_counter("extraction_cache_misses")
+
+    if extractor is not None:
+        extracted = extractor.extract(path, config.max_file_bytes, snapshot, char_budget=budget)
+    else:
+        extracted = extract_text(
+            path,
+            config.max_file_bytes,
+            buffer=snapshot.buffer,
+            char_budget=budget,
+        )
+    if not extracted:
         return None
 
-    status = _console.status(f"抽出中: {path.name}", spinner="dots")
-    status.start()
-    try:
-        extracted = extract_text(path, config.max_file_bytes)
+    text, metadata = extracted
+    content_hash = _identity_hash(text, metadata, snapshot.raw_hash, budget)
+    if cacheable:
+        data_lake.write_extracted(content_hash, text)
+        db.put_extraction(
+            snapshot.raw_hash,
+            EXTRACTOR_VERSION,
+            budget,
+            content_hash,
+            len(text.encode("utf-8", errors="ignore")),
+            metadata,
+        )
+    return text, metadata, content_hash
+
+
+def prepare_file(
+    path: Path,
+    config: AppConfig,
+    db: MetadataDB,
+    force: bool = False,
+    verify: bool = False,
+    extractor: Optional[ExtractionExecutor] = None,
+    metrics: Optional[FileMetrics] = None,
+) -> Union[PreparedFile, Path, None]:
+    metrics = metrics if metrics is not None else FileMetrics(path)
+    with metrics.stage("stat"):
+        if not PathFilter.from_config(config).accepts_path(path):
+            return None
+        try:
+            stat = path.stat()
+        except OSError:
+            return None
+        if not path.is_file() or stat.st_size > config.max_file_bytes:
+            return None
+        metrics.size_bytes = stat.st_size
+        fingerprint = FileFingerprint.from_stat(stat)
+
+        existing = db.get_source("file", str(path))
+        if (
+            not force
+            and not verify
+            and existing
+            and fingerprint.matches(existing)
+            and not _deep_check_due(existing, config)
+        ):
+            metrics.outcome = "unchanged"
+            return _existing_result(existing)
+
+    data_lake = DataLake.from_config(config)
+    with metrics.stage("hash"):
+        snapshot = data_lake.snapshot_raw(path, config.max_file_bytes)
+    if snapshot is None:
+        return None
+    with snapshot:
+        with metrics.stage("extract"):
+            extracted = _extract_cached(path, snapshot, config, db, data_lake, extractor, metrics)
         if not extracted:
             return None
 
-        text, _ = extracted
-        content_hash = _hash_text(text)
+        text, extraction, content_hash = extracted
 
-        existing = db.get_source("file", str(path))
-        if not force and existing and existing.get("content_hash") == content_hash:
-            return Path(existing.get("obsidian_path")) if existing.get("obsidian_path") else None
-
-        same_hash = db.get_source_by_hash("file", content_hash)
-        if not force and same_hash and same_hash.get("obsidian_path"):
-            db.upsert_source(
-                source_type="file",
-                source_key=str(path),
-                content_hash=content_hash,
-                raw_path=same_hash.get("raw_path"),
-                extracted_path=same_hash.get("extracted_path"),
-                obsidian_path=same_hash.get("obsidian_path"),
-                metadata={"note": "deduplicated"},
-            )
-            return Path(same_hash.get("obsidian_path"))
-
-        raw_dir = config.raw_dir / "file"
-        extracted_dir = config.extracted_dir / "file"
-        raw_dir.mkdir(parents=True, exist_ok=True)
-        extracted_dir.mkdir(parents=True, exist_ok=True)
-
-        raw_bytes = path.read_bytes()
-        raw_hash = _hash_bytes(raw_bytes)
-        raw_filename = f"{raw_hash}{path.suffix.lower()}"
-        raw_path = raw_dir / raw_filename
-        if not raw_path.exists():
-            raw_path.write_bytes(raw_bytes)
-
-        extracted_path = extracted_dir / f"{content_hash}.txt"
-        if not extracted_path.exists():
-            extracted_path.write_text(text, encoding="utf-8")
-
-        source_info: Dict[str, str] = {
-            "path": str(path),
-            "raw_path": str(raw_path),
-            "size_bytes": str(path.stat().st_size),
-            "mtime": str(path.stat().st_mtime),
-        }
-        truncated_text = text[: config.llm_max_input_chars]
+        with metrics.stage("hash"):
+            if not force and existing and existing.get("content_hash") == content_hash:
+                db.update_fingerprint("file", str(path), **fingerprint.as_columns())
+                metrics.outcome = "unchanged"
+                return _existing_result(existing)
+
+            same_hash = db.get_source_by_hash("file", content_hash)
+            if not force and same_hash and same_hash.get("obsidian_path"):
+                db.upsert_source(
+                    source_type="file",
+                    source_key=str(path),
+                    content_hash=content_hash,
+                    raw_path=same_hash.get("raw_path"),
+                    extracted_path=same_hash.get("extracted_path"),
+                    obsidian_path=same_hash.get("obsidian_path"),
+                    metadata={"note": "deduplicated"},
+                    **fingerprint.as_columns(),
+                )
+                metrics.outcome = "dedup"
+                return Path(same_hash.get("obsidian_path"))
+
+        # only files that will actually be ingested are copied into raw/
+        with metrics.stage("write"):
+            raw_path = data_lake.publish_raw(snapshot)
+            extracted_path = data_lake.write_extracted(content_hash, text)
+
+    source_info: Dict[str, str] = {
+        "path": str(path),
+        "raw_path": str(raw_path),
+        "size_bytes": str(snapshot.size),
+        "mtime": str(stat.st_mtime),
+    }
+    return PreparedFile(
+        path=path,
+        text=text,
+        content_hash=content_hash,
+        raw_path=raw_path,
+        extracted_path=extracted_path,
+        source_info=source_info,
+        fingerprint=fingerprint,
+        extraction=extraction,
+        metrics=metrics,
+    )
 
-        status.update(f"正規化中 (LLM待機): {path.name}")
-        payload = llm.normalize(truncated_text, source_info)
 
+def normalize_prepared(prepared: PreparedFile, config: AppConfig, llm: LLMClient) -> Dict[str, Any]:
+    metrics = _metrics_for(prepared)
+    with track_usage() as usage:
+        try:
+            with metrics.stage("llm"):
+                return _normalize_text(prepared, config, llm)
+        finally:
+            metrics.add_usage(usage)
+
+
+def _normalize_text(prepared: PreparedFile, config: AppConfig, llm: LLMClient) -> Dict[str, Any]:
+    limit = config.llm_max_input_chars
+    if config.llm_context_tokens > 0:
+        limit = llm.input_char_limit(prepared.text, prepared.source_info, limit)
+    if config.llm_chunking and len(prepared.text) > limit:
+        return normalize_chunked(
+            llm,
+            prepared.text,
+            prepared.source_info,
+            chunk_chars=min(config.llm_chunk_chars, limit),
+            overlap_chars=config.llm_chunk_overlap_chars,
+            max_chunks=config.llm_max_chunks,
+            max_parallel=config.llm_chunk_parallel,
+            reduce=config.llm_chunk_reduce,
+        )
+    truncated_text = prepared.text[:limit]
+    return llm.normalize(truncated_text, prepared.source_info)
+
+
+def write_prepared(
+    prepared: PreparedFile,
+    payload: Dict[str, Any],
+    config: AppConfig,
+    db: MetadataDB,
+) -> Path:
+    path = prepared.path
+    metrics = _metrics_for(prepared)
+    with metrics.stage("render"):
         created_at = datetime.now(timezone.utc)
         source_links = [
             f"Original: {path.resolve().as_uri()}",
-            f"Raw: {raw_path.resolve().as_uri()}",
+            f"Raw: {prepared.raw_path.resolve().as_uri()}",
         ]
         markdown = render_source_card(
             payload=payload,
@@ -115,30 +313,67 @@ def process_file(
             template_path=config.obsidian_template_path,
         )
 
-        suffix = content_hash[:8]
+        suffix = prepared.content_hash[:8]
         obsidian_rel = make_obsidian_path(
             config.vault_path,
             config.obsidian_sources_subdir,
             payload.get("title", path.stem),
             suffix,
-            fallback=path.stem or content_hash[:8],
+            fallback=path.stem or prepared.content_hash[:8],
         )
 
-        status.update(f"書き込み中: {path.name}")
+    with metrics.stage("write"):
         obsidian_path = write_markdown(config.vault_path, obsidian_rel, markdown)
 
         db.upsert_source(
             source_type="file",
             source_key=str(path),
-            content_hash=content_hash,
-            raw_path=str(raw_path),
-            extracted_path=str(extracted_path),
+            content_hash=prepared.content_hash,
+            raw_path=str(prepared.raw_path),
+            extracted_path=str(prepared.extracted_path),
             obsidian_path=str(obsidian_path),
-            metadata={"source": "file"},
+            metadata={"source": "file", "extraction": prepared.extraction},
+            **prepared.fingerprint.as_columns(),
         )
-        db.log_event("file_processed", {"path": str(path), "hash": content_hash})
-        _console.print(f"[bold green]完了[/bold green] [cyan]{obsidian_path}[/cyan]")
+        db.log_event("file_processed", {"path": str(path), "hash": prepared.content_hash})
+    metrics.outcome = "processed"
+    return obsidian_path
+
+
+def process_file(
+    path: Path,
+    config: AppConfig,
+    db: MetadataDB,
+    llm: LLMClient,
+    force: bool = False,
+    verify: bool = False,
+    extractor: Optional[ExtractionExecutor] = None,
+) -> Optional[Path]:
+    metrics = FileMetrics(path)
+    try:
+        with _file_status(f"抽出中: {path.name}") as status:
+            prepared = prepare_file(
+                path,
+                config,
+                db,
+                force=force,
+                verify=verify,
+                extractor=extractor,
+                metrics=metrics,
+            )
+            if not isinstance(prepared, PreparedFile):
+                return prepared
+
+            status.update(f"正規化中 (LLM待機): {path.name}")
+            payload = normalize_prepared(prepared, config, llm)
+
+            status.update(f"書き込み中: {path.name}")
+            obsidian_path = write_prepared(prepared, payload, config, db)
+            _console.print(f"[bold green]完了[/bold green] [cyan]{obsidian_path}[/cyan]")
+    except Exception as exc:
+        metrics.fail(exc)
+        raise
     finally:
-        status.stop()
+        db.record_file_metrics(metrics.as_row())
 
     return obsidian_path
@@ -5,66 +5,210 @@ import sys
 import threading
 import time
 from pathlib import Path
-from typing import Iterable
+from typing import Callable, Optional
 
 from rich.console import Console
-from rich.progress import track
+from rich.progress import Progress
 
 from ..config import AppConfig
 from ..db import MetadataDB
+from ..llm_cache import NormalizationCache
+from ..llm_cassette import LLMCassette
 from ..llm_client import LLMClient
+from .extract_pool import ExtractionExecutor
+from .path_filter import PathFilter
+from .pipeline import BackfillPipeline, PipelineStats
 from .processor import process_file
+from .scan_state import ScanProgress, ScanSnapshot
 from .scanner import scan_paths
-from .watcher import DebounceQueue, Worker, start_periodic_scan, start_watcher
+from .watcher import (
+    PRIORITY_LIVE,
+    PRIORITY_SCAN,
+    DebounceQueue,
+    WorkerPool,
+    start_periodic_scan,
+    start_watcher,
+)
 
 
 _console = Console()
 
+_COMPACTION_INTERVAL_SEC = 3600
 
-def _make_worker(config: AppConfig) -> tuple[MetadataDB, LLMClient, Worker]:
-    db = MetadataDB(config.db_path, log_events=config.log_events)
-    llm = LLMClient(
+
+def _make_db(config: AppConfig) -> MetadataDB:
+    return MetadataDB(
+        config.db_path,
+        log_events=config.log_events,
+        synchronous=config.db_synchronous,
+        cache_mb=config.db_cache_mb,
+        mmap_mb=config.db_mmap_mb,
+        commit_batch_size=config.db_commit_batch_size,
+        commit_interval_sec=config.db_commit_interval_sec,
+        event_batch_size=config.event_batch_size,
+        event_flush_interval_sec=config.event_flush_interval_sec,
+    )
+
+
+def _compact_events(config: AppConfig, db: MetadataDB) -> None:
+    result = db.compact_events(config.event_retention_days, config.event_hourly_retention_days)
+    if result["raw_compacted"] or result["hourly_compacted"]:
+        db.log_event("events_compacted", result)
+    pruned = db.prune_file_metrics(config.metrics_retention_days)
+    if pruned:
+        db.log_event("file_metrics_pruned", {"rows": pruned})
+
+
+def _make_llm(config: AppConfig, db: MetadataDB) -> LLMClient:
+    cache = None
+    if config.llm_cache_enabled:
+        cache = NormalizationCache(config.cache_dir / "normalize", config.llm_cache_max_bytes)
+    cassette = None
+    if config.llm_cassette_mode != "off":
+        cassette = LLMCassette(config.llm_cassette_dir, config.llm_cassette_mode)
+    return LLMClient(
         base_url=config.llm_base_url,
         model=config.llm_model,
         timeout_sec=config.llm_timeout_sec,
         max_retries=config.llm_max_retries,
         language=config.llm_language,
         use_json_mode=config.llm_json_mode,
+        max_connections=config.llm_max_connections,
+        max_keepalive_connections=config.llm_max_keepalive_connections,
+        keepalive_expiry_sec=config.llm_keepalive_expiry_sec,
+        cache=cache,
+        stream=config.llm_stream,
+        context_tokens=config.llm_context_tokens,
+        output_tokens=config.llm_output_tokens,
+        token_calibration=config.llm_token_calibration,
+        cassette=cassette,
+        on_metrics=lambda metrics: db.log_event("llm_request", metrics),
+    )
+
+
+def _make_extractor(config: AppConfig) -> ExtractionExecutor:
+    return ExtractionExecutor(
+        config.extract_process_workers,
+        config.extract_timeout_sec,
+        config.extract_memory_limit_mb,
+    )
+
+
+def _report_llm(db: MetadataDB, llm: LLMClient) -> None:
+    if llm.cassette is not None:
+        cassette = llm.cassette.stats()
+        db.log_event("llm_cassette_stats", cassette)
+        style = "bold red" if cassette["misses"] and llm.cassette.replaying else "cyan"
+        _console.print(
+            f"[{style}]LLMカセット({cassette['mode']}): ヒット={cassette['hits']} "
+            f"ミス={cassette['misses']} 記録={cassette['recorded']}[/{style}]"
+        )
+    prefix = llm.prefix_stats()
+    if any(bucket["requests"] for bucket in prefix.values()):
+        db.log_event(
+            "llm_prefix_stats",
+            {
+                **prefix,
+                "token_calibration": llm.tokens.calibration,
+                "observed_token_calibration": llm.tokens.observed,
+            },
+        )
+        _console.print(
+            "プロンプトキャッシュ: "
+            + " ".join(
+                f"{label}={prefix[key]['requests']}件 (平均{prefix[key]['mean_latency_sec']:.2f}秒)"
+                for key, label in (("hit", "ヒット"), ("miss", "ミス"), ("unknown", "不明"))
+            )
+        )
+    stats = llm.repair_stats()
+    if not any(stats.values()):
+        return
+    db.log_event("llm_repair_stats", stats)
+    for name, value in stats.items():
+        db.increment_counter(f"llm_repairs_{name}", value)
+    _console.print(
+        f"JSON修復: ローカル={stats['local']} ローカル失敗={stats['local_failed']} "
+        f"LLM再試行={stats['llm']}"
     )
 
+
+def _report_cache(db: MetadataDB, llm: LLMClient) -> None:
+    if llm.cache is None:
+        return
+    stats = llm.cache.stats()
+    db.log_event("llm_cache_stats", stats)
+    _console.print(
+        f"LLMキャッシュ: ヒット={stats['hits']} ミス={stats['misses']} "
+        f"ヒット率={stats['hit_rate']:.1%} 件数={stats['entries']}"
+    )
+
+
+def _make_worker(
+    config: AppConfig,
+    extractor: ExtractionExecutor,
+    on_done: Optional[Callable[[str, bool], None]] = None,
+) -> tuple[MetadataDB, LLMClient, WorkerPool]:
+    db = _make_db(config)
+    llm = _make_llm(config, db)
+
     def _processor(path: Path) -> None:
+        ok = False
         try:
-            process_file(path, config, db, llm)
+            process_file(path, config, db, llm, extractor=extractor)
+            ok = True
         except Exception as exc:
             db.log_event("file_failed", {"path": str(path), "error": str(exc)})
+        finally:
+            if on_done:
+                on_done(str(path), ok)
 
-    worker = Worker(_processor)
+    worker = WorkerPool(_processor, config.watch_workers)
     return db, llm, worker
 
 
-def run_watch_loop(config: AppConfig) -> None:
-    db, _, worker = _make_worker(config)
+def run_watch_loop(config: AppConfig, stop_event: Optional[threading.Event] = None) -> None:
+    extractor = _make_extractor(config)
+    snapshot_path = config.state_dir / "scan_snapshot.bin"
+    # failed or still-queued files stay out of the saved snapshot so later scans retry them
+    progress = ScanProgress(ScanSnapshot.load(snapshot_path))
+    db, llm, worker = _make_worker(config, extractor, on_done=progress.finish)
+    _compact_events(config, db)
     worker.start()
 
-    debouncer = DebounceQueue(config.debounce_sec, worker.submit)
+    debouncer = DebounceQueue(
+        config.debounce_sec, lambda path: worker.submit(path, PRIORITY_LIVE)
+    )
     debouncer.start()
+    scan_debouncer = DebounceQueue(
+        config.debounce_sec, lambda path: worker.submit(path, PRIORITY_SCAN)
+    )
+    scan_debouncer.start()
 
-    observer = start_watcher(config.watch_paths, debouncer.submit, config.watch_recursive)
+    path_filter = PathFilter.from_config(config)
+    observer = start_watcher(
+        config.watch_paths, debouncer.submit, config.watch_recursive, path_filter
+    )
 
-    stop_event = threading.Event()
+    if stop_event is None:
+        stop_event = threading.Event()
     scanner_thread = start_periodic_scan(
         config.watch_paths,
         config.watch_recursive,
-        config.exclude_dirs,
-        config.exclude_globs,
-        debouncer.submit,
+        path_filter,
+        scan_debouncer.submit,
         config.scan_interval_sec,
         stop_event,
+        workers=config.scan_workers,
+        snapshot_path=snapshot_path,
+        progress=progress,
     )
 
+    last_compaction = time.monotonic()
     try:
-        while True:
-            time.sleep(1)
+        while not stop_event.wait(1):
+            if time.monotonic() - last_compaction >= _COMPACTION_INTERVAL_SEC:
+                _compact_events(config, db)
+                last_compaction = time.monotonic()
     except KeyboardInterrupt:
         pass
     finally:
@@ -73,29 +217,40 @@ def run_watch_loop(config: AppConfig) -> None:
         observer.stop()
         observer.join(timeout=2)
         debouncer.stop()
+        scan_debouncer.stop()
         worker.stop()
+        progress.save(snapshot_path)
+        extractor.close()
+        _report_cache(db, llm)
+        _report_llm(db, llm)
+        llm.close()
         db.close()
 
 
-def run_backfill(config: AppConfig, force: bool = False) -> None:
-    db = MetadataDB(config.db_path, log_events=config.log_events)
-    llm = LLMClient(
-        base_url=config.llm_base_url,
-        model=config.llm_model,
-        timeout_sec=config.llm_timeout_sec,
-        max_retries=config.llm_max_retries,
-        language=config.llm_language,
-        use_json_mode=config.llm_json_mode,
-    )
+def run_backfill(config: AppConfig, force: bool = False, verify: bool = False) -> PipelineStats:
+    db = _make_db(config)
+    llm = _make_llm(config, db)
+    extractor = _make_extractor(config)
 
     paths = list(
         scan_paths(
             config.watch_paths,
             config.watch_recursive,
-            config.exclude_dirs,
-            config.exclude_globs,
+            PathFilter.from_config(config),
+            workers=config.scan_workers,
         )
     )
+    progress = Progress(console=_console)
+    task = progress.add_task("一括処理", total=len(paths))
+    pipeline = BackfillPipeline(
+        config,
+        db,
+        llm,
+        force=force,
+        verify=verify,
+        on_done=lambda _path: progress.advance(task),
+        extractor=extractor,
+    )
     stop_requested = False
 
     def _signal_handler(sig, frame) -> None:
@@ -104,22 +259,26 @@ def run_backfill(config: AppConfig, force: bool = False) -> None:
             _console.print("\n[bold red]強制終了します。[/bold red]")
             sys.exit(1)
         stop_requested = True
+        pipeline.request_stop()
         _console.print(
-            "\n[bold yellow]中断要求を受け付けました。現在のファイルの処理完了後に停止します...[/bold yellow]"
+            "\n[bold yellow]中断要求を受け付けました。処理中のファイルの完了後に停止します...[/bold yellow]"
         )
 
     original_handler = signal.getsignal(signal.SIGINT)
     signal.signal(signal.SIGINT, _signal_handler)
 
     try:
-        for path in track(paths, description="一括処理", total=len(paths)):
-            if stop_requested:
-                _console.print("[yellow]処理を中断しました。[/yellow]")
-                break
-            try:
-                process_file(path, config, db, llm, force=force)
-            except Exception as exc:
-                db.log_event("file_failed", {"path": str(path), "error": str(exc)})
+        with progress:
+            stats = pipeline.run(paths)
+        if stop_requested:
+            _console.print("[yellow]処理を中断しました。[/yellow]")
+        _console.print(f"処理={stats.processed} スキップ={stats.skipped} 失敗={stats.failed}")
+        _report_cache(db, llm)
+        _report_llm(db, llm)
+        _compact_events(config, db)
     finally:
         signal.signal(signal.SIGINT, original_handler)
+        extractor.close()
+        llm.close()
         db.close()
+    return stats
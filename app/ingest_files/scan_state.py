@@ -0,0 +1,161 @@
+﻿from __future__ import annotations
+
+import os
+import struct
+import sys
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .scanner import ScanEntry
+
+_MAGIC = b"MDSNAP1\n"
+_HEADER = struct.Struct("<Q")
+
+
+class ScanSnapshot:
+    def __init__(self) -> None:
+        self._ids: Dict[str, int] = {}
+        self._paths: List[str] = []
+        self._sizes = array("q")
+        self._mtimes = array("q")
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._paths)
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._ids
+
+    def add(self, path: str, size: int, mtime_ns: int) -> None:
+        index = self._ids.get(path)
+        if index is not None:
+            self._sizes[index] = size
+            self._mtimes[index] = mtime_ns
+            return
+        self._ids[path] = len(self._paths)
+        self._paths.append(path)
+        self._sizes.append(size)
+        self._mtimes.append(mtime_ns)
+
+    def get(self, path: str) -> Optional[Tuple[int, int]]:
+        index = self._ids.get(path)
+        if index is None:
+            return None
+        return self._sizes[index], self._mtimes[index]
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[ScanEntry]) -> "ScanSnapshot":
+        snapshot = cls()
+        for entry in entries:
+            snapshot.add(entry.path, entry.size, entry.mtime_ns)
+        return snapshot
+
+    def diff(self, previous: "ScanSnapshot") -> Tuple[List[str], List[str], List[str]]:
+        added: List[str] = []
+        changed: List[str] = []
+        for index, path in enumerate(self._paths):
+            before = previous._ids.get(path)
+            if before is None:
+                added.append(path)
+            elif (
+                previous._sizes[before] != self._sizes[index]
+                or previous._mtimes[before] != self._mtimes[index]
+            ):
+                changed.append(path)
+        removed = [path for path in previous._paths if path not in self._ids]
+        return added, changed, removed
+
+    def save(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        sizes = array("q", self._sizes)
+        mtimes = array("q", self._mtimes)
+        if sys.byteorder != "little":
+            sizes.byteswap()
+            mtimes.byteswap()
+        names = "\0".join(self._paths).encode("utf-8", errors="surrogateescape")
+        tmp_path = path.with_name(path.name + ".tmp")
+        with tmp_path.open("wb") as handle:
+            handle.write(_MAGIC)
+            handle.write(_HEADER.pack(len(self._paths)))
+            handle.write(sizes.tobytes())
+            handle.write(mtimes.tobytes())
+            handle.write(names)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["ScanSnapshot"]:
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            return None
+        if not data.startswith(_MAGIC) or len(data) < len(_MAGIC) + _HEADER.size:
+            return None
+        offset = len(_MAGIC)
+        (count,) = _HEADER.unpack_from(data, offset)
+        offset += _HEADER.size
+        width = array("q").itemsize * count
+        if len(data) < offset + 2 * width:
+            # truncated or corrupt: start over with a full scan
+            return None
+        snapshot = cls()
+        snapshot._sizes.frombytes(data[offset : offset + width])
+        offset += width
+        snapshot._mtimes.frombytes(data[offset : offset + width])
+        offset += width
+        if sys.byteorder != "little":
+            snapshot._sizes.byteswap()
+            snapshot._mtimes.byteswap()
+        names = data[offset:].decode("utf-8", errors="surrogateescape")
+        snapshot._paths = names.split("\0") if count else []
+        if len(snapshot._paths) != count or len(snapshot._sizes) != count:
+            return None
+        snapshot._ids = {name: index for index, name in enumerate(snapshot._paths)}
+        return snapshot
+
+
+class ScanProgress:
+    """Scan baseline that only takes in a path once the worker has processed it.
+
+    Paths handed out by ``changes`` stay out of the baseline until ``finish`` reports
+    success, so failed or never-processed files are reported again by the next scan.
+    """
+
+    def __init__(self, baseline: Optional[ScanSnapshot] = None) -> None:
+        self._lock = threading.Lock()
+        self._baseline = baseline
+        self._pending: Dict[str, Optional[Tuple[int, int]]] = {}
+
+    def changes(self, current: ScanSnapshot) -> List[str]:
+        with self._lock:
+            if self._baseline is None:
+                changes = list(current)
+            else:
+                added, changed, removed = current.diff(self._baseline)
+                changes = [*added, *changed, *removed]
+            for path in changes:
+                self._pending[path] = current.get(path)
+            baseline = ScanSnapshot()
+            for path in current:
+                if path not in self._pending:
+                    baseline.add(path, *current.get(path))
+            self._baseline = baseline
+        return changes
+
+    def finish(self, path: str, ok: bool) -> None:
+        with self._lock:
+            entry = self._pending.pop(path, None)
+            if ok and entry is not None and self._baseline is not None:
+                self._baseline.add(path, *entry)
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def save(self, path: Path) -> None:
+        with self._lock:
+            if self._baseline is not None:
+                self._baseline.save(path)
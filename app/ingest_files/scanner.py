@@ -1,42 +1,150 @@
 ﻿from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Iterable, List
-import fnmatch
+from queue import Full, Queue
+from typing import Iterable, Iterator, List, NamedTuple, Optional
 import os
+import threading
 
+from .path_filter import PathFilter
 
-def _is_excluded_dir(name: str, exclude_dirs: List[str]) -> bool:
-    return name.lower() in exclude_dirs
 
+class ScanEntry(NamedTuple):
+    path: str
+    size: int
+    mtime_ns: int
 
-def _is_excluded_file(path: Path, exclude_globs: List[str]) -> bool:
-    name = path.name
-    return any(fnmatch.fnmatch(name, pattern) for pattern in exclude_globs)
 
+_DONE = object()
 
-def scan_paths(
+
+def _file_entry(entry: os.DirEntry, with_stat: bool) -> Optional[ScanEntry]:
+    if not with_stat:
+        return ScanEntry(entry.path, -1, -1)
+    try:
+        stat = entry.stat()
+    except OSError:
+        return None
+    return ScanEntry(entry.path, stat.st_size, stat.st_mtime_ns)
+
+
+class _ParallelWalker:
+    def __init__(
+        self,
+        recursive: bool,
+        path_filter: PathFilter,
+        workers: int,
+        with_stat: bool,
+        queue_size: int,
+    ) -> None:
+        self.recursive = recursive
+        self.path_filter = path_filter
+        self.with_stat = with_stat
+        self.results: Queue = Queue(maxsize=queue_size)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="scan")
+        self._lock = threading.Lock()
+        self._outstanding = 0
+        self._cancelled = threading.Event()
+
+    def _submit(self, *directories: str) -> None:
+        with self._lock:
+            self._outstanding += len(directories)
+        for directory in directories:
+            self._executor.submit(self._scan_dir, directory)
+
+    def _put(self, item) -> None:
+        while not self._cancelled.is_set():
+            try:
+                self.results.put(item, timeout=0.1)
+                return
+            except Full:
+                continue
+
+    def _scan_dir(self, directory: str) -> None:
+        try:
+            if self._cancelled.is_set():
+                return
+            try:
+                iterator = os.scandir(directory)
+            except OSError:
+                return
+            batch: List[ScanEntry] = []
+            with iterator:
+                for entry in iterator:
+                    if self._cancelled.is_set():
+                        return
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if self.recursive and not self.path_filter.excludes_dir(entry.name):
+                                self._submit(entry.path)
+                            continue
+                        if not entry.is_file():
+                            continue
+                    except OSError:
+                        continue
+                    if not self.path_filter.accepts_name(entry.name):
+                        continue
+                    scanned = _file_entry(entry, self.with_stat)
+                    if scanned is not None:
+                        batch.append(scanned)
+                    if len(batch) >= 256:
+                        self._put(batch)
+                        batch = []
+            if batch:
+                self._put(batch)
+        finally:
+            with self._lock:
+                self._outstanding -= 1
+                finished = self._outstanding == 0
+            if finished:
+                self._put(_DONE)
+
+    def run(self, roots: List[str]) -> Iterator[ScanEntry]:
+        if not roots:
+            return
+        try:
+            self._submit(*roots)
+            while True:
+                item = self.results.get()
+                if item is _DONE:
+                    return
+                yield from item
+        finally:
+            self._cancelled.set()
+            self._executor.shutdown(wait=True)
+
+
+def scan_entries(
     roots: Iterable[Path],
     recursive: bool,
-    exclude_dirs: List[str],
-    exclude_globs: List[str],
-) -> Iterable[Path]:
+    path_filter: PathFilter,
+    workers: int = 4,
+    with_stat: bool = True,
+    queue_size: int = 64,
+) -> Iterator[ScanEntry]:
+    directories: List[str] = []
     for root in roots:
         if not root.exists():
             continue
         if root.is_file():
-            if not _is_excluded_file(root, exclude_globs):
-                yield root
+            if path_filter.accepts_name(root.name):
+                if with_stat:
+                    stat = root.stat()
+                    yield ScanEntry(str(root), stat.st_size, stat.st_mtime_ns)
+                else:
+                    yield ScanEntry(str(root), -1, -1)
             continue
-        if recursive:
-            for current_root, dirs, files in os.walk(root):
-                dirs[:] = [d for d in dirs if not _is_excluded_dir(d, exclude_dirs)]
-                for filename in files:
-                    path = Path(current_root) / filename
-                    if _is_excluded_file(path, exclude_globs):
-                        continue
-                    yield path
-        else:
-            for path in root.iterdir():
-                if path.is_file() and not _is_excluded_file(path, exclude_globs):
-                    yield path
+        directories.append(str(root))
+    walker = _ParallelWalker(recursive, path_filter, workers, with_stat, queue_size)
+    yield from walker.run(directories)
+
+
+def scan_paths(
+    roots: Iterable[Path],
+    recursive: bool,
+    path_filter: PathFilter,
+    workers: int = 4,
+) -> Iterable[Path]:
+    for entry in scan_entries(roots, recursive, path_filter, workers=workers, with_stat=False):
+        yield Path(entry.path)
@@ -1,103 +1,266 @@
 ﻿from __future__ import annotations
 
+import heapq
+import itertools
 import threading
 import time
 from pathlib import Path
-from queue import Queue, Empty
-from typing import Callable, Iterable
+from typing import Callable, Iterable, Optional
 
 from watchdog.events import FileSystemEventHandler
 from watchdog.observers import Observer
 
-from .scanner import scan_paths
+from .path_filter import PathFilter
+from .scan_state import ScanProgress, ScanSnapshot
+from .scanner import scan_entries
 
 
 class DebounceQueue:
     def __init__(self, debounce_sec: float, on_ready: Callable[[Path], None]) -> None:
         self.debounce_sec = debounce_sec
         self.on_ready = on_ready
-        self._lock = threading.Lock()
-        self._pending: dict[str, float] = {}
-        self._stop_event = threading.Event()
+        self._cond = threading.Condition()
+        self._due: dict[str, float] = {}
+        self._first_seen: dict[str, float] = {}
+        self._heap: list[tuple[float, str]] = []
+        self._stopped = False
+        self._submitted = 0
+        self._coalesced = 0
+        self._emitted = 0
         self._thread = threading.Thread(target=self._run, daemon=True)
 
     def start(self) -> None:
         self._thread.start()
 
     def stop(self) -> None:
-        self._stop_event.set()
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
         self._thread.join(timeout=2)
 
     def submit(self, path: Path) -> None:
-        with self._lock:
-            self._pending[str(path)] = time.time()
+        key = str(path)
+        now = time.monotonic()
+        due = now + self.debounce_sec
+        with self._cond:
+            self._submitted += 1
+            if key in self._due:
+                self._due[key] = due
+                self._coalesced += 1
+                return
+            self._due[key] = due
+            self._first_seen[key] = now
+            heapq.heappush(self._heap, (due, key))
+            if self._heap[0][1] == key:
+                self._cond.notify()
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._due)
+
+    def oldest_pending_age(self) -> float:
+        with self._cond:
+            if not self._first_seen:
+                return 0.0
+            return time.monotonic() - next(iter(self._first_seen.values()))
+
+    def stats(self) -> dict[str, float]:
+        with self._cond:
+            submitted, coalesced, emitted = self._submitted, self._coalesced, self._emitted
+        return {
+            "pending": self.pending_count(),
+            "oldest_pending_age_sec": self.oldest_pending_age(),
+            "submitted": submitted,
+            "coalesced": coalesced,
+            "emitted": emitted,
+        }
+
+    def _take_ready(self) -> list[str]:
+        ready: list[str] = []
+        now = time.monotonic()
+        while self._heap and self._heap[0][0] <= now:
+            due, key = heapq.heappop(self._heap)
+            current = self._due.get(key)
+            if current is None:
+                continue
+            if current > due:
+                heapq.heappush(self._heap, (current, key))
+                continue
+            del self._due[key]
+            self._first_seen.pop(key, None)
+            ready.append(key)
+        self._emitted += len(ready)
+        return ready
 
     def _run(self) -> None:
-        while not self._stop_event.is_set():
-            now = time.time()
-            ready: list[str] = []
-            with self._lock:
-                for path_str, ts in list(self._pending.items()):
-                    if now - ts >= self.debounce_sec:
-                        ready.append(path_str)
-                        self._pending.pop(path_str, None)
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    ready = self._take_ready()
+                    if ready:
+                        break
+                    timeout = self._heap[0][0] - time.monotonic() if self._heap else None
+                    self._cond.wait(timeout)
+                else:
+                    return
             for path_str in ready:
                 self.on_ready(Path(path_str))
-            time.sleep(0.5)
 
 
 class WatchHandler(FileSystemEventHandler):
-    def __init__(self, enqueue: Callable[[Path], None]) -> None:
+    def __init__(
+        self,
+        enqueue: Callable[[Path], None],
+        path_filter: Optional[PathFilter] = None,
+    ) -> None:
         super().__init__()
         self.enqueue = enqueue
+        self.path_filter = path_filter
+
+    def _offer(self, raw_path) -> None:
+        path = Path(raw_path)
+        if self.path_filter is None or self.path_filter.accepts_path(path):
+            self.enqueue(path)
 
     def on_created(self, event) -> None:
         if not event.is_directory:
-            self.enqueue(Path(event.src_path))
+            self._offer(event.src_path)
 
     def on_modified(self, event) -> None:
         if not event.is_directory:
-            self.enqueue(Path(event.src_path))
+            self._offer(event.src_path)
 
     def on_moved(self, event) -> None:
         if not event.is_directory:
-            self.enqueue(Path(event.dest_path))
+            self._offer(event.dest_path)
 
 
-class Worker:
-    def __init__(self, processor: Callable[[Path], None]) -> None:
+PRIORITY_LIVE = 0
+PRIORITY_SCAN = 1
+
+
+class WorkerPool:
+    def __init__(self, processor: Callable[[Path], None], workers: int = 1) -> None:
         self.processor = processor
-        self.queue: Queue[Path] = Queue()
-        self._stop_event = threading.Event()
-        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._cond = threading.Condition()
+        self._heap: list[tuple[int, int, str]] = []
+        self._queued: dict[str, int] = {}
+        self._in_flight: set[str] = set()
+        self._follow_up: dict[str, int] = {}
+        self._seq = itertools.count()
+        self._stopped = False
+        self._submitted = 0
+        self._coalesced = 0
+        self._processed = 0
+        self._threads = [
+            threading.Thread(target=self._run, name=f"watch-worker-{index}", daemon=True)
+            for index in range(max(1, workers))
+        ]
 
     def start(self) -> None:
-        self._thread.start()
+        for thread in self._threads:
+            thread.start()
 
     def stop(self) -> None:
-        self._stop_event.set()
-        self._thread.join(timeout=2)
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=2)
 
-    def submit(self, path: Path) -> None:
-        self.queue.put(path)
+    def submit(self, path: Path, priority: int = PRIORITY_LIVE) -> None:
+        key = str(path)
+        with self._cond:
+            self._submitted += 1
+            if key in self._in_flight:
+                current = self._follow_up.get(key)
+                if current is not None:
+                    self._coalesced += 1
+                if current is None or priority < current:
+                    self._follow_up[key] = priority
+                return
+            current = self._queued.get(key)
+            if current is not None:
+                self._coalesced += 1
+                if current <= priority:
+                    return
+            self._enqueue(key, priority)
+
+    def _enqueue(self, key: str, priority: int) -> None:
+        self._queued[key] = priority
+        heapq.heappush(self._heap, (priority, next(self._seq), key))
+        self._cond.notify_all()
+
+    def pending_count(self) -> int:
+        with self._cond:
+            return len(self._queued)
+
+    def in_flight_count(self) -> int:
+        with self._cond:
+            return len(self._in_flight)
+
+    def stats(self) -> dict[str, int]:
+        with self._cond:
+            return {
+                "pending": len(self._queued),
+                "in_flight": len(self._in_flight),
+                "follow_ups": len(self._follow_up),
+                "submitted": self._submitted,
+                "coalesced": self._coalesced,
+                "processed": self._processed,
+            }
+
+    def _take(self) -> Optional[str]:
+        with self._cond:
+            while not self._stopped:
+                while self._heap:
+                    priority, _, key = heapq.heappop(self._heap)
+                    if self._queued.get(key) != priority:
+                        continue
+                    del self._queued[key]
+                    self._in_flight.add(key)
+                    return key
+                self._cond.wait()
+            return None
+
+    def _finish(self, key: str) -> None:
+        with self._cond:
+            self._in_flight.discard(key)
+            self._processed += 1
+            priority = self._follow_up.pop(key, None)
+            if priority is not None:
+                self._enqueue(key, priority)
+            self._cond.notify_all()
 
     def _run(self) -> None:
-        while not self._stop_event.is_set():
+        while True:
+            key = self._take()
+            if key is None:
+                return
             try:
-                path = self.queue.get(timeout=0.5)
-            except Empty:
-                continue
-            try:
-                self.processor(path)
+                self.processor(Path(key))
             finally:
-                self.queue.task_done()
+                self._finish(key)
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queued or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
 
 
 def start_watcher(
-    roots: Iterable[Path], enqueue: Callable[[Path], None], recursive: bool
+    roots: Iterable[Path],
+    enqueue: Callable[[Path], None],
+    recursive: bool,
+    path_filter: Optional[PathFilter] = None,
 ) -> Observer:
     observer = Observer()
-    handler = WatchHandler(enqueue)
+    handler = WatchHandler(enqueue, path_filter)
     for root in roots:
         if root.exists():
             observer.schedule(handler, str(root), recursive=recursive)
@@ -108,16 +271,28 @@ def start_watcher(
 def start_periodic_scan(
     roots: Iterable[Path],
     recursive: bool,
-    exclude_dirs: list[str],
-    exclude_globs: list[str],
+    path_filter: PathFilter,
     enqueue: Callable[[Path], None],
     interval_sec: int,
     stop_event: threading.Event,
+    workers: int = 4,
+    snapshot_path: Optional[Path] = None,
+    progress: Optional[ScanProgress] = None,
 ) -> threading.Thread:
     def _loop() -> None:
+        state = progress
+        if state is None:
+            state = ScanProgress(ScanSnapshot.load(snapshot_path) if snapshot_path else None)
         while not stop_event.is_set():
-            for path in scan_paths(roots, recursive, exclude_dirs, exclude_globs):
-                enqueue(path)
+            current = ScanSnapshot.from_entries(
+                scan_entries(roots, recursive, path_filter, workers=workers)
+            )
+            for path in state.changes(current):
+                if stop_event.is_set():
+                    return
+                enqueue(Path(path))
+            if snapshot_path:
+                state.save(snapshot_path)
             stop_event.wait(interval_sec)
 
     thread = threading.Thread(target=_loop, daemon=True)
@@ -0,0 +1,107 @@
+﻿from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+def make_cache_key(text: str, namespace: Dict[str, Any]) -> str:
+    text_hash = hashlib.sha256(text.encode("utf-8", errors="ignore")).hexdigest()
+    material = json.dumps({"text": text_hash, **namespace}, sort_keys=True, ensure_ascii=True)
+    return hashlib.sha256(material.encode("ascii")).hexdigest()
+
+
+class NormalizationCache:
+    def __init__(self, root: Path, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._total_bytes = 0
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._load_index()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def _load_index(self) -> None:
+        found = []
+        for shard in os.scandir(self.root):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.is_file() and entry.name.endswith(".json"):
+                    stat = entry.stat()
+                    found.append((stat.st_mtime_ns, entry.name[: -len(".json")], stat.st_size))
+        for _, key, size in sorted(found):
+            self._entries[key] = size
+            self._total_bytes += size
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        path = self._entry_path(key)
+        with self._lock:
+            known = key in self._entries
+        payload = None
+        if known:
+            try:
+                payload = json.loads(path.read_text(encoding="utf-8"))
+                os.utime(path)
+            except (OSError, json.JSONDecodeError):
+                payload = None
+        with self._lock:
+            if payload is None:
+                self.misses += 1
+                if known:
+                    self._total_bytes -= self._entries.pop(key, 0)
+                return None
+            self.hits += 1
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        return payload
+
+    def put(self, key: str, payload: Dict[str, Any]) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._total_bytes -= self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            self._total_bytes += len(data)
+            self.writes += 1
+            victims = []
+            while self._total_bytes > self.max_bytes and self._entries:
+                victim, size = self._entries.popitem(last=False)
+                self._total_bytes -= size
+                self.evictions += 1
+                victims.append(victim)
+        for victim in victims:
+            try:
+                self._entry_path(victim).unlink()
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "writes": self.writes,
+                "evictions": self.evictions,
+                "hit_rate": (self.hits / lookups) if lookups else 0.0,
+            }
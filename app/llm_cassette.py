@@ -0,0 +1,87 @@
+﻿from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+CASSETTE_MODES = ("off", "record", "replay")
+
+# transport options that do not change what the model is asked
+_TRANSPORT_FIELDS = ("stream", "stream_options")
+
+
+class CassetteMissError(RuntimeError):
+    def __init__(self, key: str, root: Path) -> None:
+        super().__init__(
+            f"No recorded LLM response for request {key[:16]} in {root}; "
+            "record it first with LLM_CASSETTE_MODE=record"
+        )
+        self.key = key
+
+
+def request_key(payload: Dict[str, Any]) -> str:
+    body = {name: value for name, value in payload.items() if name not in _TRANSPORT_FIELDS}
+    material = json.dumps(body, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class LLMCassette:
+    def __init__(self, root: Path, mode: str) -> None:
+        if mode not in CASSETTE_MODES or mode == "off":
+            raise ValueError(f"Unsupported cassette mode: {mode}")
+        self.root = root
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+        self._lock = threading.Lock()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _entry_path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            entry = json.loads(self._entry_path(key).read_text(encoding="utf-8"))
+        except (OSError, json.JSONDecodeError):
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry["response"] if entry is not None else None
+
+    def replay(self, key: str) -> Dict[str, Any]:
+        response = self.get(key)
+        if response is None:
+            raise CassetteMissError(key, self.root)
+        return response
+
+    def record(
+        self, key: str, request: Dict[str, Any], content: str, usage: Dict[str, Any]
+    ) -> None:
+        entry = {"request": request, "response": {"content": content, "usage": usage}}
+        path = self._entry_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps(entry, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.recorded += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "hits": self.hits,
+                "misses": self.misses,
+                "recorded": self.recorded,
+            }
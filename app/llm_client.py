@@ -1,11 +1,221 @@
 ﻿from __future__ import annotations
 
+import asyncio
+import hashlib
 import json
-from typing import Any, Dict
+import math
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
 import httpx
 
-from .normalize import normalize_llm_payload, parse_json_from_text
+from .llm_cache import NormalizationCache, make_cache_key
+from .llm_cassette import LLMCassette, request_key
+from .normalize import (
+    MIN_REPAIR_CONFIDENCE,
+    IncrementalJSONValidator,
+    normalize_llm_payload,
+    repair_json,
+)
+
+
+SYSTEM_PROMPT = (
+    "You are a structured data extractor. "
+    "You MUST output valid JSON based on the provided schema."
+)
+
+SCHEMA: Dict[str, Any] = {
+    "title": "string",
+    "summary": ["string"],
+    "decisions": ["string"],
+    "actions": [
+        {"what": "string", "who": "string|null", "due": "YYYY-MM-DD|null", "evidence": "string|null"}
+    ],
+    "entities": [{"type": "person|org|product|place|other", "value": "string"}],
+    "tags": ["string"],
+    "projects": ["string"],
+    "people": ["string"],
+    "confidence": 0.0,
+}
+
+PROMPT_REVISION = 2
+
+PROMPT_VERSION = hashlib.sha256(
+    json.dumps(
+        {"revision": PROMPT_REVISION, "system": SYSTEM_PROMPT, "schema": SCHEMA},
+        sort_keys=True,
+        ensure_ascii=True,
+    ).encode("ascii")
+).hexdigest()[:16]
+
+
+BatchDocument = Tuple[str, Dict[str, Any]]
+
+
+# chat-template tokens the server wraps around the messages, plus slack for estimation error
+_TEMPLATE_OVERHEAD_TOKENS = 64
+_MIN_CALIBRATION_TOKENS = 256
+
+
+def estimate_tokens(text: str) -> int:
+    ascii_chars = len(text.encode("ascii", errors="ignore"))
+    return (ascii_chars + 3) // 4 + (len(text) - ascii_chars)
+
+
+@dataclass
+class UsageLog:
+    requests: int = 0
+    retries: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cache_hits: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, name: str, count: int = 1) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + count)
+
+
+_usage_log: ContextVar[Optional[UsageLog]] = ContextVar("llm_usage_log", default=None)
+
+
+@contextmanager
+def track_usage() -> Iterator[UsageLog]:
+    """Collect request/retry/token counts for LLM calls made in this context."""
+    log = UsageLog()
+    token = _usage_log.set(log)
+    try:
+        yield log
+    finally:
+        _usage_log.reset(token)
+
+
+def _log_usage(name: str, count: int = 1) -> None:
+    log = _usage_log.get()
+    if log is not None and count:
+        log.add(name, count)
+
+
+class TokenEstimator:
+    def __init__(self, calibration: float = 1.0, learning_rate: float = 0.2) -> None:
+        # count/fit use the configured factor only, so truncation (and with it the cache
+        # and cassette keys) is the same on every run; the learned factor is reported
+        self.calibration = calibration
+        self.observed = calibration
+        self.learning_rate = learning_rate
+        self._lock = threading.Lock()
+
+    def count(self, text: str) -> int:
+        return math.ceil(estimate_tokens(text) * self.calibration)
+
+    def fit(self, text: str, budget: int) -> int:
+        if self.count(text) <= budget:
+            return len(text)
+        # estimate_tokens in quarter tokens: an ASCII char costs 1, anything else 4
+        remaining = budget * 4 / self.calibration
+        for index, char in enumerate(text):
+            remaining -= 1 if char.isascii() else 4
+            if remaining < 0:
+                return index
+        return len(text)
+
+    def observe(self, estimated: int, actual: int) -> None:
+        if estimated < _MIN_CALIBRATION_TOKENS or actual <= 0:
+            return
+        with self._lock:
+            self.observed += self.learning_rate * (actual / estimated - self.observed)
+
+
+def pack_batches(
+    documents: Sequence[BatchDocument],
+    max_tokens: int,
+    max_documents: int,
+    estimate: Callable[[str], int] = estimate_tokens,
+) -> List[List[int]]:
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for index, (text, _) in enumerate(documents):
+        tokens = estimate(text)
+        if current and (current_tokens + tokens > max_tokens or len(current) >= max_documents):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(index)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _prompt_usage(usage: Dict[str, Any]) -> Dict[str, Any]:
+    details = usage.get("prompt_tokens_details") or {}
+    return {
+        "prompt_tokens": usage.get("prompt_tokens"),
+        "cached_tokens": details.get("cached_tokens"),
+    }
+
+
+class _StreamCollector:
+    def __init__(self) -> None:
+        self.started = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.parts: List[str] = []
+        self.chunks = 0
+        self.completion_tokens: Optional[int] = None
+        self.usage: Dict[str, Any] = {}
+        # even in JSON mode some models open with a ```json fence or a short lead-in;
+        # repair_json strips both, so only the JSON itself going wrong aborts the stream
+        self.validator = IncrementalJSONValidator(allow_prefix=True, lenient=True)
+        self.aborted = False
+
+    def feed_line(self, line: str) -> bool:
+        if not line.startswith("data:"):
+            return True
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return False
+        try:
+            event = json.loads(data)
+        except json.JSONDecodeError:
+            return True
+        usage = event.get("usage")
+        if usage:
+            self.usage = usage
+            if usage.get("completion_tokens") is not None:
+                self.completion_tokens = int(usage["completion_tokens"])
+        choices = event.get("choices") or []
+        delta = (choices[0].get("delta") or {}).get("content") if choices else None
+        if not delta:
+            return True
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        self.chunks += 1
+        self.parts.append(delta)
+        if not self.validator.feed(delta):
+            self.aborted = True
+            return False
+        return not self.validator.complete
+
+    def text(self) -> str:
+        return "".join(self.parts)
+
+    def metrics(self) -> Dict[str, Any]:
+        finished = time.perf_counter()
+        tokens = self.completion_tokens if self.completion_tokens is not None else self.chunks
+        generating = finished - self.first_token_at if self.first_token_at is not None else 0.0
+        return {
+            "streamed": True,
+            "duration_sec": finished - self.started,
+            "ttft_sec": self.first_token_at - self.started if self.first_token_at is not None else None,
+            "completion_tokens": tokens,
+            "tokens_per_sec": tokens / generating if generating > 0 else None,
+            "aborted": self.aborted,
+            **_prompt_usage(self.usage),
+        }
 
 
 class LLMClient:
@@ -17,6 +227,18 @@ class LLMClient:
         max_retries: int,
         language: str = "ja",
         use_json_mode: bool = True,
+        max_connections: int = 8,
+        max_keepalive_connections: int = 4,
+        keepalive_expiry_sec: float = 30.0,
+        transport: Optional[httpx.BaseTransport] = None,
+        async_transport: Optional[httpx.AsyncBaseTransport] = None,
+        cache: Optional[NormalizationCache] = None,
+        stream: bool = False,
+        on_metrics: Optional[Callable[[Dict[str, Any]], None]] = None,
+        context_tokens: int = 0,
+        output_tokens: int = 1024,
+        token_calibration: float = 1.0,
+        cassette: Optional[LLMCassette] = None,
     ) -> None:
         self.base_url = base_url.rstrip("/")
         self.model = model
@@ -24,58 +246,369 @@ class LLMClient:
         self.max_retries = max_retries
         self.language = language
         self.use_json_mode = use_json_mode
+        self.cache = cache
+        self.cassette = cassette
+        self.stream = stream
+        self.on_metrics = on_metrics
+        self.context_tokens = context_tokens
+        self.output_tokens = output_tokens
+        self.tokens = TokenEstimator(token_calibration)
+        self.system_prompt = self._stable_prefix()
+        self.batch_fallbacks = 0
+        self._stats_lock = threading.Lock()
+        self._repairs = {"local": 0, "local_failed": 0, "llm": 0}
+        self._prefix: Dict[str, List[float]] = {
+            outcome: [0, 0.0] for outcome in ("hit", "miss", "unknown")
+        }
+        self._local = threading.local()
+        self._limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry_sec,
+        )
+        self._client = httpx.Client(
+            timeout=self.timeout_sec,
+            limits=self._limits,
+            transport=transport,
+        )
+        self._async_transport = async_transport
+        self._async_clients: Dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+        self._async_lock = threading.Lock()
 
-    def _chat(self, messages: list[dict[str, str]], json_mode: bool = False) -> str:
-        url = f"{self.base_url}/chat/completions"
-        payload = {
+    def close(self) -> None:
+        self._client.close()
+        for loop, client in self._take_async_clients():
+            self._close_async_client(loop, client)
+
+    async def aclose(self) -> None:
+        current = asyncio.get_running_loop()
+        for loop, client in self._take_async_clients():
+            if loop is current:
+                await client.aclose()
+            else:
+                self._close_async_client(loop, client)
+
+    def _take_async_clients(self) -> List[Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]]:
+        with self._async_lock:
+            clients = list(self._async_clients.items())
+            self._async_clients.clear()
+        return clients
+
+    @staticmethod
+    def _close_async_client(loop: asyncio.AbstractEventLoop, client: httpx.AsyncClient) -> None:
+        try:
+            if loop.is_running():
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop)
+            elif not loop.is_closed():
+                loop.run_until_complete(client.aclose())
+            else:
+                # the owning loop is gone (e.g. after asyncio.run); release the pool on a fresh one
+                asyncio.run(client.aclose())
+        except RuntimeError:
+            # another loop is running in this thread; the client's sockets close when collected
+            pass
+
+    def __enter__(self) -> "LLMClient":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _async_client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        with self._async_lock:
+            # drop clients of finished loops so they do not keep those loops alive
+            for stale in [owner for owner in self._async_clients if owner.is_closed()]:
+                self._async_clients.pop(stale)
+            client = self._async_clients.get(loop)
+            if client is None:
+                client = httpx.AsyncClient(
+                    timeout=self.timeout_sec,
+                    limits=self._limits,
+                    transport=self._async_transport,
+                )
+                self._async_clients[loop] = client
+        return client
+
+    def _chat_payload(self, messages: list[dict[str, str]], json_mode: bool) -> Dict[str, Any]:
+        payload: Dict[str, Any] = {
             "model": self.model,
             "messages": messages,
             "temperature": 0.2,
         }
         if json_mode:
             payload["response_format"] = {"type": "json_object"}
-        with httpx.Client(timeout=self.timeout_sec) as client:
-            response = client.post(url, json=payload)
-            response.raise_for_status()
-            data = response.json()
-        return data["choices"][0]["message"]["content"]
+        if self.stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+        return payload
 
-    def normalize(self, text: str, source_info: Dict[str, Any]) -> Dict[str, Any]:
-        system_prompt = (
-            "You are a structured data extractor. "
-            "You MUST output valid JSON based on the provided schema."
+    @property
+    def last_metrics(self) -> Optional[Dict[str, Any]]:
+        return getattr(self._local, "metrics", None)
+
+    def _record(self, metrics: Dict[str, Any], estimated_tokens: int) -> None:
+        metrics["estimated_prompt_tokens"] = estimated_tokens
+        _log_usage("requests")
+        _log_usage("prompt_tokens", metrics["prompt_tokens"] or 0)
+        _log_usage("completion_tokens", metrics["completion_tokens"] or 0)
+        if metrics["prompt_tokens"]:
+            self.tokens.observe(estimated_tokens, int(metrics["prompt_tokens"]))
+        cached = metrics["cached_tokens"]
+        outcome = "unknown" if cached is None else ("hit" if cached > 0 else "miss")
+        metrics["prefix_cache"] = outcome
+        latency = metrics["ttft_sec"]
+        if latency is None:
+            latency = metrics["duration_sec"]
+        with self._stats_lock:
+            self._prefix[outcome][0] += 1
+            self._prefix[outcome][1] += latency
+        self._local.metrics = metrics
+        if self.on_metrics is not None:
+            self.on_metrics(metrics)
+
+    def prefix_stats(self) -> Dict[str, Dict[str, float]]:
+        with self._stats_lock:
+            return {
+                outcome: {
+                    "requests": count,
+                    "mean_latency_sec": total / count if count else 0.0,
+                }
+                for outcome, (count, total) in self._prefix.items()
+            }
+
+    def _completion_text(self, data: Dict[str, Any], started: float, estimated_tokens: int) -> str:
+        usage = data.get("usage") or {}
+        duration = time.perf_counter() - started
+        tokens = usage.get("completion_tokens")
+        self._record(
+            {
+                "streamed": False,
+                "duration_sec": duration,
+                "ttft_sec": None,
+                "completion_tokens": tokens,
+                "tokens_per_sec": tokens / duration if tokens and duration > 0 else None,
+                "aborted": False,
+                **_prompt_usage(usage),
+            },
+            estimated_tokens,
         )
-        schema = {
-            "title": "string",
-            "summary": ["string"],
-            "decisions": ["string"],
-            "actions": [
-                {"what": "string", "who": "string|null", "due": "YYYY-MM-DD|null", "evidence": "string|null"}
-            ],
-            "entities": [{"type": "person|org|product|place|other", "value": "string"}],
-            "tags": ["string"],
-            "projects": ["string"],
-            "people": ["string"],
-            "confidence": 0.0,
+        return data["choices"][0]["message"]["content"]
+
+    def _replay(self, key: str, estimated: int) -> str:
+        started = time.perf_counter()
+        response = self.cassette.replay(key)
+        data = {
+            "choices": [{"message": {"content": response["content"]}}],
+            "usage": response["usage"],
         }
-        language_hint = (
-            "Output content MUST be in Japanese unless the source is clearly another language."
-            if self.language.lower().startswith("ja")
-            else f"Output content MUST be in {self.language}."
+        return self._completion_text(data, started, estimated)
+
+    def _chat(self, messages: list[dict[str, str]], json_mode: bool = False) -> str:
+        url = f"{self.base_url}/chat/completions"
+        payload = self._chat_payload(messages, json_mode)
+        estimated = sum(estimate_tokens(message["content"]) for message in messages)
+        key = request_key(payload) if self.cassette is not None else None
+        if key is not None and self.cassette.replaying:
+            return self._replay(key, estimated)
+        if self.stream:
+            collector = _StreamCollector()
+            with self._client.stream("POST", url, json=payload) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if not collector.feed_line(line):
+                        break
+            self._record(collector.metrics(), estimated)
+            text, usage = collector.text(), collector.usage
+        else:
+            started = time.perf_counter()
+            response = self._client.post(url, json=payload)
+            response.raise_for_status()
+            data = response.json()
+            text, usage = self._completion_text(data, started, estimated), data.get("usage") or {}
+        if key is not None:
+            self.cassette.record(key, payload, text, usage)
+        return text
+
+    async def _achat(self, messages: list[dict[str, str]], json_mode: bool = False) -> str:
+        url = f"{self.base_url}/chat/completions"
+        payload = self._chat_payload(messages, json_mode)
+        estimated = sum(estimate_tokens(message["content"]) for message in messages)
+        key = request_key(payload) if self.cassette is not None else None
+        if key is not None and self.cassette.replaying:
+            return self._replay(key, estimated)
+        if self.stream:
+            collector = _StreamCollector()
+            async with self._async_client().stream("POST", url, json=payload) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not collector.feed_line(line):
+                        break
+            self._record(collector.metrics(), estimated)
+            text, usage = collector.text(), collector.usage
+        else:
+            started = time.perf_counter()
+            response = await self._async_client().post(url, json=payload)
+            response.raise_for_status()
+            data = response.json()
+            text, usage = self._completion_text(data, started, estimated), data.get("usage") or {}
+        if key is not None:
+            self.cassette.record(key, payload, text, usage)
+        return text
+
+    def _language_hint(self) -> str:
+        if self.language.lower().startswith("ja"):
+            return "Output content MUST be in Japanese unless the source is clearly another language."
+        return f"Output content MUST be in {self.language}."
+
+    def _stable_prefix(self) -> str:
+        # identical bytes on every request so the server can reuse its prompt cache;
+        # anything per-document belongs in the user message
+        return (
+            f"{SYSTEM_PROMPT}"
+            "\nSchema:\n"
+            f"{json.dumps(SCHEMA, ensure_ascii=True)}"
+            "\nLanguage:\n"
+            f"{self._language_hint()}"
         )
+
+    def _build_prompt(self, text: str, source_info: Dict[str, Any]) -> tuple[str, str]:
         base_user_prompt = (
-            "Normalize the input into the JSON schema below."
-            "\nSchema:\n"
-            f"{json.dumps(schema, ensure_ascii=True)}"
+            "Normalize the input into the JSON schema above."
             "\nSource metadata:\n"
             f"{json.dumps(source_info, ensure_ascii=True)}"
-            "\nLanguage:\n"
-            f"{language_hint}"
             "\nInput:\n"
             f"{text}"
         )
+        return self.system_prompt, base_user_prompt
+
+    def input_budget(self, source_info: Dict[str, Any]) -> Optional[int]:
+        if self.context_tokens <= 0:
+            return None
+        system_prompt, prompt = self._build_prompt("", source_info)
+        overhead = self.tokens.count(system_prompt) + self.tokens.count(prompt)
+        overhead += _TEMPLATE_OVERHEAD_TOKENS
+        return max(0, self.context_tokens - self.output_tokens - overhead)
+
+    def input_char_limit(self, text: str, source_info: Dict[str, Any], max_chars: int) -> int:
+        budget = self.input_budget(source_info)
+        if budget is None:
+            return max_chars
+        head = text[:max_chars]
+        fitted = self.tokens.fit(head, budget)
+        return fitted if fitted < len(head) else max_chars
+
+    def _fit_input(self, text: str, source_info: Dict[str, Any]) -> str:
+        budget = self.input_budget(source_info)
+        if budget is None:
+            return text
+        return text[: self.tokens.fit(text, budget)]
+
+    def _build_batch_prompt(
+        self, documents: Sequence[Tuple[str, str, Dict[str, Any]]]
+    ) -> tuple[str, str]:
+        parts = [
+            "Normalize each document below independently into the JSON schema above. "
+            'Return one JSON object {"results": [...]} with exactly one result per document. '
+            'Each result is a schema object plus an "id" field copied from its document header.'
+        ]
+        for doc_id, text, source_info in documents:
+            parts.append(
+                f"\n=== Document {doc_id} ==="
+                "\nSource metadata:\n"
+                f"{json.dumps(source_info, ensure_ascii=True)}"
+                "\nInput:\n"
+                f"{text}"
+            )
+        return self.system_prompt, "".join(parts)
+
+    def cache_namespace(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "language": self.language,
+            "json_mode": self.use_json_mode,
+            "prompt_version": PROMPT_VERSION,
+        }
+
+    def _count_repair(self, kind: str) -> None:
+        with self._stats_lock:
+            self._repairs[kind] += 1
+        if kind == "llm":
+            _log_usage("retries")
+
+    def repair_stats(self) -> Dict[str, int]:
+        with self._stats_lock:
+            return dict(self._repairs)
+
+    def _load_json(self, response_text: str) -> tuple[Any, float]:
+        try:
+            return json.loads(response_text), 1.0
+        except json.JSONDecodeError:
+            pass
+        repaired = repair_json(response_text)
+        if repaired is None or repaired[1] <= MIN_REPAIR_CONFIDENCE:
+            self._count_repair("local_failed")
+            return None, 0.0
+        self._count_repair("local")
+        return repaired
+
+    def _parse_response(self, response_text: str) -> tuple[Optional[Dict[str, Any]], Optional[str]]:
+        payload, repair_confidence = self._load_json(response_text)
+        if payload is None:
+            return None, "invalid_json"
+        try:
+            result = normalize_llm_payload(payload).model_dump()
+        except Exception:
+            return None, "schema_validation_failed"
+        result["confidence"] = min(result["confidence"], repair_confidence)
+        return result, None
+
+    def _parse_batch_response(
+        self, response_text: str, ids: Sequence[str]
+    ) -> Dict[str, Dict[str, Any]]:
+        payload, repair_confidence = self._load_json(response_text)
+        items = payload.get("results") if isinstance(payload, dict) else payload
+        if not isinstance(items, list):
+            return {}
+        results: Dict[str, Dict[str, Any]] = {}
+        for item in items:
+            if not isinstance(item, dict) or "title" not in item:
+                continue
+            doc_id = str(item.get("id", ""))
+            if doc_id not in ids or doc_id in results:
+                continue
+            try:
+                result = normalize_llm_payload({k: v for k, v in item.items() if k != "id"})
+            except Exception:
+                continue
+            results[doc_id] = result.model_dump()
+            results[doc_id]["confidence"] = min(results[doc_id]["confidence"], repair_confidence)
+        return results
+
+    @staticmethod
+    def _repair_prompt(response_text: str) -> str:
+        return (
+            "Fix the JSON to be valid and match the schema below. Return JSON only."
+            "\nSchema:\n"
+            f"{json.dumps(SCHEMA, ensure_ascii=True)}"
+            "\nOriginal response:\n"
+            f"{response_text}"
+        )
 
-        prompt = base_user_prompt
+    def _cached(self, text: str) -> tuple[Optional[str], Optional[Dict[str, Any]]]:
+        if self.cache is None:
+            return None, None
+        key = make_cache_key(text, self.cache_namespace())
+        cached = self.cache.get(key)
+        if cached is not None:
+            _log_usage("cache_hits")
+        return key, cached
+
+    def _store(self, key: Optional[str], result: Dict[str, Any]) -> None:
+        if self.cache is not None and key is not None:
+            self.cache.put(key, result)
+
+    def _complete(self, system_prompt: str, prompt: str) -> Dict[str, Any]:
         last_error = None
         for attempt in range(self.max_retries + 1):
             messages = [
@@ -83,25 +616,125 @@ class LLMClient:
                 {"role": "user", "content": prompt},
             ]
             response_text = self._chat(messages, json_mode=self.use_json_mode)
-            if self.use_json_mode:
-                try:
-                    payload = json.loads(response_text)
-                except json.JSONDecodeError:
-                    payload = parse_json_from_text(response_text)
-            else:
-                payload = parse_json_from_text(response_text)
-            if payload is None:
-                last_error = "invalid_json"
-            else:
-                try:
-                    result = normalize_llm_payload(payload)
-                    return result.model_dump()
-                except Exception:
-                    last_error = "schema_validation_failed"
-
-            prompt = (
-                "Fix the JSON to be valid and match the schema. Return JSON only.\n"
-                f"Original response:\n{response_text}"
-            )
+            result, last_error = self._parse_response(response_text)
+            if result is not None:
+                return result
+            if attempt < self.max_retries:
+                self._count_repair("llm")
+            prompt = self._repair_prompt(response_text)
 
         raise RuntimeError(f"LLM normalization failed: {last_error}")
+
+    async def _acomplete(self, system_prompt: str, prompt: str) -> Dict[str, Any]:
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt},
+            ]
+            response_text = await self._achat(messages, json_mode=self.use_json_mode)
+            result, last_error = self._parse_response(response_text)
+            if result is not None:
+                return result
+            if attempt < self.max_retries:
+                self._count_repair("llm")
+            prompt = self._repair_prompt(response_text)
+
+        raise RuntimeError(f"LLM normalization failed: {last_error}")
+
+    def normalize(self, text: str, source_info: Dict[str, Any]) -> Dict[str, Any]:
+        text = self._fit_input(text, source_info)
+        cache_key, cached = self._cached(text)
+        if cached is not None:
+            return cached
+        result = self._complete(*self._build_prompt(text, source_info))
+        self._store(cache_key, result)
+        return result
+
+    async def anormalize(self, text: str, source_info: Dict[str, Any]) -> Dict[str, Any]:
+        text = self._fit_input(text, source_info)
+        cache_key, cached = self._cached(text)
+        if cached is not None:
+            return cached
+        result = await self._acomplete(*self._build_prompt(text, source_info))
+        self._store(cache_key, result)
+        return result
+
+    def _complete_batch(
+        self, documents: Sequence[BatchDocument], indexes: List[int]
+    ) -> Dict[int, Dict[str, Any]]:
+        ids = [f"d{position}" for position in range(len(indexes))]
+        system_prompt, prompt = self._build_batch_prompt(
+            [(doc_id, *documents[index]) for doc_id, index in zip(ids, indexes)]
+        )
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": prompt},
+        ]
+        try:
+            response_text = self._chat(messages, json_mode=self.use_json_mode)
+            parsed = self._parse_batch_response(response_text, ids)
+        except Exception:
+            # transport errors, cassette misses and malformed replies alike: every
+            # document is retried on its own, where its error is reported per item
+            return {}
+        return {index: parsed[doc_id] for doc_id, index in zip(ids, indexes) if doc_id in parsed}
+
+    def normalize_batch(
+        self,
+        documents: Sequence[BatchDocument],
+        max_tokens: int = 2000,
+        max_documents: int = 8,
+    ) -> List[Union[Dict[str, Any], Exception]]:
+        # the same input fitting as normalize(), so a document gets the same cache key,
+        # prompt text and result whether it went out in a batch or on its own
+        documents = [
+            (self._fit_input(text, source_info), source_info) for text, source_info in documents
+        ]
+        results: Dict[int, Union[Dict[str, Any], Exception]] = {}
+        keys: Dict[int, Optional[str]] = {}
+        pending: List[int] = []
+        for index, (text, _) in enumerate(documents):
+            keys[index], cached = self._cached(text)
+            if cached is not None:
+                results[index] = cached
+            else:
+                pending.append(index)
+
+        single: List[int] = []
+        batches = pack_batches(
+            [documents[index] for index in pending], max_tokens, max_documents, self.tokens.count
+        )
+        for group in batches:
+            indexes = [pending[position] for position in group]
+            if len(indexes) == 1:
+                single.extend(indexes)
+                continue
+            completed = self._complete_batch(documents, indexes)
+            for index in indexes:
+                if index in completed:
+                    results[index] = completed[index]
+                    self._store(keys[index], completed[index])
+                else:
+                    single.append(index)
+                    self.batch_fallbacks += 1
+
+        for index in single:
+            try:
+                results[index] = self.normalize(*documents[index])
+            except Exception as exc:
+                results[index] = exc
+        return [results[index] for index in range(len(documents))]
+
+    def reduce(self, partials: List[Dict[str, Any]], source_info: Dict[str, Any]) -> Dict[str, Any]:
+        prompt = (
+            "The JSON objects below were extracted from consecutive sections of one document. "
+            "Merge them into a single JSON object that matches the schema above: "
+            "write one title for the whole document, combine and deduplicate the lists, "
+            "and keep the most important summary points."
+            "\nSource metadata:\n"
+            f"{json.dumps(source_info, ensure_ascii=True)}"
+            "\nPartial results:\n"
+            f"{json.dumps(partials, ensure_ascii=False)}"
+        )
+        return self._complete(self.system_prompt, prompt)
@@ -0,0 +1,141 @@
+﻿from __future__ import annotations
+
+import math
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+STAGES = ("stat", "hash", "extract", "llm", "render", "write")
+OUTCOMES = ("processed", "unchanged", "dedup", "skipped", "failed")
+PERCENTILES = (50, 95, 99)
+
+
+@dataclass
+class FileMetrics:
+    """Timings and LLM usage for one file on its way through the ingest stages."""
+
+    path: Path
+    source_type: str = "file"
+    outcome: str = "skipped"
+    error: Optional[str] = None
+    failed_stage: Optional[str] = None
+    size_bytes: int = 0
+    extract_cache_hit: bool = False
+    llm_cache_hit: bool = False
+    llm_requests: int = 0
+    llm_retries: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    durations: Dict[str, float] = field(default_factory=dict)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.failed_stage = self.failed_stage or name
+            raise
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+
+    def add_time(self, name: str, seconds: float) -> None:
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def add_usage(self, usage: Any, share: int = 1) -> None:
+        """Add an ``llm_client.UsageLog``; ``share`` splits a batch request across its files."""
+        share = max(1, share)
+        self.llm_requests += math.ceil(usage.requests / share)
+        self.llm_retries += math.ceil(usage.retries / share)
+        self.prompt_tokens += usage.prompt_tokens // share
+        self.completion_tokens += usage.completion_tokens // share
+        self.llm_cache_hit = self.llm_cache_hit or (usage.cache_hits > 0 and not usage.requests)
+
+    def fail(self, exc: BaseException) -> None:
+        self.outcome = "failed"
+        self.error = type(exc).__name__
+
+    def as_row(self) -> Dict[str, Any]:
+        row: Dict[str, Any] = {
+            "recorded_at": datetime.now(timezone.utc).isoformat(),
+            "source_type": self.source_type,
+            "extension": self.path.suffix.lower(),
+            "outcome": self.outcome,
+            "error": self.error,
+            "failed_stage": self.failed_stage,
+            "size_bytes": self.size_bytes,
+        }
+        for name in STAGES:
+            row[f"{name}_us"] = int(self.durations.get(name, 0.0) * 1_000_000)
+        row["total_us"] = sum(row[f"{name}_us"] for name in STAGES)
+        row.update(
+            llm_requests=self.llm_requests,
+            llm_retries=self.llm_retries,
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=self.completion_tokens,
+            extract_cache_hit=int(self.extract_cache_hit),
+            llm_cache_hit=int(self.llm_cache_hit),
+        )
+        return row
+
+
+def percentile(values: List[int], pct: float) -> int:
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0
+    rank = max(1, math.ceil(pct / 100 * len(values)))
+    return values[min(rank, len(values)) - 1]
+
+
+def _rate(hits: int, total: int) -> float:
+    return hits / total if total else 0.0
+
+
+def summarize_file_metrics(rows: Iterable[Dict[str, Any]], window_sec: float) -> Dict[str, Any]:
+    rows = list(rows)
+    outcomes = Counter(row["outcome"] for row in rows)
+    processed = outcomes.get("processed", 0)
+    stages: Dict[str, Dict[str, float]] = {}
+    for name in (*STAGES, "total"):
+        # a stage that never ran for a file (e.g. the LLM for an unchanged file) is not a sample
+        values = sorted(row[f"{name}_us"] for row in rows if row[f"{name}_us"] > 0)
+        if not values:
+            continue
+        stages[name] = {
+            "count": len(values),
+            "total_sec": sum(values) / 1_000_000,
+            **{f"p{pct}": percentile(values, pct) / 1_000 for pct in PERCENTILES},
+        }
+    extract_runs = [row for row in rows if row["extract_us"] > 0]
+    llm_runs = [row for row in rows if row["llm_us"] > 0 or row["llm_cache_hit"]]
+    changed = processed + outcomes.get("dedup", 0)
+    failures = Counter(
+        (row["failed_stage"] or "unknown", row["error"] or "unknown")
+        for row in rows
+        if row["outcome"] == "failed"
+    )
+    return {
+        "files": len(rows),
+        "outcomes": {name: outcomes.get(name, 0) for name in OUTCOMES},
+        "window_sec": window_sec,
+        "files_per_hour": processed / window_sec * 3600 if window_sec > 0 else 0.0,
+        "bytes_processed": sum(row["size_bytes"] for row in rows if row["outcome"] == "processed"),
+        "stages": stages,
+        "llm_requests": sum(row["llm_requests"] for row in rows),
+        "llm_retries": sum(row["llm_retries"] for row in rows),
+        "prompt_tokens": sum(row["prompt_tokens"] for row in rows),
+        "completion_tokens": sum(row["completion_tokens"] for row in rows),
+        "extract_cache_hit_rate": _rate(
+            sum(row["extract_cache_hit"] for row in extract_runs), len(extract_runs)
+        ),
+        "llm_cache_hit_rate": _rate(sum(row["llm_cache_hit"] for row in llm_runs), len(llm_runs)),
+        "dedup_rate": _rate(outcomes.get("dedup", 0), changed),
+        "failures": [
+            {"stage": stage, "error": error, "count": count}
+            for (stage, error), count in failures.most_common()
+        ],
+    }
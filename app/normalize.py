@@ -1,7 +1,8 @@
 ﻿from __future__ import annotations
 
 import json
-from typing import Any, Dict, List, Optional
+import re
+from typing import Any, Dict, List, Optional, Tuple
 
 from pydantic import BaseModel, Field, ValidationError
 
@@ -93,6 +94,40 @@ def normalize_llm_payload(data: Dict[str, Any]) -> LLMResult:
         return LLMResult(**payload)
 
 
+def _unique(values: List[Any], key=lambda value: value) -> List[Any]:
+    seen = set()
+    unique = []
+    for value in values:
+        marker = key(value)
+        if marker in seen:
+            continue
+        seen.add(marker)
+        unique.append(value)
+    return unique
+
+
+def merge_llm_results(results: List[Dict[str, Any]]) -> LLMResult:
+    if not results:
+        return normalize_llm_payload({})
+    partials = [normalize_llm_payload(result) for result in results]
+    titles = [partial.title for partial in partials if partial.title and partial.title != "Untitled"]
+
+    def _collect(name: str) -> List[Any]:
+        return [item for partial in partials for item in getattr(partial, name)]
+
+    return LLMResult(
+        title=titles[0] if titles else "Untitled",
+        summary=_unique(_collect("summary")),
+        decisions=_unique(_collect("decisions")),
+        actions=_unique(_collect("actions"), key=lambda item: (item.what, item.who, item.due)),
+        entities=_unique(_collect("entities"), key=lambda item: (item.type.lower(), item.value)),
+        tags=_unique(_collect("tags")),
+        projects=_unique(_collect("projects")),
+        people=_unique(_collect("people")),
+        confidence=sum(partial.confidence for partial in partials) / len(partials),
+    )
+
+
 def parse_json_from_text(text: str) -> Optional[Dict[str, Any]]:
     if not text:
         return None
@@ -111,3 +146,269 @@ def parse_json_from_text(text: str) -> Optional[Dict[str, Any]]:
         except json.JSONDecodeError:
             return None
     return None
+
+
+_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)(?:```|\Z)", re.DOTALL)
+_PYTHON_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_CLOSERS = {"{": "}", "[": "]"}
+# a repair must score above this; a cut-off string in a truncated reply lands exactly on it
+MIN_REPAIR_CONFIDENCE = 0.5
+_REPAIR_PENALTIES = {
+    "fence": 0.0,
+    "prefix": 0.05,
+    "suffix": 0.05,
+    "trailing_comma": 0.05,
+    "single_quotes": 0.1,
+    "control_chars": 0.05,
+    "python_literals": 0.05,
+    "unterminated_string": 0.2,
+    "truncated": 0.3,
+}
+
+
+def _rewrite_json(text: str, fixes: set) -> str:
+    out: List[str] = []
+    stack: List[str] = []
+    index = 0
+    length = len(text)
+    while index < length:
+        char = text[index]
+        if char in "\"'":
+            quote = char
+            if quote == "'":
+                fixes.add("single_quotes")
+            out.append('"')
+            index += 1
+            while index < length and text[index] != quote:
+                char = text[index]
+                if char == "\\" and index + 1 < length:
+                    escaped = text[index + 1]
+                    out.append(escaped if escaped == "'" else char + escaped)
+                    index += 2
+                    continue
+                if char == '"':
+                    out.append('\\"')
+                elif ord(char) < 0x20:
+                    fixes.add("control_chars")
+                    out.append(json.dumps(char)[1:-1])
+                else:
+                    out.append(char)
+                index += 1
+            if index >= length:
+                fixes.add("unterminated_string")
+            out.append('"')
+            index += 1
+            continue
+        if char in "{[":
+            stack.append(char)
+        elif char in "}]":
+            while out and out[-1] in " \t\r\n":
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+                fixes.add("trailing_comma")
+            if stack:
+                stack.pop()
+            out.append(char)
+            index += 1
+            if not stack:
+                if text[index:].strip():
+                    fixes.add("suffix")
+                break
+            continue
+        elif char.isalpha():
+            end = index
+            while end < length and (text[end].isalnum() or text[end] == "_"):
+                end += 1
+            word = text[index:end]
+            if word in _PYTHON_LITERALS:
+                fixes.add("python_literals")
+                word = _PYTHON_LITERALS[word]
+            out.append(word)
+            index = end
+            continue
+        out.append(char)
+        index += 1
+    if stack:
+        fixes.add("truncated")
+        while out and out[-1] in " \t\r\n,:":
+            out.pop()
+        out.extend(_CLOSERS[opener] for opener in reversed(stack))
+    return "".join(out)
+
+
+def repair_json(text: str) -> Optional[Tuple[Any, float]]:
+    if not text or not text.strip():
+        return None
+    text = text.strip()
+    try:
+        return json.loads(text), 1.0
+    except json.JSONDecodeError:
+        pass
+    fixes: set = set()
+    fence = _FENCE.search(text)
+    if fence:
+        fixes.add("fence")
+        text = fence.group(1).strip()
+    starts = [position for position in (text.find("{"), text.find("[")) if position != -1]
+    if not starts:
+        return None
+    start = min(starts)
+    if text[:start].strip():
+        fixes.add("prefix")
+    candidate = _rewrite_json(text[start:], fixes)
+    try:
+        payload = json.loads(candidate)
+    except json.JSONDecodeError:
+        return None
+    # rounded so the threshold comparison does not depend on the order the fixes were summed in
+    confidence = round(1.0 - sum(_REPAIR_PENALTIES[fix] for fix in fixes), 6)
+    return payload, max(0.0, min(1.0, confidence))
+
+
+_WHITESPACE = frozenset(" \t\r\n")
+_LITERALS = ("true", "false", "null")
+_LENIENT_LITERALS = _LITERALS + tuple(_PYTHON_LITERALS)
+_NUMBER_CHARS = frozenset("-+.eE0123456789")
+_NUMBER = re.compile(r"-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][+-]?\d+)?\Z")
+_ESCAPES = frozenset('"\\/bfnrtu')
+_HEX = frozenset("0123456789abcdefABCDEF")
+
+
+class IncrementalJSONValidator:
+    def __init__(self, allow_prefix: bool = False, lenient: bool = False) -> None:
+        # lenient accepts what repair_json can fix, so a stream is only aborted
+        # once the output is beyond local repair
+        self.allow_prefix = allow_prefix
+        self.lenient = lenient
+        self._literals = _LENIENT_LITERALS if lenient else _LITERALS
+        self._quotes = "\"'" if lenient else '"'
+        self.failed = False
+        self.complete = False
+        self._stack: List[str] = []
+        self._expect = "value"
+        self._started = False
+        self._in_string = False
+        self._quote = '"'
+        self._string_is_key = False
+        self._escape = False
+        self._unicode = 0
+        self._token = ""
+
+    def feed(self, chunk: str) -> bool:
+        if self.failed:
+            return False
+        for char in chunk:
+            if not self._step(char):
+                self.failed = True
+                return False
+        return True
+
+    def _after_value(self) -> None:
+        if self._stack:
+            self._expect = "comma"
+        else:
+            self.complete = True
+
+    def _close(self, opener: str) -> bool:
+        if not self._stack or self._stack[-1] != opener:
+            return False
+        self._stack.pop()
+        self._after_value()
+        return True
+
+    def _string_char(self, char: str) -> bool:
+        if self._unicode:
+            self._unicode -= 1
+            return char in _HEX
+        if self._escape:
+            self._escape = False
+            if char == "u":
+                self._unicode = 4
+            return char in _ESCAPES or (self.lenient and char == "'")
+        if char == "\\":
+            self._escape = True
+        elif char == self._quote:
+            self._in_string = False
+            if self._string_is_key:
+                self._expect = "colon"
+            else:
+                self._after_value()
+        elif ord(char) < 0x20:
+            return self.lenient
+        return True
+
+    def _token_viable(self) -> bool:
+        token = self._token
+        if token[0] in "tfnTFN":
+            return any(literal.startswith(token) for literal in self._literals)
+        return token[0] in "-0123456789" and set(token) <= _NUMBER_CHARS
+
+    def _finish_token(self) -> bool:
+        token, self._token = self._token, ""
+        if token not in self._literals and not _NUMBER.match(token):
+            return False
+        self._after_value()
+        return True
+
+    def _step(self, char: str) -> bool:
+        if self.complete:
+            return self.allow_prefix or char in _WHITESPACE
+        if not self._started:
+            if char in _WHITESPACE:
+                return True
+            if char not in "{[":
+                return self.allow_prefix
+            self._started = True
+        if self._in_string:
+            return self._string_char(char)
+        if self._token:
+            if char.isalnum() or char in _NUMBER_CHARS:
+                self._token += char
+                return self._token_viable()
+            if not self._finish_token():
+                return False
+            if self.complete:
+                return self._step(char)
+        if char in _WHITESPACE:
+            return True
+        expect = self._expect
+        if expect in ("value", "value_or_end"):
+            if char == "]" and expect == "value_or_end":
+                return self._close("[")
+            if char in "{[":
+                self._stack.append(char)
+                self._expect = "key_or_end" if char == "{" else "value_or_end"
+                return True
+            if char in self._quotes:
+                self._in_string = True
+                self._quote = char
+                self._string_is_key = False
+                return True
+            if char in "-0123456789tfn" or (self.lenient and char in "TFN"):
+                self._token = char
+                return self._token_viable()
+            return False
+        if expect in ("key", "key_or_end"):
+            if char == "}" and expect == "key_or_end":
+                return self._close("{")
+            if char in self._quotes:
+                self._in_string = True
+                self._quote = char
+                self._string_is_key = True
+                return True
+            return False
+        if expect == "colon":
+            if char == ":":
+                self._expect = "value"
+                return True
+            return False
+        if char == ",":
+            if self._stack[-1] == "{":
+                self._expect = "key_or_end" if self.lenient else "key"
+            else:
+                self._expect = "value_or_end" if self.lenient else "value"
+            return True
+        if char in "}]":
+            return self._close("{" if char == "}" else "[")
+        return False
@@ -0,0 +1,350 @@
+﻿from __future__ import annotations
+
+import argparse
+import functools
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from app.config import AppConfig, load_config
+from app.ingest_files import pipeline, processor, runner
+from app.llm_client import LLMClient
+
+from .corpus import KINDS, SIZES, generate_corpus
+from .fake_llm import FakeLLMServer
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+MODES = ("backfill", "watch")
+_PERCENTILES = (50, 95, 99)
+_REPO_ROOT = Path(__file__).resolve().parents[1]
+
+
+class StageRecorder:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._samples: Dict[str, List[float]] = {}
+        self.processed: set[str] = set()
+        self.failed: set[str] = set()
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage: str, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - started)
+
+        return wrapper
+
+    def track_files(self, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(path, *args, **kwargs):
+            try:
+                result = func(path, *args, **kwargs)
+            except Exception:
+                with self._lock:
+                    self.failed.add(str(path))
+                raise
+            with self._lock:
+                self.processed.add(str(path))
+            return result
+
+        return wrapper
+
+    def finished(self) -> int:
+        with self._lock:
+            return len(self.processed | self.failed)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            samples = {stage: sorted(values) for stage, values in self._samples.items()}
+        summary = {}
+        for stage, values in samples.items():
+            row: Dict[str, float] = {"count": len(values)}
+            for percentile in _PERCENTILES:
+                rank = max(0, math.ceil(percentile / 100 * len(values)) - 1)
+                row[f"p{percentile}"] = values[rank]
+            summary[stage] = row
+        return summary
+
+
+@contextmanager
+def instrument(recorder: StageRecorder) -> Iterator[None]:
+    """Time the pipeline stages by wrapping the functions the runners call."""
+    patches = [
+        (module, name, stage)
+        for module in (processor, pipeline)
+        for name, stage in (
+            ("prepare_file", "prepare"),
+            ("normalize_prepared", "normalize"),
+            ("write_prepared", "write"),
+        )
+    ]
+    patches.append((LLMClient, "_chat", "llm_request"))
+    originals = []
+    for owner, name, stage in patches:
+        original = getattr(owner, name)
+        originals.append((owner, name, original))
+        setattr(owner, name, recorder.wrap(stage, original))
+    original_process = runner.process_file
+    runner.process_file = recorder.wrap("file", recorder.track_files(original_process))
+    try:
+        yield
+    finally:
+        runner.process_file = original_process
+        for owner, name, original in originals:
+            setattr(owner, name, original)
+
+
+def peak_rss_mb() -> Optional[float]:
+    if resource is not None:
+        # ru_maxrss is KiB on Linux and bytes on macOS; children covers extraction workers
+        scale = 1 if sys.platform == "darwin" else 1024
+        peak = max(
+            resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+        )
+        return peak * scale / (1024 * 1024)
+    if psutil is not None:
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    return None
+
+
+def _configure(workdir: Path, watch_dir: Path, args: argparse.Namespace) -> AppConfig:
+    os.environ.update(
+        {
+            "VAULT_PATH": str(workdir / "vault"),
+            "DATA_LAKE_PATH": str(workdir / "data_lake"),
+            "META_DB_PATH": str(workdir / "data_lake" / "meta.db"),
+            "WATCH_PATHS": str(watch_dir),
+            "WATCH_RECURSIVE": "true",
+            "LLM_BASE_URL": args.llm_url,
+            "LLM_STREAM": "true" if args.stream else "false",
+            "LLM_TIMEOUT_SEC": str(args.latency * 10 + 30),
+            "DEBOUNCE_SEC": str(args.debounce),
+            "SCAN_INTERVAL_SEC": "3600",
+        }
+    )
+    return load_config()
+
+
+def _result(
+    files: int, elapsed: float, processed: int, failed: int, recorder: StageRecorder
+) -> Dict[str, Any]:
+    return {
+        "files": files,
+        "processed": processed,
+        "failed": failed,
+        "elapsed_sec": elapsed,
+        "files_per_sec": files / elapsed if elapsed > 0 else 0.0,
+        "stages": recorder.summary(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_backfill_once(corpus: Path, workdir: Path, args: argparse.Namespace) -> Dict[str, Any]:
+    files = sum(1 for path in corpus.rglob("*") if path.is_file())
+    config = _configure(workdir, corpus, args)
+    recorder = StageRecorder()
+    with instrument(recorder):
+        started = time.perf_counter()
+        stats = runner.run_backfill(config)
+        elapsed = time.perf_counter() - started
+    return _result(files, elapsed, stats.processed, stats.failed, recorder)
+
+
+def run_watch_once(corpus: Path, workdir: Path, args: argparse.Namespace) -> Dict[str, Any]:
+    staging = workdir / "staging"
+    watch_dir = workdir / "watch"
+    shutil.copytree(corpus, staging)
+    sources = sorted(path for path in staging.rglob("*") if path.is_file())
+    # create every directory up front so no file lands before its directory is watched
+    for source in sources:
+        (watch_dir / source.parent.relative_to(staging)).mkdir(parents=True, exist_ok=True)
+
+    config = _configure(workdir, watch_dir, args)
+    recorder = StageRecorder()
+    stop_event = threading.Event()
+    thread = threading.Thread(
+        target=runner.run_watch_loop, args=(config,), kwargs={"stop_event": stop_event}, daemon=True
+    )
+    with instrument(recorder):
+        thread.start()
+        time.sleep(args.warmup)
+        started = time.perf_counter()
+        for source in sources:
+            os.replace(source, watch_dir / source.relative_to(staging))
+        deadline = started + args.timeout
+        while recorder.finished() < len(sources) and time.perf_counter() < deadline:
+            time.sleep(0.05)
+        elapsed = time.perf_counter() - started
+        stop_event.set()
+        thread.join(timeout=30)
+    return _result(len(sources), elapsed, len(recorder.processed), len(recorder.failed), recorder)
+
+
+def _run_child(args: argparse.Namespace) -> int:
+    run = run_backfill_once if args.run_one == "backfill" else run_watch_once
+    result = run(args.corpus, args.workdir, args)
+    args.result.write_text(json.dumps(result), encoding="utf-8")
+    return 0
+
+
+def _run_isolated(
+    mode: str, corpus: Path, workdir: Path, url: str, args: argparse.Namespace
+) -> Dict[str, Any]:
+    # one process per mode so peak RSS is not carried over between runs
+    result_path = workdir.with_suffix(".json")
+    command = [
+        sys.executable, "-m", "benchmarks.bench_ingest",
+        "--run-one", mode,
+        "--corpus", str(corpus),
+        "--workdir", str(workdir),
+        "--llm-url", url,
+        "--result", str(result_path),
+        "--latency", str(args.latency),
+        "--debounce", str(args.debounce),
+        "--warmup", str(args.warmup),
+        "--timeout", str(args.timeout),
+    ]
+    if args.stream:
+        command.append("--stream")
+    output = None if args.verbose else subprocess.DEVNULL
+    subprocess.run(command, check=True, cwd=_REPO_ROOT, stdout=output)
+    return json.loads(result_path.read_text(encoding="utf-8"))
+
+
+def print_report(results: Dict[str, Dict[str, Any]]) -> None:
+    for mode, result in results.items():
+        rss = result["peak_rss_mb"]
+        print(
+            f"{mode:<9} files={result['files']:>6} processed={result['processed']:>6} "
+            f"failed={result['failed']:>4} elapsed={result['elapsed_sec']:8.2f}s "
+            f"rate={result['files_per_sec']:8.2f} files/s "
+            f"peak_rss={'n/a' if rss is None else f'{rss:.0f}MB'}"
+        )
+        for stage, row in sorted(result["stages"].items()):
+            percentiles = " ".join(
+                f"p{pct}={row[f'p{pct}'] * 1000:9.1f}ms" for pct in _PERCENTILES
+            )
+            print(f"  {stage:<12} n={row['count']:>6} {percentiles}")
+
+
+def compare(
+    results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float
+) -> List[str]:
+    regressions = []
+    for mode, result in results.items():
+        before = baseline.get(mode)
+        if before is None:
+            continue
+        checks = [
+            ("files/sec", result["files_per_sec"], before["files_per_sec"], True),
+            ("peak_rss_mb", result["peak_rss_mb"], before.get("peak_rss_mb"), False),
+        ]
+        for stage, row in sorted(result["stages"].items()):
+            if stage in before["stages"]:
+                checks.append((f"{stage} p95", row["p95"], before["stages"][stage]["p95"], False))
+        for name, now, then, higher_is_better in checks:
+            if now is None or not then:
+                continue
+            change = (now - then) / then
+            worse = -change if higher_is_better else change
+            flag = "REGRESSION" if worse > tolerance else ""
+            print(f"{mode:<9} {name:<22} {then:12.4f} -> {now:12.4f} {change:+8.1%} {flag}")
+            if flag:
+                regressions.append(f"{mode} {name}")
+    return regressions
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="End-to-end ingestion benchmark")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--files-per-kind", type=int, default=5)
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=list(SIZES))
+    parser.add_argument("--kinds", nargs="+", choices=KINDS, default=list(KINDS))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.5, help="Mean LLM latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.1, help="Uniform +/- jitter in seconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--stream", action="store_true", help="Use streaming completions")
+    parser.add_argument("--debounce", type=float, default=0.5, help="DEBOUNCE_SEC for watch mode")
+    parser.add_argument("--warmup", type=float, default=1.0, help="Watcher startup wait (sec)")
+    parser.add_argument("--timeout", type=float, default=600.0, help="Watch mode timeout (sec)")
+    parser.add_argument("--baseline", type=Path, help="Compare against a saved result file")
+    parser.add_argument("--save-baseline", type=Path, help="Write this run's results to a file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    parser.add_argument("--verbose", action="store_true", help="Show the runners' own output")
+    parser.add_argument("--run-one", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--corpus", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--llm-url", help=argparse.SUPPRESS)
+    parser.add_argument("--result", type=Path, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.run_one:
+        return _run_child(args)
+
+    params = {
+        key: getattr(args, key)
+        for key in (
+            "files_per_kind", "sizes", "kinds", "seed",
+            "latency", "jitter", "failure_rate", "stream",
+        )
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = Path(tmp) / "corpus"
+        paths = generate_corpus(corpus, args.files_per_kind, args.sizes, args.kinds, args.seed)
+        print(f"corpus: {len(paths)} files ({', '.join(args.kinds)} x {', '.join(args.sizes)})")
+        results = {}
+        with FakeLLMServer(args.latency, args.jitter, args.failure_rate, seed=args.seed) as server:
+            for mode in args.modes:
+                results[mode] = _run_isolated(mode, corpus, Path(tmp) / mode, server.url, args)
+            server_stats = server.stats()
+    print(
+        f"fake llm: requests={server_stats['requests']} failures={server_stats['failures']} "
+        f"prefix_hits={server_stats['prefix_hits']}"
+    )
+    print_report(results)
+
+    if args.save_baseline:
+        args.save_baseline.write_text(
+            json.dumps({"params": params, "results": results}, indent=2), encoding="utf-8"
+        )
+    if args.baseline:
+        saved = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if saved.get("params") != params:
+            print("warning: baseline was recorded with different parameters")
+        regressions = compare(results, saved["results"], args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,109 @@
+﻿from __future__ import annotations
+
+import argparse
+import fnmatch
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Iterable, List
+
+from app.ingest_files.path_filter import PathFilter
+from app.ingest_files.scanner import scan_entries, scan_paths
+
+EXCLUDE_DIRS = [".git", "node_modules", ".venv", "__pycache__", ".obsidian"]
+EXCLUDE_GLOBS = ["*.tmp", "*.log", "*.exe", "*.dll", "*.zip", "*.png", "*.jpg"]
+PATH_FILTER = PathFilter(EXCLUDE_DIRS, EXCLUDE_GLOBS)
+
+
+def legacy_scan_paths(
+    roots: Iterable[Path],
+    recursive: bool,
+    exclude_dirs: List[str],
+    exclude_globs: List[str],
+) -> Iterable[Path]:
+    for root in roots:
+        for current_root, dirs, files in os.walk(root):
+            dirs[:] = [d for d in dirs if d.lower() not in exclude_dirs]
+            for filename in files:
+                path = Path(current_root) / filename
+                if any(fnmatch.fnmatch(path.name, pattern) for pattern in exclude_globs):
+                    continue
+                yield path
+
+
+def build_tree(root: Path, fanout: int, depth: int, files_per_dir: int) -> int:
+    count = 0
+    directories = [root]
+    for level in range(depth):
+        next_level = []
+        for directory in directories:
+            for index in range(fanout):
+                child = directory / f"d{level}_{index}"
+                child.mkdir()
+                next_level.append(child)
+        directories = next_level
+    for directory in [root, *directories]:
+        for index in range(files_per_dir):
+            suffix = ".tmp" if index % 10 == 0 else ".md"
+            (directory / f"f{index}{suffix}").write_bytes(b"x")
+            count += 1
+        (directory / "node_modules").mkdir()
+        (directory / "node_modules" / "ignored.js").write_bytes(b"x")
+    return count
+
+
+def _measure(label: str, run: Callable[[], int], repeat: int) -> None:
+    timings = []
+    found = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        found = run()
+        timings.append(time.perf_counter() - started)
+    best = min(timings)
+    rate = found / best if best > 0 else float("inf")
+    print(f"{label:<28} files={found:>8} best={best:8.3f}s rate={rate:12.0f} files/s")
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Compare scanner throughput")
+    parser.add_argument("--root", type=Path, help="Scan an existing tree instead of a synthetic one")
+    parser.add_argument("--fanout", type=int, default=6)
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--files-per-dir", type=int, default=40)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        root = args.root
+        if root is None:
+            root = Path(tmp)
+            created = build_tree(root, args.fanout, args.depth, args.files_per_dir)
+            print(f"synthetic tree: {created} files under {root}")
+
+        _measure(
+            "os.walk (legacy)",
+            lambda: sum(1 for _ in legacy_scan_paths([root], True, EXCLUDE_DIRS, EXCLUDE_GLOBS)),
+            args.repeat,
+        )
+        for workers in args.workers:
+            _measure(
+                f"scandir paths workers={workers}",
+                lambda: sum(
+                    1 for _ in scan_paths([root], True, PATH_FILTER, workers=workers)
+                ),
+                args.repeat,
+            )
+            _measure(
+                f"scandir+stat workers={workers}",
+                lambda: sum(
+                    1 for _ in scan_entries([root], True, PATH_FILTER, workers=workers)
+                ),
+                args.repeat,
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,111 @@
+﻿from __future__ import annotations
+
+import random
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import docx
+
+# paragraphs per document
+SIZES: Dict[str, int] = {"small": 3, "medium": 40, "large": 300}
+KINDS = ("txt", "pdf", "docx")
+
+_WORDS = (
+    "project review meeting budget schedule release customer design draft report "
+    "storage latency cache index query invoice contract vendor roadmap metric"
+).split()
+_JAPANESE = (
+    "議事録 予算 進捗 課題 担当 期限 仕様 顧客 設計 報告 検討 決定 確認 共有 改善"
+).split()
+_PARAGRAPHS_PER_PAGE = 4
+
+
+def _paragraphs(rng: random.Random, count: int, ascii_only: bool) -> List[str]:
+    paragraphs = []
+    for _ in range(count):
+        words = rng.choices(_WORDS, k=rng.randint(20, 60))
+        if not ascii_only:
+            words += rng.choices(_JAPANESE, k=rng.randint(5, 20))
+            rng.shuffle(words)
+        paragraphs.append(" ".join(words).capitalize() + ".")
+    return paragraphs
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def render_pdf(page_texts: List[List[str]]) -> bytes:
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for lines in page_texts:
+        stream = "BT /F1 9 Tf 12 TL 20 780 Td " + " ".join(
+            f"({_pdf_escape(line)}) Tj T*" for line in lines
+        ) + " ET"
+        kids.append(f"{len(objects) + 1} 0 R")
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects) + 2} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+    body = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(body))
+        body += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(body)
+    body += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        body += f"{offset:010d} 00000 n \n".encode("latin-1")
+    body += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    ).encode("latin-1")
+    return body
+
+
+def _write(path: Path, kind: str, title: str, paragraphs: List[str]) -> None:
+    if kind == "txt":
+        path.write_text("\n\n".join([f"# {title}", *paragraphs]), encoding="utf-8")
+    elif kind == "pdf":
+        pages = [
+            [title, *paragraphs[start : start + _PARAGRAPHS_PER_PAGE]]
+            for start in range(0, len(paragraphs), _PARAGRAPHS_PER_PAGE)
+        ]
+        path.write_bytes(render_pdf(pages))
+    else:
+        document = docx.Document()
+        document.add_heading(title, level=1)
+        for paragraph in paragraphs:
+            document.add_paragraph(paragraph)
+        document.save(path)
+
+
+def generate_corpus(
+    root: Path,
+    files_per_kind: int,
+    sizes: Iterable[str] = tuple(SIZES),
+    kinds: Iterable[str] = KINDS,
+    seed: int = 0,
+) -> List[Path]:
+    """Write ``files_per_kind`` documents for every kind/size pair under ``root``."""
+    rng = random.Random(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for kind in kinds:
+        extension = ".md" if kind == "txt" else f".{kind}"
+        for size in sizes:
+            directory = root / kind / size
+            directory.mkdir(parents=True, exist_ok=True)
+            for index in range(files_per_kind):
+                # the title makes every document unique so content dedup never kicks in
+                title = f"Benchmark {kind} {size} {index:05d}"
+                paragraphs = _paragraphs(rng, SIZES[size], ascii_only=kind == "pdf")
+                path = directory / f"doc_{index:05d}{extension}"
+                _write(path, kind, title, paragraphs)
+                paths.append(path)
+    return paths
@@ -0,0 +1,175 @@
+﻿from __future__ import annotations
+
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from app.llm_client import estimate_tokens
+
+_DOCUMENT_ID = re.compile(r"=== Document (\S+) ===")
+_STREAM_PIECES = 8
+
+
+def _payload(text: str) -> Dict[str, Any]:
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    title = lines[0][:60] if lines else "Untitled"
+    return {
+        "title": title,
+        "summary": lines[1:3],
+        "decisions": [],
+        "actions": [],
+        "entities": [],
+        "tags": ["benchmark"],
+        "projects": [],
+        "people": [],
+        "confidence": 0.9,
+    }
+
+
+def _reply(messages: List[Dict[str, str]]) -> str:
+    prompt = messages[-1]["content"] if messages else ""
+    ids = _DOCUMENT_ID.findall(prompt)
+    if ids:
+        sections = _DOCUMENT_ID.split(prompt)[2::2]
+        results = [
+            {"id": doc_id, **_payload(section.split("Input:\n", 1)[-1])}
+            for doc_id, section in zip(ids, sections)
+        ]
+        return json.dumps({"results": results}, ensure_ascii=False)
+    if "Partial results:" in prompt:
+        return json.dumps(_payload("Merged document"), ensure_ascii=False)
+    return json.dumps(_payload(prompt.split("Input:\n", 1)[-1]), ensure_ascii=False)
+
+
+class FakeLLMServer:
+    """Stand-in for an OpenAI-compatible ``chat/completions`` endpoint."""
+
+    def __init__(
+        self,
+        latency_sec: float = 0.5,
+        jitter_sec: float = 0.1,
+        failure_rate: float = 0.0,
+        seed: Optional[int] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+    ) -> None:
+        self.latency_sec = latency_sec
+        self.jitter_sec = jitter_sec
+        self.failure_rate = failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._prefixes: set[str] = set()
+        self._requests = 0
+        self._failures = 0
+        self._cached = 0
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeLLMServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join(timeout=2)
+
+    def __enter__(self) -> "FakeLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "requests": self._requests,
+                "failures": self._failures,
+                "prefix_hits": self._cached,
+            }
+
+    def _plan(self, system_prompt: str) -> tuple[float, bool, bool]:
+        with self._lock:
+            self._requests += 1
+            delay = self.latency_sec + self._random.uniform(-self.jitter_sec, self.jitter_sec)
+            failed = self._random.random() < self.failure_rate
+            cached = system_prompt in self._prefixes
+            self._prefixes.add(system_prompt)
+            self._failures += failed
+            self._cached += cached and not failed
+        return max(0.0, delay), failed, cached
+
+    def _handler(self) -> type:
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+            def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_event(self, event: Any) -> None:
+                data = event if isinstance(event, str) else json.dumps(event)
+                self.wfile.write(f"data: {data}\n\n".encode("utf-8"))
+                self.wfile.flush()
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", "0"))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.endswith("/chat/completions"):
+                    self._send_json(404, {"error": "not found"})
+                    return
+                messages = request.get("messages") or []
+                system_prompt = messages[0]["content"] if messages else ""
+                delay, failed, cached = server._plan(system_prompt)
+                time.sleep(delay)
+                if failed:
+                    self._send_json(500, {"error": "injected failure"})
+                    return
+                content = _reply(messages)
+                usage = {
+                    "prompt_tokens": sum(estimate_tokens(m["content"]) for m in messages),
+                    "completion_tokens": estimate_tokens(content),
+                    "prompt_tokens_details": {
+                        "cached_tokens": estimate_tokens(system_prompt) if cached else 0
+                    },
+                }
+                if not request.get("stream"):
+                    message = {"role": "assistant", "content": content}
+                    self._send_json(200, {"choices": [{"message": message}], "usage": usage})
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                step = max(1, len(content) // _STREAM_PIECES)
+                try:
+                    for start in range(0, len(content), step):
+                        piece = content[start : start + step]
+                        self._send_event({"choices": [{"delta": {"content": piece}}]})
+                    self._send_event({"choices": [], "usage": usage})
+                    self._send_event("[DONE]")
+                except (BrokenPipeError, ConnectionResetError):
+                    # the client stops reading once the JSON is complete
+                    pass
+
+        return Handler
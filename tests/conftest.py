@@ -12,24 +12,69 @@ def mock_config(tmp_path):
     return AppConfig(
         vault_path=tmp_path / "vault",
         data_lake_path=tmp_path / "data_lake",
+        data_lake_compression="none",
+        data_lake_compression_level=None,
         watch_paths=[input_dir],
         watch_recursive=True,
         exclude_dirs=[],
         exclude_globs=[],
         scan_interval_sec=60,
+        scan_workers=2,
         debounce_sec=1.0,
+        watch_workers=2,
         max_file_bytes=5 * 1024 * 1024,
+        deep_check_interval_hours=0,
+        extract_process_workers=0,
+        extract_timeout_sec=30.0,
+        extract_memory_limit_mb=0,
+        extract_char_budget=0,
+        extract_cache_enabled=True,
         llm_base_url="http://127.0.0.1:1234/v1",
         llm_model="local-model",
         llm_timeout_sec=5.0,
         llm_max_retries=0,
         llm_max_input_chars=8000,
+        llm_context_tokens=0,
+        llm_output_tokens=1024,
+        llm_token_calibration=1.0,
+        llm_chunking=False,
+        llm_chunk_chars=8000,
+        llm_chunk_overlap_chars=200,
+        llm_max_chunks=8,
+        llm_chunk_parallel=2,
+        llm_chunk_reduce=False,
+        llm_batch_enabled=False,
+        llm_batch_max_docs=4,
+        llm_batch_max_tokens=2000,
+        llm_batch_max_doc_chars=1500,
         llm_language="ja",
         llm_json_mode=True,
+        llm_stream=False,
+        llm_cassette_mode="off",
+        llm_cassette_dir=tmp_path / "data_lake" / "cassettes",
+        llm_max_connections=4,
+        llm_max_keepalive_connections=2,
+        llm_keepalive_expiry_sec=30.0,
+        llm_cache_enabled=False,
+        llm_cache_max_bytes=1024 * 1024,
         obsidian_sources_subdir="90_Sources/file",
         obsidian_template_path=Path.cwd() / "templates" / "source_card.md.j2",
         db_path=tmp_path / "meta.db",
         log_events=True,
+        db_synchronous="NORMAL",
+        db_cache_mb=4,
+        db_mmap_mb=0,
+        db_commit_batch_size=1,
+        db_commit_interval_sec=0.0,
+        event_batch_size=16,
+        event_flush_interval_sec=0.1,
+        event_retention_days=14,
+        event_hourly_retention_days=90,
+        metrics_retention_days=30,
+        backfill_extract_workers=2,
+        backfill_llm_workers=2,
+        backfill_write_workers=1,
+        backfill_queue_size=4,
     )
 
 
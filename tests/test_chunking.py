@@ -0,0 +1,63 @@
+﻿from app.chunking import group_partials, normalize_chunked, split_text
+
+
+def test_split_text_prefers_structural_boundaries():
+    text = "# One\n" + "a" * 40 + "\n\n# Two\n" + "b" * 40 + "\n\n# Three\n" + "c" * 40
+    chunks = split_text(text, chunk_chars=60, overlap_chars=0)
+    assert len(chunks) == 3
+    assert chunks[1].startswith("# Two")
+    assert "".join(chunks) == text
+
+
+def test_split_text_overlap_and_coverage():
+    text = "x" * 250
+    chunks = split_text(text, chunk_chars=100, overlap_chars=10)
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert chunks[0][-10:] == chunks[1][:10]
+    assert sum(len(chunk) for chunk in chunks) - 10 * (len(chunks) - 1) == 250
+
+
+def test_group_partials_caps_fan_in():
+    assert group_partials(list(range(7)), 3) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert group_partials(list(range(3)), 1) == [[0, 1], [2]]
+
+
+def test_normalize_chunked_covers_every_chunk_with_hierarchical_reduce(mocker):
+    llm = mocker.Mock()
+    llm.normalize.side_effect = lambda text, info: {"title": info["chunk"], "summary": [text[0]]}
+    llm.reduce.side_effect = lambda partials, info: {
+        "title": "merged",
+        "summary": [item for partial in partials for item in partial["summary"]],
+    }
+
+    text = "".join(letter * 10 for letter in "abcdefg")
+    result = normalize_chunked(
+        llm, text, {"path": "doc.txt"}, 10, 0, max_chunks=3, max_parallel=2, reduce=True
+    )
+
+    assert llm.normalize.call_count == 7
+    assert result["summary"] == list("abcdefg")
+    assert all(len(call.args[0]) <= 3 for call in llm.reduce.call_args_list)
+    assert llm.reduce.call_count == 3
+
+
+def test_normalize_chunked_merges_partials(mocker):
+    llm = mocker.Mock()
+    llm.normalize.side_effect = lambda text, info: {
+        "title": f"Part {info['chunk']}",
+        "summary": [text[:1]],
+        "tags": ["shared"],
+        "entities": [{"type": "person", "value": "Alice"}],
+        "confidence": 0.5,
+    }
+
+    result = normalize_chunked(
+        llm, "a" * 50 + "b" * 50, {"path": "doc.txt"}, 50, 0, max_chunks=4, max_parallel=2
+    )
+
+    assert llm.normalize.call_count == 2
+    assert result["title"] == "Part 1/2"
+    assert result["summary"] == ["a", "b"]
+    assert result["tags"] == ["shared"]
+    assert result["entities"] == [{"type": "person", "value": "Alice"}]
+    llm.reduce.assert_not_called()
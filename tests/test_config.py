@@ -19,6 +19,7 @@ def test_load_config_from_env(tmp_path, monkeypatch):
     monkeypatch.setenv("LLM_TIMEOUT_SEC", "5")
     monkeypatch.setenv("LLM_MAX_RETRIES", "1")
     monkeypatch.setenv("LLM_MAX_INPUT_CHARS", "100")
+    monkeypatch.delenv("LLM_CONTEXT_TOKENS", raising=False)
     monkeypatch.setenv("LLM_LANGUAGE", "ja")
     monkeypatch.setenv("LLM_JSON_MODE", "false")
     monkeypatch.setenv("OBSIDIAN_SOURCES_SUBDIR", "90_Sources/file")
@@ -34,6 +35,8 @@ def test_load_config_from_env(tmp_path, monkeypatch):
     assert config.debounce_sec == 1.0
     assert config.max_file_bytes == 1024 * 1024
     assert config.llm_max_input_chars == 100
+    assert config.llm_context_tokens == 0
+    assert config.extract_char_budget == 0
     assert config.llm_json_mode is False
     assert config.obsidian_template_path == tmp_path / "templates" / "source_card.md.j2"
     assert config.log_events is False
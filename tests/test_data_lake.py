@@ -0,0 +1,137 @@
+﻿import hashlib
+import os
+
+from app.data_lake import DataLake, open_blob
+from app.ingest_files import extractor
+
+
+def _files(root):
+    return sorted(path for path in root.rglob("*") if path.is_file())
+
+
+def test_snapshot_raw_hashes_a_private_copy_and_names_it_on_publish(tmp_path):
+    source = tmp_path / "Note.MD"
+    body = "# 見出し\n本文".encode("utf-8")
+    source.write_bytes(body)
+    lake = DataLake(tmp_path / "raw", tmp_path / "extracted")
+
+    with lake.snapshot_raw(source, max_bytes=1024) as snapshot:
+        assert snapshot.raw_hash == hashlib.sha256(body).hexdigest()
+        assert snapshot.raw_path.name == f"{snapshot.raw_hash}.md"
+        assert not snapshot.published
+        assert _files(tmp_path / "raw") == [snapshot.data_path]
+        assert snapshot.data_path.name.startswith(".")
+        text, metadata = extractor.extract_text(source, 1024, buffer=snapshot.buffer)
+        assert lake.publish_raw(snapshot) == snapshot.raw_path
+        assert snapshot.raw_path.read_bytes() == body
+
+    assert text == "# 見出し\n本文"
+    assert metadata["size_bytes"] == len(body)
+    assert _files(tmp_path / "raw" / "file") == [snapshot.raw_path]
+    assert snapshot.raw_path.parent == (
+        tmp_path / "raw" / "file" / snapshot.raw_hash[:2] / snapshot.raw_hash[2:4]
+    )
+
+
+def test_snapshot_raw_rejects_oversized_files(tmp_path):
+    source = tmp_path / "big.txt"
+    source.write_bytes(b"x" * 64)
+    lake = DataLake(tmp_path / "raw", tmp_path / "extracted")
+
+    assert lake.snapshot_raw(source, max_bytes=16) is None
+    assert _files(tmp_path / "raw") == []
+
+
+def test_compressed_publish_streams_blob_from_the_private_copy(tmp_path):
+    source = tmp_path / "report.pdf"
+    body = b"%PDF-" + b"0123456789" * 5000
+    source.write_bytes(body)
+    lake = DataLake(tmp_path / "raw", tmp_path / "extracted", compression="gzip", compression_level=1)
+
+    with lake.snapshot_raw(source, max_bytes=1024 * 1024) as snapshot:
+        assert snapshot.raw_path.name == f"{snapshot.raw_hash}.pdf.gz"
+        assert bytes(snapshot.buffer[:5]) == b"%PDF-"
+        assert snapshot.data_path.parent == tmp_path / "raw" / "file"
+        lake.publish_raw(snapshot)
+        with open_blob(snapshot.raw_path) as handle:
+            assert handle.read() == body
+        assert snapshot.raw_path.stat().st_size < len(body)
+
+    assert _files(tmp_path / "raw" / "file") == [snapshot.raw_path]
+
+
+def test_snapshot_is_immune_to_later_edits_of_the_source(tmp_path):
+    source = tmp_path / "note.txt"
+    body = "最初の内容\n".encode("utf-8") * 1000
+    source.write_bytes(body)
+    lake = DataLake(tmp_path / "raw", tmp_path / "extracted")
+
+    with lake.snapshot_raw(source, max_bytes=1024 * 1024) as snapshot:
+        assert bytes(snapshot.buffer[:4]) == body[:4]
+        source.write_bytes(b"rewritten in place")
+        os.truncate(source, 0)
+        assert hashlib.sha256(snapshot.buffer).hexdigest() == snapshot.raw_hash
+        text, _ = extractor.extract_text(source, 1024 * 1024, buffer=snapshot.buffer)
+        raw_path = lake.publish_raw(snapshot)
+        assert hashlib.sha256(raw_path.read_bytes()).hexdigest() == snapshot.raw_hash
+
+    assert text == body.decode("utf-8")
+    assert _files(tmp_path / "raw") == [raw_path]
+
+
+def test_compressed_lake_reads_legacy_uncompressed_files(tmp_path):
+    plain = DataLake(tmp_path / "raw", tmp_path / "extracted")
+    legacy_path = plain.write_extracted("abc", "既存のテキスト")
+    source = tmp_path / "note.txt"
+    source.write_bytes(b"same bytes")
+    with plain.snapshot_raw(source, max_bytes=1024) as legacy_raw:
+        plain.publish_raw(legacy_raw)
+
+    lake = DataLake(tmp_path / "raw", tmp_path / "extracted", compression="lzma")
+    assert lake.read_extracted("abc") == "既存のテキスト"
+    assert lake.write_extracted("abc", "既存のテキスト") == legacy_path
+    with lake.snapshot_raw(source, max_bytes=1024) as snapshot:
+        assert snapshot.published
+        assert snapshot.raw_path == legacy_raw.raw_path
+
+    new_path = lake.write_extracted("def", "新しいテキスト")
+    assert new_path.name == "def.txt.xz"
+    assert lake.read_extracted("def") == "新しいテキスト"
+
+
+def test_flat_blobs_are_read_in_place_and_located_after_migration(tmp_path):
+    lake = DataLake(tmp_path / "raw", tmp_path / "extracted", compression="gzip")
+    flat = tmp_path / "extracted" / "file" / "abcdef.txt"
+    flat.parent.mkdir(parents=True)
+    flat.write_text("legacy", encoding="utf-8")
+
+    assert lake.read_extracted("abcdef") == "legacy"
+    assert flat.exists()
+
+    lake.migrate_layout()
+    sharded = tmp_path / "extracted" / "file" / "ab" / "cd" / "abcdef.txt"
+    assert lake.locate("extracted", flat) == sharded
+    assert lake.locate("extracted", "abcdef.txt.gz") == sharded
+    assert lake.locate("raw", flat) is None
+
+
+def test_find_and_delete_orphans_after_migration(tmp_path):
+    lake = DataLake(tmp_path / "raw", tmp_path / "extracted")
+    keep = lake.write_extracted("11aa", "keep")
+    drop = lake.write_extracted("22bb", "drop")
+    flat = tmp_path / "raw" / "file" / "33cc.pdf"
+    flat.parent.mkdir(parents=True)
+    flat.write_bytes(b"old")
+
+    moves = lake.migrate_layout()
+    assert moves == [(flat, tmp_path / "raw" / "file" / "33" / "cc" / "33cc.pdf")]
+
+    orphans = lake.find_orphans(raw_hashes=set(), content_hashes={"11aa"})
+    assert sorted(orphans) == sorted([drop, moves[0][1]])
+    assert lake.find_orphans(set(), {"11aa"}, min_age_sec=3600) == []
+
+    deleted, freed = lake.delete_blobs(orphans)
+    assert deleted == 2
+    assert freed == len(b"drop") + len(b"old")
+    assert _files(tmp_path / "extracted" / "file") == [keep]
+    assert not (tmp_path / "raw" / "file" / "33").exists()
@@ -1,4 +1,6 @@
-﻿from app.db import MetadataDB
+﻿import sqlite3
+
+from app.db import MetadataDB
 
 
 def test_upsert_source(tmp_path):
@@ -15,3 +17,124 @@ def test_upsert_source(tmp_path):
     assert row["content_hash"] == "hash2"
 
     db.close()
+
+
+def test_legacy_sources_table_gains_fingerprint_columns(tmp_path):
+    db_path = tmp_path / "legacy.db"
+    conn = sqlite3.connect(db_path)
+    conn.execute(
+        """
+        CREATE TABLE sources (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source_type TEXT NOT NULL,
+            source_key TEXT NOT NULL,
+            content_hash TEXT NOT NULL,
+            raw_path TEXT,
+            extracted_path TEXT,
+            obsidian_path TEXT,
+            last_processed_at TEXT,
+            metadata_json TEXT,
+            UNIQUE(source_type, source_key)
+        )
+        """
+    )
+    conn.commit()
+    conn.close()
+
+    db = MetadataDB(db_path)
+    db.upsert_source("file", "a", "hash", None, None, None, size_bytes=3, mtime_ns=10, file_id="1:2")
+    db.update_fingerprint("file", "a", size_bytes=4, mtime_ns=11, file_id="1:2")
+    row = db.get_source("file", "a")
+    assert row["size_bytes"] == 4
+    assert row["mtime_ns"] == 11
+    assert row["verified_at"]
+    db.close()
+
+
+def test_group_commit_and_wal(tmp_path):
+    db_path = tmp_path / "wal.db"
+    db = MetadataDB(db_path, commit_batch_size=3, commit_interval_sec=60)
+    assert db.conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    reader = sqlite3.connect(db_path)
+    db.upsert_source("file", "a", "h1", None, None, None)
+    db.upsert_source("file", "b", "h2", None, None, None)
+    assert db.count_sources("file") == 2
+    assert reader.execute("SELECT COUNT(*) FROM sources").fetchone()[0] == 0
+
+    db.upsert_source("file", "c", "h3", None, None, None)
+    assert reader.execute("SELECT COUNT(*) FROM sources").fetchone()[0] == 3
+
+    db.upsert_source("file", "d", "h4", None, None, None)
+    db.flush()
+    assert reader.execute("SELECT COUNT(*) FROM sources").fetchone()[0] == 4
+    reader.close()
+    db.close()
+
+
+def test_events_are_buffered_and_rolled_up(tmp_path):
+    db = MetadataDB(tmp_path / "events.db", event_flush_interval_sec=60)
+    old = "2024-01-01T10:15:00+00:00"
+    db.conn.executemany(
+        "INSERT INTO events (event_time, event_type, details_json) VALUES (?, ?, '{}')",
+        [(old, "file_processed"), ("2024-01-01T10:45:00+00:00", "file_processed")],
+    )
+    db.log_event("file_processed", {"path": "new"})
+    assert db.conn.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 2
+
+    db.flush()
+    assert db.conn.execute("SELECT COUNT(*) FROM events").fetchone()[0] == 3
+
+    result = db.compact_events(raw_retention_days=7, hourly_retention_days=365 * 100)
+    assert result["raw_compacted"] == 2
+    rollup = db.conn.execute("SELECT * FROM event_rollups").fetchone()
+    assert rollup["granularity"] == "hour"
+    assert rollup["bucket_start"] == "2024-01-01T10:00:00+00:00"
+    assert rollup["event_count"] == 2
+    assert db.count_events("file_processed") == 3
+
+    db.compact_events(raw_retention_days=7, hourly_retention_days=1)
+    daily = db.conn.execute("SELECT granularity, bucket_start, event_count FROM event_rollups").fetchall()
+    assert [tuple(row) for row in daily] == [("day", "2024-01-01T00:00:00+00:00", 2)]
+    db.close()
+
+
+def test_relink_blob_paths_repoints_every_moved_blob(db, tmp_path):
+    old_raw = tmp_path / "raw" / "abcd.pdf"
+    new_raw = tmp_path / "raw" / "ab" / "cd" / "abcd.pdf"
+    extracted = str(tmp_path / "c1.txt")
+    db.upsert_source("file", "a.pdf", "c1", str(old_raw), extracted, None)
+    db.upsert_source("file", "copy.pdf", "c1", str(old_raw), extracted, None)
+    db.put_extraction("abcd", "1", 0, "c2", 10)
+
+    moved = {str(old_raw): new_raw}
+    assert db.relink_blob_paths("file", lambda kind, path: moved.get(path)) == 2
+    assert db.relink_blob_paths("file", lambda kind, path: moved.get(path)) == 0
+
+    assert db.get_source("file", "a.pdf")["raw_path"] == str(new_raw)
+    assert db.get_source("file", "copy.pdf")["raw_path"] == str(new_raw)
+    assert db.get_source("file", "copy.pdf")["extracted_path"] == extracted
+    assert db.referenced_blob_hashes("file") == ({"abcd"}, {"c1", "c2"})
+
+
+def test_file_metrics_are_recorded_and_pruned(db):
+    from datetime import datetime, timedelta, timezone
+    from pathlib import Path
+
+    from app.metrics import FileMetrics
+
+    metrics = FileMetrics(Path("notes/a.PDF"), outcome="processed", size_bytes=42)
+    metrics.add_time("llm", 0.25)
+    db.record_file_metrics(metrics.as_row())
+    old = dict(metrics.as_row(), recorded_at="2024-01-01T00:00:00+00:00")
+    db.record_file_metrics(old)
+
+    now = datetime.now(timezone.utc)
+    rows = db.file_metrics_since(now - timedelta(hours=1))
+    assert len(rows) == 1
+    assert rows[0]["extension"] == ".pdf"
+    assert rows[0]["llm_us"] == 250000
+    assert rows[0]["total_us"] == 250000
+
+    assert db.prune_file_metrics(retention_days=30, now=now) == 1
+    assert len(db.file_metrics_since(datetime(2000, 1, 1, tzinfo=timezone.utc))) == 1
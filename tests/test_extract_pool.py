@@ -0,0 +1,97 @@
+﻿import hashlib
+import os
+
+import pytest
+
+from app.data_lake import DataLake
+from app.ingest_files.extract_pool import ExtractionError, ExtractionExecutor
+
+
+def _docx(path, text):
+    docx = pytest.importorskip("docx")
+    document = docx.Document()
+    document.add_paragraph(text)
+    document.save(path)
+
+
+def _snapshot(tmp_path, source):
+    return DataLake(tmp_path / "raw", tmp_path / "extracted").snapshot_raw(source, 1024 * 1024)
+
+
+def test_text_files_stay_in_process(tmp_path):
+    source = tmp_path / "note.md"
+    source.write_text("plain text", encoding="utf-8")
+    with ExtractionExecutor(workers=1, timeout_sec=30) as executor:
+        with _snapshot(tmp_path, source) as snapshot:
+            text, metadata = executor.extract(source, 1024 * 1024, snapshot)
+        assert executor._pool is None
+        stats = executor.stats()
+    assert text == "plain text"
+    assert metadata["extension"] == ".md"
+    assert stats["in_process"] == 1
+    assert stats["in_pool"] == 0
+
+
+def test_docx_is_extracted_in_worker_process(tmp_path):
+    source = tmp_path / "report.docx"
+    _docx(source, "From a worker")
+    with ExtractionExecutor(workers=1, timeout_sec=60, memory_limit_mb=2048) as executor:
+        with _snapshot(tmp_path, source) as snapshot:
+            text, metadata = executor.extract(source, 1024 * 1024, snapshot)
+        stats = executor.stats()
+    assert "From a worker" in text
+    assert metadata["extension"] == ".docx"
+    assert stats["in_pool"] == 1
+    assert stats["timeouts"] == 0
+
+
+def test_worker_extracts_the_snapshot_even_if_the_source_changes(tmp_path):
+    source = tmp_path / "report.docx"
+    _docx(source, "Original body")
+    with ExtractionExecutor(workers=1, timeout_sec=60) as executor:
+        with _snapshot(tmp_path, source) as snapshot:
+            assert snapshot.data_path != source
+            _docx(source, "Edited after hashing")
+            os.truncate(source, 0)
+            text, _ = executor.extract(source, 1024 * 1024, snapshot)
+            assert hashlib.sha256(snapshot.buffer).hexdigest() == snapshot.raw_hash
+    assert "Original body" in text
+    assert "Edited" not in text
+
+
+def test_memory_limit_is_dropped_with_a_warning_where_unsupported(mocker, caplog):
+    mocker.patch("app.ingest_files.extract_pool.resource", None)
+    with caplog.at_level("WARNING", logger="app.ingest_files.extract_pool"):
+        executor = ExtractionExecutor(workers=1, timeout_sec=30, memory_limit_mb=512)
+    assert executor.memory_limit_bytes == 0
+    assert "EXTRACT_MEMORY_LIMIT_MB=512 is not enforced" in caplog.text
+
+
+def test_timeout_raises_and_replaces_pool(tmp_path):
+    source = tmp_path / "slow.docx"
+    _docx(source, "never seen")
+    with ExtractionExecutor(workers=1, timeout_sec=0.001) as executor:
+        with _snapshot(tmp_path, source) as snapshot:
+            with pytest.raises(ExtractionError, match="timed out"):
+                executor.extract(source, 1024 * 1024, snapshot)
+        stats = executor.stats()
+        assert executor._pool is None
+    assert stats["timeouts"] == 1
+    assert stats["restarts"] == 1
+
+
+def test_timeout_keeps_other_tasks_of_the_retired_pool_running(mocker):
+    executor = ExtractionExecutor(workers=2, timeout_sec=1)
+    old_pool = mocker.Mock()
+    executor._pool = old_pool
+    assert executor._acquire_pool() is old_pool
+    assert executor._acquire_pool() is old_pool
+
+    executor._release_pool(old_pool, timed_out=True)
+    assert executor._pool is None
+    old_pool.terminate.assert_not_called()
+
+    executor._release_pool(old_pool)
+    old_pool.terminate.assert_called_once()
+    assert executor.stats()["restarts"] == 1
+    assert executor._active == {}
@@ -50,3 +50,80 @@ def test_extract_docx(tmp_path):
     text, metadata = result
     assert metadata["extension"] == ".docx"
     assert "Hello Docx" in text
+
+
+def test_extract_docx_from_buffer(tmp_path):
+    pytest.importorskip("docx")
+    import docx
+
+    path = tmp_path / "buffered.docx"
+    document = docx.Document()
+    document.add_paragraph("From buffer")
+    document.save(path)
+
+    result = extractor.extract_text(path, max_bytes=1024 * 1024, buffer=path.read_bytes())
+    assert result is not None
+    assert "From buffer" in result[0]
+
+
+def _text_pdf(page_texts):
+    objects = []
+    count = len(page_texts)
+    kids = " ".join(f"{4 + index * 2} 0 R" for index in range(count))
+    objects.append("<< /Type /Catalog /Pages 2 0 R >>")
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {count} >>")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    for index, text in enumerate(page_texts):
+        stream = f"BT /F1 12 Tf 20 100 Td ({text}) Tj ET"
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 300 200] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {5 + index * 2} 0 R >>"
+        )
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    body = b"%PDF-1.4\n"
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(body))
+        body += f"{number} 0 obj\n{obj}\nendobj\n".encode("latin-1")
+    xref = len(body)
+    body += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        body += f"{offset:010d} 00000 n \n".encode("latin-1")
+    body += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return body
+
+
+def _pages(count):
+    return [f"Page {index:03d} " + "x" * 80 for index in range(1, count + 1)]
+
+
+def test_extract_pdf_samples_front_middle_back_within_budget(tmp_path):
+    pytest.importorskip("pypdf")
+    path = tmp_path / "long.pdf"
+    path.write_bytes(_text_pdf(_pages(40)))
+
+    text, metadata = extractor.extract_text(path, max_bytes=1024 * 1024, char_budget=300)
+
+    assert len(text) <= 300 + 2 * len(extractor.PDF_GAP_MARKER) + 8
+    assert "Page 001" in text
+    assert "Page 021" in text
+    assert "Page 040" in text
+    assert metadata["pages_total"] == 40
+    assert metadata["pages_covered"] == [[1, 2], [21, 21], [40, 40]]
+    assert metadata["complete"] is False
+
+
+def test_extract_pdf_large_budget_stops_early(tmp_path, monkeypatch):
+    pytest.importorskip("pypdf")
+    monkeypatch.setattr(extractor, "PDF_SAMPLE_BUDGET_CHARS", 100)
+    path = tmp_path / "long.pdf"
+    path.write_bytes(_text_pdf(_pages(40)))
+
+    text, metadata = extractor.extract_text(path, max_bytes=1024 * 1024, char_budget=400)
+
+    assert metadata["pages_covered"] == [[1, 5]]
+    assert extractor.PDF_GAP_MARKER not in text
+
+    text, metadata = extractor.extract_text(path, max_bytes=1024 * 1024)
+    assert metadata["pages_covered"] == [[1, 40]]
+    assert metadata["complete"] is True
@@ -0,0 +1,36 @@
+﻿from app.llm_cache import NormalizationCache, make_cache_key
+
+
+def test_cache_hit_and_miss_counters(tmp_path):
+    cache = NormalizationCache(tmp_path / "cache", max_bytes=1024 * 1024)
+    key = make_cache_key("hello", {"model": "m", "prompt_version": "v1"})
+
+    assert cache.get(key) is None
+    cache.put(key, {"title": "Hello"})
+    assert cache.get(key) == {"title": "Hello"}
+
+    reopened = NormalizationCache(tmp_path / "cache", max_bytes=1024 * 1024)
+    assert reopened.get(key) == {"title": "Hello"}
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+
+
+def test_cache_key_depends_on_namespace():
+    base = make_cache_key("hello", {"model": "a", "prompt_version": "v1"})
+    assert base != make_cache_key("hello", {"model": "b", "prompt_version": "v1"})
+    assert base != make_cache_key("hello", {"model": "a", "prompt_version": "v2"})
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = NormalizationCache(tmp_path / "cache", max_bytes=200)
+    payload = {"title": "x" * 60}
+    cache.put("a" * 64, payload)
+    cache.put("b" * 64, payload)
+    assert cache.get("a" * 64) is not None
+    cache.put("c" * 64, payload)
+
+    assert cache.stats()["evictions"] == 1
+    assert cache.get("b" * 64) is None
+    assert cache.get("a" * 64) is not None
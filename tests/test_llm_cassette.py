@@ -0,0 +1,57 @@
+﻿import json
+
+import httpx
+import pytest
+
+from app.llm_cassette import CassetteMissError, LLMCassette, request_key
+from app.llm_client import LLMClient
+
+
+def _client(cassette, handler=None, **kwargs):
+    def refuse(request):
+        raise AssertionError("replay must not reach the server")
+
+    return LLMClient(
+        base_url="http://llm.local/v1",
+        model="local-model",
+        timeout_sec=5.0,
+        max_retries=0,
+        transport=httpx.MockTransport(handler or refuse),
+        cassette=cassette,
+        **kwargs,
+    )
+
+
+def test_record_then_replay_without_server(tmp_path):
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        body = {"title": f"Recorded {len(requests)}", "confidence": 0.7}
+        usage = {"prompt_tokens": 40, "completion_tokens": 9}
+        return httpx.Response(
+            200, json={"choices": [{"message": {"content": json.dumps(body)}}], "usage": usage}
+        )
+
+    recorder = LLMCassette(tmp_path / "cassettes", "record")
+    with _client(recorder, handler) as client:
+        recorded = client.normalize("hello", {"path": "a.txt"})
+    assert recorder.stats()["recorded"] == 1
+
+    player = LLMCassette(tmp_path / "cassettes", "replay")
+    with _client(player, stream=True) as client:
+        replayed = client.normalize("hello", {"path": "a.txt"})
+        assert client.last_metrics["prompt_tokens"] == 40
+        with pytest.raises(CassetteMissError):
+            client.normalize("changed input", {"path": "a.txt"})
+
+    assert replayed == recorded
+    assert len(requests) == 1
+    assert player.stats() == {"mode": "replay", "hits": 1, "misses": 1, "recorded": 0}
+
+
+def test_request_key_ignores_transport_options():
+    payload = {"model": "m", "messages": [{"role": "user", "content": "x"}]}
+    streamed = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+    assert request_key(payload) == request_key(streamed)
+    assert request_key(payload) != request_key({**payload, "model": "other"})
@@ -0,0 +1,350 @@
+﻿import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.llm_cache import NormalizationCache
+from app.llm_client import LLMClient, TokenEstimator, estimate_tokens, pack_batches
+
+
+def _completion(content):
+    return httpx.Response(200, json={"choices": [{"message": {"content": content}}]})
+
+
+def _make_client(responses, **kwargs):
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        return _completion(responses[min(len(requests), len(responses)) - 1])
+
+    client = LLMClient(
+        base_url="http://llm.local/v1",
+        model="local-model",
+        timeout_sec=5.0,
+        max_retries=1,
+        transport=httpx.MockTransport(handler),
+        async_transport=httpx.MockTransport(handler),
+        **kwargs,
+    )
+    return client, requests
+
+
+def test_normalize_retries_invalid_json_on_same_client():
+    client, requests = _make_client(["not json", json.dumps({"title": "Fixed", "confidence": 0.8})])
+    with client:
+        result = client.normalize("hello", {"path": "a.txt"})
+    assert result["title"] == "Fixed"
+    assert len(requests) == 2
+    assert requests[0]["response_format"] == {"type": "json_object"}
+    assert "Fix the JSON" in requests[1]["messages"][1]["content"]
+
+
+def test_normalize_repairs_json_locally_before_asking_llm():
+    broken = "```json\n{'title': 'Local', 'tags': ['a',], 'confidence': 0.9,}\n```"
+    client, requests = _make_client([broken])
+    with client:
+        result = client.normalize("hello", {"path": "a.txt"})
+        stats = client.repair_stats()
+    assert result["title"] == "Local"
+    assert result["tags"] == ["a"]
+    assert result["confidence"] < 0.9
+    assert len(requests) == 1
+    assert stats == {"local": 1, "local_failed": 0, "llm": 0}
+
+
+def test_truncated_output_with_cut_off_string_goes_back_to_the_model():
+    cut_off = '{"title": "Cut", "summary": ["first", "sec'
+    client, requests = _make_client([cut_off, json.dumps({"title": "Whole", "summary": ["a"]})])
+    with client:
+        result = client.normalize("hello", {"path": "a.txt"})
+        stats = client.repair_stats()
+    assert result["title"] == "Whole"
+    assert len(requests) == 2
+    assert stats == {"local": 0, "local_failed": 1, "llm": 1}
+
+
+def test_repair_prompt_includes_schema():
+    client, requests = _make_client(["not json", json.dumps({"title": "Fixed"})])
+    with client:
+        client.normalize("hello", {"path": "a.txt"})
+        stats = client.repair_stats()
+    assert '"decisions"' in requests[1]["messages"][1]["content"]
+    assert stats == {"local": 0, "local_failed": 1, "llm": 1}
+
+
+def test_anormalize_runs_concurrently():
+    client, requests = _make_client([json.dumps({"title": "Async", "confidence": 0.9})])
+
+    async def run():
+        try:
+            return await asyncio.gather(*(client.anormalize(f"doc {i}", {}) for i in range(3)))
+        finally:
+            await client.aclose()
+
+    results = asyncio.run(run())
+    client.close()
+    assert [result["title"] for result in results] == ["Async"] * 3
+    assert len(requests) == 3
+
+
+def test_close_releases_async_clients_of_every_loop():
+    client, _ = _make_client([json.dumps({"title": "Async", "confidence": 0.9})])
+
+    async def run():
+        await client.anormalize("doc", {})
+        return client._async_client()
+
+    first = asyncio.run(run())
+    second = asyncio.run(run())
+    assert first is not second
+    assert len(client._async_clients) == 1
+
+    client.close()
+    assert client._async_clients == {}
+    assert second.is_closed
+
+
+def test_normalize_uses_cache(tmp_path):
+    cache = NormalizationCache(tmp_path / "cache", max_bytes=1024 * 1024)
+    client, requests = _make_client([json.dumps({"title": "Cached", "confidence": 0.7})], cache=cache)
+    with client:
+        first = client.normalize("same text", {"path": "a.txt"})
+        second = client.normalize("same text", {"path": "b.txt"})
+    assert first == second
+    assert len(requests) == 1
+    assert cache.stats()["hits"] == 1
+
+
+def test_normalize_batch_packs_documents_and_falls_back_per_item():
+    batch_reply = json.dumps(
+        {
+            "results": [
+                {"id": "d0", "title": "First", "summary": ["a"], "confidence": 0.9},
+                {"id": "d1", "summary": "missing title"},
+                {"id": "d2", "title": "Third", "confidence": 0.7},
+            ]
+        }
+    )
+    client, requests = _make_client(
+        [batch_reply, json.dumps({"title": "Second (single)", "confidence": 0.5})]
+    )
+    documents = [
+        ("note one", {"path": "1.md"}),
+        ("note two", {"path": "2.md"}),
+        ("note three", {"path": "3.md"}),
+    ]
+    with client:
+        results = client.normalize_batch(documents, max_tokens=1000, max_documents=8)
+
+    assert [result["title"] for result in results] == ["First", "Second (single)", "Third"]
+    assert len(requests) == 2
+    batch_prompt = requests[0]["messages"][1]["content"]
+    assert "=== Document d2 ===" in batch_prompt
+    assert "Schema:" not in batch_prompt
+    assert requests[0]["messages"][0]["content"] == requests[1]["messages"][0]["content"]
+    assert "note two" in requests[1]["messages"][1]["content"]
+    assert client.batch_fallbacks == 1
+
+
+def test_malformed_batch_reply_retries_every_document_alone():
+    requests = []
+
+    def handler(request):
+        requests.append(json.loads(request.content))
+        if len(requests) == 1:
+            return httpx.Response(200, json={"unexpected": "shape"})
+        return _completion(json.dumps({"title": f"Single {len(requests)}"}))
+
+    client = LLMClient(
+        base_url="http://llm.local/v1",
+        model="local-model",
+        timeout_sec=5.0,
+        max_retries=1,
+        transport=httpx.MockTransport(handler),
+    )
+    documents = [("note one", {"path": "1.md"}), ("note two", {"path": "2.md"})]
+    with client:
+        results = client.normalize_batch(documents, max_tokens=1000, max_documents=8)
+
+    assert [result["title"] for result in results] == ["Single 2", "Single 3"]
+    assert client.batch_fallbacks == 2
+
+
+def test_batched_documents_follow_single_document_rules():
+    repaired = (
+        "{'results': [{'id': 'd0', 'title': 'A', 'confidence': 0.9},"
+        " {'id': 'd1', 'title': 'B', 'confidence': 0.9},]}"
+    )
+    client, requests = _make_client([repaired], context_tokens=600, output_tokens=100)
+    documents = [("あ" * 10_000, {"path": "a.txt"}), ("short", {"path": "b.txt"})]
+    with client:
+        budget = client.input_budget({"path": "a.txt"})
+        results = client.normalize_batch(documents, max_tokens=100_000, max_documents=8)
+
+    assert len(requests) == 1
+    assert requests[0]["messages"][1]["content"].count("あ") == budget
+    assert all(result["confidence"] < 0.9 for result in results)
+    assert client.repair_stats()["local"] == 1
+
+
+def test_pack_batches_respects_token_budget_and_document_limit():
+    documents = [("x" * 400, {}), ("x" * 400, {}), ("x" * 400, {}), ("日本語" * 100, {})]
+    assert estimate_tokens("x" * 400) == 100
+    assert estimate_tokens("日本語") == 3
+    assert pack_batches(documents, max_tokens=250, max_documents=8) == [[0, 1], [2], [3]]
+    assert pack_batches(documents, max_tokens=10_000, max_documents=3) == [[0, 1, 2], [3]]
+
+
+def test_prompt_prefix_is_stable_and_input_fits_token_budget():
+    client, requests = _make_client(
+        [json.dumps({"title": "Fit"})], context_tokens=600, output_tokens=100
+    )
+    with client:
+        budget = client.input_budget({"path": "a.txt"})
+        ascii_limit = client.input_char_limit("x" * 10_000, {"path": "a.txt"}, 10_000)
+        japanese_limit = client.input_char_limit("あ" * 10_000, {"path": "a.txt"}, 10_000)
+        client.normalize("あ" * 10_000, {"path": "a.txt"})
+        client.normalize("short", {"path": "b.txt"})
+
+    assert ascii_limit == budget * 4
+    assert japanese_limit == budget
+    assert requests[0]["messages"][0] == requests[1]["messages"][0]
+    assert "Schema:" in requests[0]["messages"][0]["content"]
+    assert "a.txt" not in requests[0]["messages"][0]["content"]
+    assert requests[0]["messages"][1]["content"].count("あ") == budget
+
+
+def test_token_estimator_learns_from_reported_usage_without_moving_truncation():
+    estimator = TokenEstimator()
+    assert estimator.fit("ab" * 10, 3) == 12
+    estimator.observe(1000, 1500)
+    assert estimator.observed == pytest.approx(1.1)
+    estimator.observe(10, 1000)
+    assert estimator.observed == pytest.approx(1.1)
+    assert estimator.calibration == 1.0
+    assert estimator.fit("ab" * 10, 3) == 12
+    assert estimator.count("x" * 400) == estimate_tokens("x" * 400)
+    assert TokenEstimator(1.5).count("x" * 400) > estimate_tokens("x" * 400)
+
+
+def test_metrics_report_prefix_cache_hits():
+    usage = {
+        "prompt_tokens": 300,
+        "completion_tokens": 5,
+        "prompt_tokens_details": {"cached_tokens": 250},
+    }
+
+    def handler(request):
+        return httpx.Response(
+            200, json={"choices": [{"message": {"content": '{"title": "t"}'}}], "usage": usage}
+        )
+
+    client = LLMClient(
+        base_url="http://llm.local/v1",
+        model="local-model",
+        timeout_sec=5.0,
+        max_retries=0,
+        transport=httpx.MockTransport(handler),
+    )
+    with client:
+        client.normalize("hello", {"path": "a.txt"})
+    assert client.last_metrics["prefix_cache"] == "hit"
+    assert client.last_metrics["prompt_tokens"] == 300
+    stats = client.prefix_stats()
+    assert stats["hit"]["requests"] == 1
+    assert stats["miss"]["requests"] == 0
+
+
+def _sse(pieces, consumed):
+    def events():
+        for piece in pieces:
+            consumed.append(piece)
+            chunk = {"choices": [{"delta": {"content": piece}}]}
+            yield f"data: {json.dumps(chunk)}\n\n".encode("utf-8")
+        yield b"data: [DONE]\n\n"
+
+    return httpx.Response(200, headers={"content-type": "text/event-stream"}, content=events())
+
+
+def test_streaming_completion_records_metrics():
+    consumed = []
+    metrics = []
+    pieces = ['{"title": ', '"Streamed", ', '"confidence": 0.9}', " trailing chatter"]
+
+    def handler(request):
+        assert json.loads(request.content)["stream"] is True
+        return _sse(pieces, consumed)
+
+    client = LLMClient(
+        base_url="http://llm.local/v1",
+        model="local-model",
+        timeout_sec=5.0,
+        max_retries=0,
+        transport=httpx.MockTransport(handler),
+        stream=True,
+        on_metrics=metrics.append,
+    )
+    with client:
+        result = client.normalize("hello", {"path": "a.txt"})
+
+    assert result["title"] == "Streamed"
+    assert consumed == pieces[:3]
+    assert metrics == [client.last_metrics]
+    assert metrics[0]["streamed"] is True
+    assert metrics[0]["completion_tokens"] == 3
+    assert metrics[0]["ttft_sec"] is not None
+    assert metrics[0]["aborted"] is False
+
+
+def test_streaming_accepts_a_fenced_reply_in_json_mode():
+    consumed = []
+    pieces = ["```json\n", '{"title": "Fenced", ', '"confidence": 0.8}', "\n```", " done"]
+
+    def handler(request):
+        assert json.loads(request.content)["response_format"] == {"type": "json_object"}
+        return _sse(pieces, consumed)
+
+    client = LLMClient(
+        base_url="http://llm.local/v1",
+        model="local-model",
+        timeout_sec=5.0,
+        max_retries=0,
+        transport=httpx.MockTransport(handler),
+        stream=True,
+    )
+    with client:
+        result = client.normalize("hello", {"path": "a.txt"})
+
+    assert result["title"] == "Fenced"
+    assert result["confidence"] == 0.8
+    assert consumed == pieces[:3]
+    assert client.last_metrics["aborted"] is False
+
+
+def test_streaming_aborts_when_output_cannot_become_json():
+    consumed = []
+    replies = [
+        ['{"title": ', '"late"]', ' and more text', "}"],
+        ['{"title": "Repaired", "confidence": 0.5}'],
+    ]
+    replies_sent = replies[0]
+
+    def handler(request):
+        return _sse(replies.pop(0), consumed)
+
+    client = LLMClient(
+        base_url="http://llm.local/v1",
+        model="local-model",
+        timeout_sec=5.0,
+        max_retries=1,
+        transport=httpx.MockTransport(handler),
+        stream=True,
+    )
+    with client:
+        result = client.normalize("hello", {"path": "a.txt"})
+
+    assert result["title"] == "Repaired"
+    assert consumed[:2] == replies_sent[:2]
+    assert " and more text" not in consumed
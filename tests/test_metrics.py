@@ -0,0 +1,79 @@
+﻿from pathlib import Path
+
+import pytest
+
+from app.llm_client import UsageLog
+from app.metrics import FileMetrics, percentile, summarize_file_metrics
+
+
+def _row(outcome="processed", llm_ms=0, **overrides):
+    metrics = FileMetrics(Path("doc.txt"), outcome=outcome, size_bytes=100)
+    metrics.add_time("stat", 0.001)
+    if llm_ms:
+        metrics.add_time("llm", llm_ms / 1000)
+    row = metrics.as_row()
+    row.update(overrides)
+    return row
+
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 99) == 99
+    assert percentile([7], 99) == 7
+    assert percentile([], 50) == 0
+
+
+def test_stage_records_time_and_failed_stage():
+    metrics = FileMetrics(Path("doc.txt"))
+    with pytest.raises(ValueError):
+        with metrics.stage("extract"):
+            raise ValueError("broken")
+    metrics.fail(ValueError("broken"))
+
+    row = metrics.as_row()
+    assert row["outcome"] == "failed"
+    assert row["error"] == "ValueError"
+    assert row["failed_stage"] == "extract"
+    assert row["extract_us"] >= 0
+
+
+def test_batch_usage_is_shared_between_files():
+    usage = UsageLog(requests=1, retries=1, prompt_tokens=900, completion_tokens=300)
+    metrics = FileMetrics(Path("doc.txt"))
+    metrics.add_usage(usage, share=3)
+    assert (metrics.llm_requests, metrics.llm_retries) == (1, 1)
+    assert (metrics.prompt_tokens, metrics.completion_tokens) == (300, 100)
+    assert not metrics.llm_cache_hit
+
+    cached = FileMetrics(Path("doc.txt"))
+    cached.add_usage(UsageLog(cache_hits=1))
+    assert cached.llm_cache_hit
+
+
+def test_summarize_file_metrics():
+    rows = [_row(llm_ms=ms, llm_requests=1, prompt_tokens=10) for ms in (100, 200, 300, 400)]
+    rows += [
+        _row("unchanged"),
+        _row("dedup"),
+        _row("processed", llm_cache_hit=1),
+        _row("failed", llm_ms=50, error="TimeoutException", failed_stage="llm", llm_retries=2),
+    ]
+
+    summary = summarize_file_metrics(rows, window_sec=3600)
+
+    assert summary["files"] == 8
+    assert summary["outcomes"]["processed"] == 5
+    assert summary["files_per_hour"] == 5
+    assert summary["stages"]["llm"]["count"] == 5
+    assert summary["stages"]["llm"]["p50"] == 200
+    assert summary["stages"]["llm"]["p99"] == 400
+    assert summary["stages"]["stat"]["count"] == 8
+    assert "render" not in summary["stages"]
+    assert summary["llm_requests"] == 4
+    assert summary["llm_retries"] == 2
+    assert summary["prompt_tokens"] == 40
+    assert summary["llm_cache_hit_rate"] == pytest.approx(1 / 6)
+    assert summary["dedup_rate"] == pytest.approx(1 / 6)
+    assert summary["failures"] == [{"stage": "llm", "error": "TimeoutException", "count": 1}]
@@ -1,4 +1,11 @@
-﻿from app.normalize import normalize_llm_payload, parse_json_from_text
+﻿from app.normalize import (
+    MIN_REPAIR_CONFIDENCE,
+    IncrementalJSONValidator,
+    merge_llm_results,
+    normalize_llm_payload,
+    parse_json_from_text,
+    repair_json,
+)
 
 
 def test_parse_json_embedded_in_text():
@@ -16,3 +23,57 @@ def test_normalize_payload_defaults():
     result = normalize_llm_payload({})
     assert result.title == "Untitled"
     assert result.confidence == 0.5
+
+
+def test_merge_llm_results_deduplicates():
+    merged = merge_llm_results(
+        [
+            {"title": "Untitled", "people": ["Alice"], "confidence": 0.4},
+            {"title": "Report", "people": ["Alice", "Bob"], "confidence": 0.8},
+        ]
+    )
+    assert merged.title == "Report"
+    assert merged.people == ["Alice", "Bob"]
+    assert abs(merged.confidence - 0.6) < 1e-9
+
+
+def test_incremental_validator_accepts_chunked_json_and_rejects_early():
+    validator = IncrementalJSONValidator()
+    for piece in ['{"title": "t', 'ok", "n": [1, -2.5e3', ', true, null], "s": "\\u00e9"}']:
+        assert validator.feed(piece)
+    assert validator.complete
+
+    for broken in ["Sure! {", '{"a": 1,}', "{'a': 1}", '{"a" 1}', '{"a": 01}', '{"a": 1} more']:
+        assert not IncrementalJSONValidator().feed(broken), broken
+
+    fenced = IncrementalJSONValidator(allow_prefix=True)
+    assert fenced.feed('```json\n{"a": 1}\n```')
+    assert fenced.complete
+
+    lenient = IncrementalJSONValidator(lenient=True)
+    assert lenient.feed("{'a': [1, True,], 'b': \"x\ny\",}")
+    assert lenient.complete
+    assert not IncrementalJSONValidator(lenient=True).feed("Sure! {")
+
+
+def test_repair_json_fixes_common_llm_mistakes():
+    assert repair_json('{"a": 1}') == ({"a": 1}, 1.0)
+    assert repair_json("no json here") is None
+
+    cases = {
+        '```json\n{"tags": ["a", "b",],}\n```': {"tags": ["a", "b"]},
+        "{'title': 'it\\'s', 'ok': True, 'due': None}": {"title": "it's", "ok": True, "due": None},
+        'Result: {"summary": ["line one\nline two"]} hope this helps': {
+            "summary": ["line one\nline two"]
+        },
+    }
+    for raw, expected in cases.items():
+        payload, confidence = repair_json(raw)
+        assert payload == expected, raw
+        assert 0.5 <= confidence < 1.0
+
+    payload, truncated = repair_json('{"title": "Cut", "summary": ["first", "sec')
+    assert payload == {"title": "Cut", "summary": ["first", "sec"]}
+    _, closed = repair_json('{"title": "Cut", "summary": ["first"')
+    assert truncated < closed < 1.0
+    assert truncated == MIN_REPAIR_CONFIDENCE
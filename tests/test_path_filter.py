@@ -0,0 +1,32 @@
+﻿from pathlib import Path
+
+from app.ingest_files.path_filter import PathFilter
+from app.ingest_files.watcher import WatchHandler
+
+
+def test_path_filter_matches_fnmatch_semantics():
+    path_filter = PathFilter([".git"], ["*.tmp", "~$*", "Thumbs.db", "*.tar.gz"])
+    assert path_filter.accepts_name("note.md")
+    assert not path_filter.accepts_name("note.tmp")
+    assert not path_filter.accepts_name("~$report.docx")
+    assert not path_filter.accepts_name("Thumbs.db")
+    assert not path_filter.accepts_name("backup.tar.gz")
+    assert path_filter.accepts_name("tmp.md")
+    assert path_filter.excludes_dir(".GIT")
+
+
+def test_path_filter_extension_allowlist_and_dirs():
+    path_filter = PathFilter(["node_modules"], [], {".md", ".pdf"})
+    assert path_filter.accepts_path(Path("docs") / "a.MD")
+    assert not path_filter.accepts_path(Path("docs") / "image.png")
+    assert not path_filter.accepts_path(Path("node_modules") / "pkg" / "readme.md")
+
+
+def test_watch_handler_drops_filtered_events(mocker):
+    enqueued = []
+    handler = WatchHandler(enqueued.append, PathFilter([".git"], [], {".md"}))
+    event = mocker.Mock(is_directory=False)
+    for src in ["repo/.git/index", "repo/notes/a.md", "repo/build.log"]:
+        event.src_path = src
+        handler.on_modified(event)
+    assert enqueued == [Path("repo/notes/a.md")]
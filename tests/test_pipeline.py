@@ -0,0 +1,193 @@
+﻿import dataclasses
+import threading
+import time
+
+from app.db import MetadataDB
+from app.ingest_files.extract_pool import ExtractionError
+from app.ingest_files import pipeline as pipeline_module
+from app.ingest_files.pipeline import BackfillPipeline
+
+
+def _payload(title):
+    return {
+        "title": title,
+        "summary": [],
+        "decisions": [],
+        "actions": [],
+        "entities": [],
+        "tags": [],
+        "projects": [],
+        "people": [],
+        "confidence": 1.0,
+    }
+
+
+def test_pipeline_processes_all_files(mock_config, mocker):
+    input_dir = mock_config.watch_paths[0]
+    paths = []
+    for index in range(6):
+        path = input_dir / f"note{index}.txt"
+        path.write_text(f"note body {index}", encoding="utf-8")
+        paths.append(path)
+
+    mock_llm = mocker.Mock()
+    mock_llm.normalize.side_effect = lambda text, info: _payload(text)
+
+    db = MetadataDB(mock_config.db_path, log_events=True)
+    done = []
+    stats = BackfillPipeline(mock_config, db, mock_llm, on_done=done.append).run(paths)
+
+    assert stats.processed == 6
+    assert stats.failed == 0
+    assert sorted(done) == sorted(paths)
+    assert db.count_sources("file") == 6
+    db.close()
+
+
+def test_extraction_runs_ahead_of_a_blocked_llm_only_up_to_the_queue_bound(mock_config, mocker):
+    mock_config = dataclasses.replace(
+        mock_config,
+        backfill_extract_workers=2,
+        backfill_llm_workers=1,
+        backfill_queue_size=3,
+    )
+    input_dir = mock_config.watch_paths[0]
+    paths = []
+    for index in range(20):
+        path = input_dir / f"queued{index}.txt"
+        path.write_text(f"queued body {index}", encoding="utf-8")
+        paths.append(path)
+
+    extracted = []
+    real_prepare = pipeline_module.prepare_file
+
+    def prepare(path, *args, **kwargs):
+        result = real_prepare(path, *args, **kwargs)
+        extracted.append(path)
+        return result
+
+    mocker.patch.object(pipeline_module, "prepare_file", side_effect=prepare)
+    release = threading.Event()
+    llm_started = threading.Event()
+
+    def normalize(text, info):
+        llm_started.set()
+        release.wait(10)
+        return _payload(text)
+
+    mock_llm = mocker.Mock()
+    mock_llm.normalize.side_effect = normalize
+
+    db = MetadataDB(mock_config.db_path, log_events=True)
+    pipeline = BackfillPipeline(mock_config, db, mock_llm)
+    runner = threading.Thread(target=pipeline.run, args=(paths,))
+    runner.start()
+
+    # one file held by the LLM worker, a full LLM queue, and one finished file per
+    # extract worker waiting to be queued; nothing else may be extracted
+    bound = 1 + mock_config.backfill_queue_size + mock_config.backfill_extract_workers
+    assert llm_started.wait(5)
+    deadline = time.monotonic() + 5
+    while len(extracted) < bound and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.2)
+    assert len(extracted) == bound
+    assert pipeline.stats.submitted < len(paths)
+
+    release.set()
+    runner.join(10)
+    assert pipeline.stats.processed == len(paths)
+    assert len(extracted) == len(paths)
+    db.close()
+
+
+def test_pipeline_records_llm_failures(mock_config, mocker):
+    input_dir = mock_config.watch_paths[0]
+    path = input_dir / "broken.txt"
+    path.write_text("broken", encoding="utf-8")
+
+    mock_llm = mocker.Mock()
+    mock_llm.normalize.side_effect = RuntimeError("LLM normalization failed: invalid_json")
+
+    db = MetadataDB(mock_config.db_path, log_events=True)
+    stats = BackfillPipeline(mock_config, db, mock_llm).run([path])
+
+    assert stats.failed == 1
+    assert stats.processed == 0
+    assert db.count_sources("file") == 0
+    db.close()
+
+
+def test_pipeline_records_extraction_timeouts_as_failures(mock_config, mocker):
+    path = mock_config.watch_paths[0] / "hung.txt"
+    path.write_text("never extracted", encoding="utf-8")
+    extractor = mocker.Mock()
+    extractor.extract.side_effect = ExtractionError("Extraction timed out after 1.0s")
+
+    db = MetadataDB(mock_config.db_path, log_events=True)
+    stats = BackfillPipeline(mock_config, db, mocker.Mock(), extractor=extractor).run([path])
+
+    assert (stats.failed, stats.skipped) == (1, 0)
+    row = db.conn.execute("SELECT failed_stage, error FROM file_metrics").fetchone()
+    assert tuple(row) == ("extract", "ExtractionError")
+    assert db.count_events("file_failed") == 1
+    db.close()
+
+
+def test_pipeline_batches_small_documents(mock_config, mocker):
+    mock_config = dataclasses.replace(mock_config, llm_batch_enabled=True)
+    input_dir = mock_config.watch_paths[0]
+    paths = []
+    for index in range(5):
+        path = input_dir / f"small{index}.txt"
+        path.write_text(f"short note {index}", encoding="utf-8")
+        paths.append(path)
+
+    batches = []
+
+    def normalize_batch(documents, max_tokens, max_documents):
+        batches.append(len(documents))
+        return [
+            RuntimeError("bad item") if "short note 3" in text else _payload(text)
+            for text, _ in documents
+        ]
+
+    mock_llm = mocker.Mock()
+    mock_llm.normalize_batch.side_effect = normalize_batch
+
+    db = MetadataDB(mock_config.db_path, log_events=True)
+    stats = BackfillPipeline(mock_config, db, mock_llm).run(paths)
+
+    assert sum(batches) == 5
+    assert max(batches) <= mock_config.llm_batch_max_docs
+    assert stats.processed == 4
+    assert stats.failed == 1
+    mock_llm.normalize.assert_not_called()
+    rows = db.conn.execute("SELECT outcome, failed_stage, llm_us FROM file_metrics").fetchall()
+    assert sorted(row["outcome"] for row in rows) == ["failed"] + ["processed"] * 4
+    assert all(row["llm_us"] > 0 for row in rows)
+    assert [row["failed_stage"] for row in rows if row["outcome"] == "failed"] == ["llm"]
+    db.close()
+
+
+def test_pipeline_sends_files_one_by_one_while_a_cassette_is_active(mock_config, mocker):
+    mock_config = dataclasses.replace(
+        mock_config, llm_batch_enabled=True, llm_cassette_mode="replay"
+    )
+    input_dir = mock_config.watch_paths[0]
+    paths = []
+    for index in range(3):
+        path = input_dir / f"small{index}.txt"
+        path.write_text(f"short note {index}", encoding="utf-8")
+        paths.append(path)
+
+    mock_llm = mocker.Mock()
+    mock_llm.normalize.side_effect = lambda text, info: _payload(text)
+
+    db = MetadataDB(mock_config.db_path, log_events=True)
+    stats = BackfillPipeline(mock_config, db, mock_llm).run(paths)
+
+    assert stats.processed == 3
+    assert mock_llm.normalize.call_count == 3
+    mock_llm.normalize_batch.assert_not_called()
+    db.close()
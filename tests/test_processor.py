@@ -1,4 +1,8 @@
-﻿from app.ingest_files.processor import process_file
+﻿import dataclasses
+
+import pytest
+
+from app.ingest_files.processor import PreparedFile, prepare_file, process_file
 from app.db import MetadataDB
 
 
@@ -30,3 +34,126 @@ def test_process_file_flow(mock_config, mocker):
     assert db.count_sources("file") == 1
 
     db.close()
+
+
+def test_process_file_skips_unchanged_by_fingerprint(mock_config, mocker):
+    input_file = mock_config.watch_paths[0] / "same.txt"
+    input_file.write_text("Unchanged", encoding="utf-8")
+
+    mock_llm = mocker.Mock()
+    mock_llm.normalize.return_value = {"title": "Same", "confidence": 1.0}
+
+    db = MetadataDB(mock_config.db_path, log_events=True)
+    first = process_file(input_file, mock_config, db, mock_llm)
+
+    extract = mocker.patch("app.ingest_files.processor.extract_text")
+    second = process_file(input_file, mock_config, db, mock_llm)
+    assert second == first
+    extract.assert_not_called()
+
+    extract.side_effect = lambda path, max_bytes, buffer=None, char_budget=0: ("Unchanged", {})
+    third = process_file(input_file, mock_config, db, mock_llm, verify=True)
+    assert third == first
+    extract.assert_called_once()
+    assert mock_llm.normalize.call_count == 1
+
+    db.close()
+
+
+def test_prepare_file_reuses_extraction_for_same_raw_bytes(mock_config, mocker):
+    docx = pytest.importorskip("docx")
+    input_dir = mock_config.watch_paths[0]
+    original = input_dir / "report.docx"
+    document = docx.Document()
+    document.add_paragraph("Quarterly report")
+    document.save(original)
+    copy = input_dir / "report-copy.docx"
+    copy.write_bytes(original.read_bytes())
+
+    db = MetadataDB(mock_config.db_path, log_events=True)
+    first = prepare_file(original, mock_config, db)
+    extract = mocker.patch("app.ingest_files.processor.extract_text")
+    second = prepare_file(copy, mock_config, db)
+
+    extract.assert_not_called()
+    assert isinstance(second, PreparedFile)
+    assert second.text == first.text
+    assert second.content_hash == first.content_hash
+    assert second.extraction["extension"] == ".docx"
+    assert db.get_counter("extraction_cache_hits") == 1
+    assert db.get_counter("extraction_cache_misses") == 1
+    assert db.extraction_cache_stats()["entries"] == 1
+    db.close()
+
+
+def test_process_file_records_stage_metrics(mock_config, mocker):
+    input_file = mock_config.watch_paths[0] / "timed.txt"
+    input_file.write_text("Timed content", encoding="utf-8")
+
+    mock_llm = mocker.Mock()
+    mock_llm.normalize.return_value = {"title": "Timed", "confidence": 1.0}
+
+    db = MetadataDB(mock_config.db_path, log_events=True)
+    process_file(input_file, mock_config, db, mock_llm)
+    process_file(input_file, mock_config, db, mock_llm)
+
+    broken = mock_config.watch_paths[0] / "broken.txt"
+    broken.write_text("Broken content", encoding="utf-8")
+    mock_llm.normalize.side_effect = RuntimeError("model offline")
+    with pytest.raises(RuntimeError):
+        process_file(broken, mock_config, db, mock_llm)
+
+    rows = db.conn.execute("SELECT * FROM file_metrics ORDER BY id").fetchall()
+    assert [row["outcome"] for row in rows] == ["processed", "unchanged", "failed"]
+    processed = rows[0]
+    assert processed["extension"] == ".txt"
+    assert processed["size_bytes"] == len("Timed content")
+    for stage in ("stat", "hash", "extract", "llm", "render", "write"):
+        assert processed[f"{stage}_us"] > 0
+    assert rows[1]["llm_us"] == 0
+    assert (rows[2]["failed_stage"], rows[2]["error"]) == ("llm", "RuntimeError")
+
+    db.close()
+
+
+def test_deduplicated_and_verified_files_do_not_copy_raw_bytes(mock_config, mocker):
+    input_dir = mock_config.watch_paths[0]
+    original = input_dir / "note.txt"
+    original.write_text("Shared text", encoding="utf-8")
+    duplicate = input_dir / "note-copy.md"
+    duplicate.write_text("Shared text", encoding="utf-8")
+
+    mock_llm = mocker.Mock()
+    mock_llm.normalize.return_value = {"title": "Shared", "confidence": 1.0}
+
+    db = MetadataDB(mock_config.db_path, log_events=True)
+    first = process_file(original, mock_config, db, mock_llm)
+    assert process_file(duplicate, mock_config, db, mock_llm) == first
+    assert process_file(original, mock_config, db, mock_llm, verify=True) == first
+
+    raw_files = [path for path in (mock_config.raw_dir / "file").rglob("*") if path.is_file()]
+    assert [path.suffix for path in raw_files] == [".txt"]
+    assert db.get_source("file", str(duplicate))["raw_path"] == str(raw_files[0])
+    db.close()
+
+
+def test_budgeted_extraction_is_identified_by_raw_bytes(mock_config, mocker):
+    mock_config = dataclasses.replace(mock_config, extract_char_budget=100)
+    input_dir = mock_config.watch_paths[0]
+    first = input_dir / "a.pdf"
+    first.write_bytes(b"%PDF- first document")
+    second = input_dir / "b.pdf"
+    second.write_bytes(b"%PDF- second document")
+    mocker.patch(
+        "app.ingest_files.processor.extract_text",
+        return_value=("same sampled pages", {"complete": False}),
+    )
+
+    db = MetadataDB(mock_config.db_path, log_events=True)
+    prepared_a = prepare_file(first, mock_config, db)
+    prepared_b = prepare_file(second, mock_config, db)
+
+    assert isinstance(prepared_a, PreparedFile) and isinstance(prepared_b, PreparedFile)
+    assert prepared_a.content_hash != prepared_b.content_hash
+    assert prepared_a.text == prepared_b.text == "same sampled pages"
+    db.close()
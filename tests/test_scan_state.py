@@ -0,0 +1,103 @@
+﻿import threading
+import time
+from pathlib import Path
+
+from app.ingest_files.path_filter import PathFilter
+from app.ingest_files.scan_state import ScanProgress, ScanSnapshot
+from app.ingest_files.scanner import ScanEntry
+from app.ingest_files.watcher import start_periodic_scan
+
+
+def test_snapshot_diff_and_roundtrip(tmp_path):
+    previous = ScanSnapshot.from_entries(
+        [ScanEntry("a.md", 1, 10), ScanEntry("b.md", 2, 20), ScanEntry("gone.md", 3, 30)]
+    )
+    current = ScanSnapshot.from_entries(
+        [ScanEntry("a.md", 1, 10), ScanEntry("b.md", 2, 21), ScanEntry("新規.md", 4, 40)]
+    )
+    assert current.diff(previous) == (["新規.md"], ["b.md"], ["gone.md"])
+
+    path = tmp_path / "state" / "snapshot.bin"
+    current.save(path)
+    loaded = ScanSnapshot.load(path)
+    assert list(loaded) == ["a.md", "b.md", "新規.md"]
+    assert loaded.get("b.md") == (2, 21)
+    assert loaded.diff(current) == ([], [], [])
+
+
+def test_truncated_snapshot_loads_as_missing(tmp_path):
+    path = tmp_path / "snapshot.bin"
+    ScanSnapshot.from_entries([ScanEntry("a.md", 1, 10), ScanEntry("b.md", 2, 20)]).save(path)
+    data = path.read_bytes()
+    for length in (4, 10, 20, 30, 40):
+        path.write_bytes(data[:length])
+        assert ScanSnapshot.load(path) is None
+
+
+def _scan_once(root, path_filter, progress, snapshot_path):
+    stop_event = threading.Event()
+    enqueued = []
+
+    def enqueue(path):
+        enqueued.append(path)
+        progress.finish(str(path), ok=True)
+
+    thread = start_periodic_scan(
+        [root],
+        True,
+        path_filter,
+        enqueue,
+        60,
+        stop_event,
+        snapshot_path=snapshot_path,
+        progress=progress,
+    )
+    deadline = time.monotonic() + 10
+    while not snapshot_path.exists() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stop_event.set()
+    thread.join(5)
+    return sorted(path.name for path in enqueued)
+
+
+def test_periodic_scan_enqueues_only_changes_after_restart(tmp_path):
+    root = tmp_path / "root"
+    root.mkdir()
+    (root / "old.md").write_text("old", encoding="utf-8")
+    (root / "edited.md").write_text("v1", encoding="utf-8")
+    path_filter = PathFilter([], [], {".md"})
+    first_path = tmp_path / "first.bin"
+
+    progress = ScanProgress(ScanSnapshot.load(first_path))
+    assert _scan_once(root, path_filter, progress, first_path) == ["edited.md", "old.md"]
+
+    (root / "new.md").write_text("new", encoding="utf-8")
+    (root / "edited.md").write_text("version 2", encoding="utf-8")
+    restarted = ScanProgress(ScanSnapshot.load(first_path))
+    second_path = tmp_path / "second.bin"
+    assert _scan_once(root, path_filter, restarted, second_path) == ["edited.md", "new.md"]
+    assert sorted(Path(entry).name for entry in ScanSnapshot.load(second_path)) == [
+        "edited.md",
+        "new.md",
+        "old.md",
+    ]
+
+
+def test_scan_progress_keeps_failed_and_unprocessed_paths_changed(tmp_path):
+    current = ScanSnapshot.from_entries(
+        [ScanEntry("ok.md", 1, 10), ScanEntry("failed.md", 2, 20), ScanEntry("queued.md", 3, 30)]
+    )
+    progress = ScanProgress()
+    assert progress.changes(current) == ["ok.md", "failed.md", "queued.md"]
+    progress.finish("ok.md", ok=True)
+    progress.finish("failed.md", ok=False)
+    progress.finish("live-event.md", ok=True)
+
+    assert progress.changes(current) == ["failed.md", "queued.md"]
+    assert progress.pending_count() == 2
+
+    path = tmp_path / "snapshot.bin"
+    progress.save(path)
+    assert list(ScanSnapshot.load(path)) == ["ok.md"]
+    restarted = ScanProgress(ScanSnapshot.load(path))
+    assert restarted.changes(current) == ["failed.md", "queued.md"]
@@ -0,0 +1,48 @@
+﻿from pathlib import Path
+
+from app.ingest_files.path_filter import PathFilter
+from app.ingest_files.scanner import scan_entries, scan_paths
+
+
+def _make_tree(root):
+    (root / "a" / "b").mkdir(parents=True)
+    (root / "node_modules").mkdir()
+    (root / "top.txt").write_text("1", encoding="utf-8")
+    (root / "skip.tmp").write_text("1", encoding="utf-8")
+    (root / "a" / "mid.md").write_text("12", encoding="utf-8")
+    (root / "a" / "b" / "deep.txt").write_text("123", encoding="utf-8")
+    (root / "node_modules" / "dep.js").write_text("x", encoding="utf-8")
+
+
+def test_scan_paths_recursive_with_excludes(tmp_path):
+    _make_tree(tmp_path)
+    found = set(scan_paths([tmp_path], True, PathFilter(["node_modules"], ["*.tmp"]), workers=3))
+    assert found == {
+        tmp_path / "top.txt",
+        tmp_path / "a" / "mid.md",
+        tmp_path / "a" / "b" / "deep.txt",
+    }
+
+
+def test_scan_paths_non_recursive_and_file_roots(tmp_path):
+    _make_tree(tmp_path)
+    file_root = tmp_path / "a" / "mid.md"
+    roots = [tmp_path, file_root, tmp_path / "missing"]
+    found = set(scan_paths(roots, False, PathFilter([], ["*.tmp"])))
+    assert found == {tmp_path / "top.txt", file_root}
+
+
+def test_scan_entries_reports_stat_data(tmp_path):
+    _make_tree(tmp_path)
+    entries = {Path(entry.path).name: entry for entry in scan_entries([tmp_path], True, PathFilter([], []))}
+    assert entries["deep.txt"].size == 3
+    assert entries["deep.txt"].mtime_ns > 0
+
+
+def test_scan_entries_can_stop_early(tmp_path):
+    for index in range(50):
+        (tmp_path / f"f{index}.txt").write_text("x", encoding="utf-8")
+    iterator = scan_entries([tmp_path], True, PathFilter([], []), workers=2, queue_size=1)
+    first = next(iterator)
+    iterator.close()
+    assert first.path.endswith(".txt")
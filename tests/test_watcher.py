@@ -0,0 +1,97 @@
+﻿import threading
+import time
+from pathlib import Path
+
+from app.ingest_files.watcher import PRIORITY_LIVE, PRIORITY_SCAN, DebounceQueue, WorkerPool
+
+
+def test_debounce_coalesces_and_fires_on_deadline():
+    fired = []
+    done = threading.Event()
+
+    def on_ready(path):
+        fired.append((path, time.monotonic()))
+        done.set()
+
+    queue = DebounceQueue(0.1, on_ready)
+    queue.start()
+    try:
+        started = time.monotonic()
+        for _ in range(3):
+            queue.submit(Path("a.md"))
+        assert queue.pending_count() == 1
+        assert done.wait(2)
+    finally:
+        queue.stop()
+
+    assert [path for path, _ in fired] == [Path("a.md")]
+    assert fired[0][1] - started < 0.4
+    stats = queue.stats()
+    assert stats["submitted"] == 3
+    assert stats["coalesced"] == 2
+    assert stats["emitted"] == 1
+    assert stats["pending"] == 0
+
+
+def test_debounce_resubmit_pushes_deadline_back():
+    fired = []
+    queue = DebounceQueue(0.15, fired.append)
+    queue.start()
+    try:
+        queue.submit(Path("late.md"))
+        time.sleep(0.1)
+        queue.submit(Path("late.md"))
+        queue.submit(Path("early.md"))
+        time.sleep(0.1)
+        assert fired == []
+        assert queue.oldest_pending_age() >= 0.2
+        time.sleep(0.2)
+    finally:
+        queue.stop()
+    assert sorted(fired) == [Path("early.md"), Path("late.md")]
+
+
+def test_worker_pool_runs_live_before_scan_and_dedups_queued():
+    order = []
+    pool = WorkerPool(order.append, workers=1)
+    for index in range(3):
+        pool.submit(Path(f"scan{index}.md"), PRIORITY_SCAN)
+    pool.submit(Path("scan1.md"), PRIORITY_SCAN)
+    pool.submit(Path("scan2.md"), PRIORITY_LIVE)
+    pool.submit(Path("note.md"), PRIORITY_LIVE)
+    assert pool.pending_count() == 4
+    pool.start()
+    try:
+        assert pool.join(timeout=2)
+    finally:
+        pool.stop()
+    assert order == [Path("scan2.md"), Path("note.md"), Path("scan0.md"), Path("scan1.md")]
+    assert pool.stats()["coalesced"] == 2
+
+
+def test_worker_pool_coalesces_resubmits_while_in_flight():
+    started = threading.Event()
+    release = threading.Event()
+    runs = []
+
+    def processor(path):
+        runs.append(path)
+        started.set()
+        release.wait(2)
+
+    pool = WorkerPool(processor, workers=2)
+    pool.start()
+    try:
+        pool.submit(Path("busy.md"))
+        assert started.wait(2)
+        for _ in range(3):
+            pool.submit(Path("busy.md"), PRIORITY_SCAN)
+        assert pool.in_flight_count() == 1
+        assert pool.pending_count() == 0
+        assert pool.stats()["follow_ups"] == 1
+        release.set()
+        assert pool.join(timeout=2)
+    finally:
+        pool.stop()
+    assert runs == [Path("busy.md"), Path("busy.md")]
+    assert pool.stats()["processed"] == 2